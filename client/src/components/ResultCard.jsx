@@ -43,10 +43,13 @@ function ResultCard(props) {
             <div className="resultImage">
                 <img
                   src={imageUrl}
+                  srcSet={props.result.thumbnail_2x ? `${imageUrl} 1x, ${props.result.thumbnail_2x} 2x` : undefined}
                   alt="Open transcript page"
                   onError={(e) => {
                     if (e.target.dataset.fallback !== "1") {
                       e.target.dataset.fallback = "1";
+                      // Otherwise the browser keeps choosing the broken srcset candidate
+                      e.target.removeAttribute("srcset");
                       e.target.src = `/thumbnails/placeholder.jpg`;
                     }
                   }}
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: BM25 index top-k retrieval versus exhaustive scoring.
+
+The reference tokenizes every line up front and, per query, scores every
+line from its own token list with the same BM25 formula, checking phrases
+by brute force. Result ids and scores are compared for every query; any
+difference is reported and fails the run.
+
+Usage:
+  python benchmarks/bench_bm25.py exports/corpus
+  python benchmarks/bench_bm25.py exports/corpus --repeat 5 --limit 20
+"""
+
+import argparse
+import math
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from bm25_search import INDEX_FILE, BM25Index, bm25_idf, build_index, parse_query, tokenize  # noqa: E402
+from trigram_index import SEARCH_LIMIT  # noqa: E402
+
+QUERIES = [
+    {"keywords": "yoylecake"},
+    {"keywords": "the"},
+    {"keywords": "the cake"},
+    {"keywords": "i am really sorry"},
+    {"keywords": "elimination", "season": "2"},
+    {"keywords": "sorry", "character": "four"},
+    {"keywords": "xyzzy"},
+    {"keywords": '"cake at stake"'},
+    {"keywords": '"really sorry"~2 the'},
+    {"keywords": '"dream island"'},
+    {"keywords": "why", "character": "leafy", "season": "1"},
+    {"character": "ball"},
+]
+
+
+def phrase_in(tokens, phrase, slop):
+    """Brute-force ordered match: every start, earliest following positions."""
+    for start, token in enumerate(tokens):
+        if token != phrase[0]:
+            continue
+        end = start
+        for word in phrase[1:]:
+            try:
+                end = tokens.index(word, end + 1)
+            except ValueError:
+                break
+        else:
+            if end - start - (len(phrase) - 1) <= slop:
+                return True
+    return False
+
+
+def exhaustive_search(index, lines, df, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+    allowed = index.line_filter(character, season)
+    if not keywords:
+        hits = [(n, 0.0) for n in range(len(lines)) if allowed is None or allowed(n)]
+        return hits[:limit] if limit is not None else hits
+    phrases, terms = parse_query(keywords)
+    required = []
+    for tokens, _ in phrases:
+        required.extend(t for t in tokens if t not in required)
+    scored = [t for t in required + terms if t in df]
+    k1, b, avgdl, size = index.k1, index.b, index.avgdl, len(lines)
+    hits = []
+    for n, tokens in enumerate(lines):
+        if allowed is not None and not allowed(n):
+            continue
+        counts = Counter(tokens)
+        if phrases:
+            if not all(phrase_in(tokens, p, slop) for p, slop in phrases):
+                continue
+        elif not any(counts[t] for t in terms):
+            continue
+        norm = k1 * (1 - b + b * len(tokens) / avgdl)
+        parts = [bm25_idf(size, df[t]) * counts[t] * (k1 + 1) / (counts[t] + norm)
+                 for t in dict.fromkeys(scored) if counts[t]]
+        hits.append((n, math.fsum(parts)))
+    hits.sort(key=lambda hit: (-hit[1], hit[0]))
+    return hits[:limit] if limit is not None else hits
+
+
+def same_results(expected, actual):
+    if len(expected) != len(actual):
+        return False
+    return all(a[0] == e[0] and math.isclose(a[1], e[1], rel_tol=1e-9, abs_tol=1e-12)
+               for e, a in zip(expected, actual))
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark BM25 top-k retrieval against exhaustive scoring")
+    parser.add_argument("corpus", type=Path, help="Corpus directory (export_dialogue.py --corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT, help="Top-k cut-off (0 = unlimited)")
+    args = parser.parse_args()
+    limit = args.limit or None
+
+    if not (args.corpus / INDEX_FILE).exists():
+        start = time.perf_counter()
+        build_index(args.corpus)
+        print(f"Built index in {time.perf_counter() - start:.2f}s")
+
+    with BM25Index(args.corpus) as index:
+        lines = [tokenize(index.corpus.dialogue(n)) for n in range(len(index.corpus))]
+        df = Counter(t for tokens in lines for t in set(tokens))
+        print(f"{len(lines)} lines, limit={limit}")
+        print(f"{'query':55} {'hits':>6} {'full ms':>9} {'index ms':>9} {'speedup':>8}")
+        total_full = total_index = 0.0
+        failed = False
+        for query in QUERIES:
+            full_time, expected = best_of(lambda: exhaustive_search(index, lines, df, limit=limit, **query),
+                                          args.repeat)
+            index_time, actual = best_of(lambda: index.search(limit=limit, **query), args.repeat)
+            total_full += full_time
+            total_index += index_time
+            label = ", ".join(f"{k}={v!r}" for k, v in query.items())
+            flag = "" if same_results(expected, actual) else "  MISMATCH"
+            failed = failed or bool(flag)
+            print(f"{label:55} {len(expected):6} {full_time * 1000:9.2f} {index_time * 1000:9.2f} "
+                  f"{full_time / max(index_time, 1e-9):7.1f}x{flag}")
+        print(f"{'total':55} {'':6} {total_full * 1000:9.2f} {total_index * 1000:9.2f} "
+              f"{total_full / max(total_index, 1e-9):7.1f}x")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark: per-line classification cost of line_classifier versus the
+previous pattern-by-pattern implementation (kept below verbatim as the
+reference). Also checks that both agree on every sample.
+
+Usage:
+  python benchmarks/bench_classifier.py
+  python benchmarks/bench_classifier.py --lines 50000 --repeat 5
+"""
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import line_classifier  # noqa: E402
+from line_classifier import (  # noqa: E402
+    KNOWN_CHARACTERS, EPISODE_TITLES, GARBAGE_PATTERNS, CREATOR_PATTERNS,
+)
+
+# =============================================================================
+# REFERENCE (pre-compiled-classifier) IMPLEMENTATION
+# =============================================================================
+
+def legacy_normalize_character(name):
+    """Normalize character name for matching."""
+    name = name.lower().strip()
+    name = re.sub(r'[^\w\s\-]', '', name)  # Remove punctuation except hyphen
+    name = re.sub(r'\s+', ' ', name)  # Normalize whitespace
+    
+    # Common corrections
+    corrections = {
+        'ice-cube': 'ice cube',
+        'icecube': 'ice cube',
+        'golfball': 'golf ball',
+        'tennisball': 'tennis ball',
+        'yellowface': 'yellow face',
+        'yellow-face': 'yellow face',
+        'blackhole': 'black hole',
+        'black-hole': 'black hole',
+        'barfbag': 'barf bag',
+        'barf-bag': 'barf bag',
+        'fireysr': 'firey',
+        'fireyjr': 'firey jr',
+        'firey-jr': 'firey jr',
+        'robotflower': 'robot flower',
+        'robot-flower': 'robot flower',
+        'pricetag': 'price tag',
+        'price-tag': 'price tag',
+    }
+    
+    return corrections.get(name, name)
+
+
+def legacy_is_known_character(name):
+    """Check if name is a known character."""
+    normalized = legacy_normalize_character(name)
+    return normalized in KNOWN_CHARACTERS
+
+
+def legacy_is_garbage(text):
+    """Check if text is garbage that should be filtered."""
+    text_lower = text.lower().strip()
+    
+    # Too short
+    if len(text_lower) < 3:
+        return True
+    
+    # Is an episode title
+    if text_lower in EPISODE_TITLES:
+        return True
+    
+    # Matches garbage patterns
+    for pattern in GARBAGE_PATTERNS:
+        if re.search(pattern, text_lower):
+            return True
+    
+    # Matches creator commentary
+    for pattern in CREATOR_PATTERNS:
+        if re.search(pattern, text_lower):
+            return True
+    
+    # Ends with [] (wiki section header artifact)
+    if text_lower.endswith('[]'):
+        return True
+    
+    # Just a timestamp like "0:00" or "12:34"
+    if re.match(r'^\d{1,2}:\d{2}$', text_lower):
+        return True
+    
+    return False
+
+
+def legacy_is_stage_direction(text):
+    """Check if text is a stage direction."""
+    text = text.strip()
+    if not text:
+        return True
+    # Full brackets
+    if (text.startswith('[') and text.endswith(']')) or \
+       (text.startswith('(') and text.endswith(')')):
+        return True
+    return False
+
+
+
+# =============================================================================
+# SAMPLE DATA
+# =============================================================================
+
+DIALOGUE = [
+    "Hey, look who it is!",
+    "I'm not going to lose this time.",
+    "Welcome back to Battle for Dream Island!",
+    "Yoylecake is the best cake ever.",
+    "Why would you do that?",
+    "Leafy, you're a traitor!",
+    "Are you smarter than a snowball?",
+    "That was my pie!",
+    "Ow, my everything.",
+    "Four, can we please have our limbs back?",
+]
+JUNK = [
+    "Contents", "Transcript", "Edit source", "[1]", "12:34", "7", "Ok",
+    "Cake at Stake", "Hi, it's me, Cary", "Thank you so much for watching",
+    "Trivia[]", "Episode 12",
+]
+DIRECTIONS = ["[Four zaps Eggy]", "(laughs)", "[Cut to the Yoyleland]", ""]
+NAMES = sorted(KNOWN_CHARACTERS) + ["Ice-Cube", "GolfBall", "Black Hole:", "  Firey Jr. ", "Random Guy"]
+
+
+def build_samples(count, seed=0):
+    rng = random.Random(seed)
+    titles = sorted(EPISODE_TITLES)
+    texts = []
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.7:
+            # Real dialogue rarely repeats verbatim, so keep these unique
+            texts.append(f"{rng.choice(DIALOGUE)} ({i})")
+        elif roll < 0.85:
+            texts.append(rng.choice(JUNK))
+        elif roll < 0.95:
+            texts.append(rng.choice(DIRECTIONS))
+        else:
+            texts.append(rng.choice(titles).title())
+    names = [rng.choice(NAMES) for _ in range(count)]
+    return texts, names
+
+
+def classify(texts, names, garbage, stage, known):
+    hits = 0
+    for text, name in zip(texts, names):
+        if garbage(text) or stage(text):
+            hits += 1
+        if known(name):
+            hits += 1
+    return hits
+
+
+def time_run(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark line classification")
+    parser.add_argument("--lines", type=int, default=20000, help="Number of sample lines")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per implementation (best is reported)")
+    args = parser.parse_args()
+
+    texts, names = build_samples(args.lines)
+
+    mismatches = [
+        t for t in texts
+        if legacy_is_garbage(t) != line_classifier.is_garbage(t)
+        or legacy_is_stage_direction(t) != line_classifier.is_stage_direction(t)
+    ]
+    mismatches += [
+        n for n in names
+        if legacy_normalize_character(n) != line_classifier.normalize_character(n)
+        or legacy_is_known_character(n) != line_classifier.is_known_character(n)
+    ]
+    if mismatches:
+        print(f"MISMATCH on {len(mismatches)} samples, e.g. {mismatches[:5]!r}")
+        sys.exit(1)
+
+    before = time_run(lambda: classify(
+        texts, names, legacy_is_garbage, legacy_is_stage_direction, legacy_is_known_character), args.repeat)
+
+    def cold():
+        line_classifier.is_garbage.cache_clear()
+        line_classifier.is_known_character.cache_clear()
+        line_classifier.normalize_character.cache_clear()
+        classify(texts, names, line_classifier.is_garbage,
+                 line_classifier.is_stage_direction, line_classifier.is_known_character)
+
+    after_cold = time_run(cold, args.repeat)
+    after_warm = time_run(lambda: classify(
+        texts, names, line_classifier.is_garbage,
+        line_classifier.is_stage_direction, line_classifier.is_known_character), args.repeat)
+
+    per_line = lambda seconds: seconds / args.lines * 1e6
+    print(f"Lines classified: {args.lines} (outputs identical)")
+    print(f"  before (pattern loop):     {per_line(before):7.2f} us/line")
+    print(f"  after  (compiled, cold):   {per_line(after_cold):7.2f} us/line  ({before / after_cold:.1f}x)")
+    print(f"  after  (compiled, cached): {per_line(after_warm):7.2f} us/line  ({before / after_warm:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
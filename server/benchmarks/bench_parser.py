@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: transcript parser over the checked-in fixtures.
+
+Runs the scraper's parse path (make_soup + parse_dialogue_advanced) over every
+fixtures/*.html.gz page (paragraph-, table- and <li>-style transcripts) and
+reports, per page:
+
+- lines extracted and a digest of the extracted (character, dialogue) pairs
+- per-page latency (median and best of --repeat runs) and lines/sec
+- peak traced memory of one parse (tracemalloc)
+
+Results are compared with baselines/parser.json. A different line count or
+digest means the parser's output changed and fails the run; a page that got
+more than --tolerance slower (best run) is reported (and fails with --fail-on-slower).
+Timings in the baseline are only comparable on the machine that wrote it.
+
+Usage:
+  python benchmarks/bench_parser.py
+  python benchmarks/bench_parser.py --repeat 10 --fail-on-slower
+  python benchmarks/bench_parser.py --update-baseline
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import html_parsing  # noqa: E402
+from html_parsing import make_soup  # noqa: E402
+from make_parser_fixtures import FIXTURES  # noqa: E402
+from transcript_parser import PARSER_VERSION, parse_dialogue_advanced  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "parser.json"
+SLOWER_TOLERANCE = 0.20
+FIXTURE_TITLES = {name: title for name, title, *_ in FIXTURES}
+
+
+def parse_page(raw, title):
+    return parse_dialogue_advanced(make_soup(raw), title)[0]
+
+
+def lines_digest(lines):
+    payload = json.dumps([(line['character'], line['dialogue']) for line in lines], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def bench_fixture(path, repeat):
+    """Timings, memory peak and output digest for one fixture page."""
+    raw = gzip.decompress(path.read_bytes())
+    name = path.name.split(".")[0]
+    title = FIXTURE_TITLES.get(name, name)
+
+    parse_page(raw, title)  # Warm-up: imports, lxml/soupsieve caches
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        lines = parse_page(raw, title)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    parse_page(raw, title)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "bytes": len(raw),
+        "lines": len(lines),
+        "digest": lines_digest(lines),
+        "median_ms": round(median * 1000, 2),
+        "best_ms": round(min(timings) * 1000, 2),
+        "lines_per_sec": round(len(lines) / median) if median else 0,
+        "peak_kib": round(peak / 1024),
+    }
+
+
+def load_baseline():
+    try:
+        with BASELINE_PATH.open("r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the transcript parser on checked-in fixtures")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed parses per fixture")
+    parser.add_argument("--tolerance", type=float, default=SLOWER_TOLERANCE,
+                        help="Allowed best-run slowdown against the baseline (0.2 = 20%%)")
+    parser.add_argument("--fail-on-slower", action="store_true", help="Exit non-zero on a timing regression")
+    parser.add_argument("--update-baseline", action="store_true", help="Write these results as the new baseline")
+    args = parser.parse_args()
+
+    fixtures = sorted(FIXTURE_DIR.glob("*.html.gz"))
+    if not fixtures:
+        print(f"No fixtures in {FIXTURE_DIR}; run benchmarks/make_parser_fixtures.py")
+        sys.exit(2)
+
+    results = {path.name.split(".")[0]: bench_fixture(path, max(1, args.repeat)) for path in fixtures}
+    baseline = load_baseline()
+    base_pages = (baseline or {}).get("pages", {})
+
+    print(f"parser v{PARSER_VERSION}, backend {html_parsing.PARSER_BACKEND}, "
+          f"Python {platform.python_version()}, {args.repeat} run(s) per page")
+    print(f"{'fixture':18} {'lines':>6} {'median ms':>10} {'best ms':>9} {'lines/s':>9} {'peak KiB':>9}  vs baseline")
+    output_changed = slower = False
+    for name, result in results.items():
+        notes = []
+        base = base_pages.get(name)
+        if base is None:
+            notes.append("new")
+        else:
+            if result["lines"] != base["lines"]:
+                notes.append(f"LINE COUNT {base['lines']} -> {result['lines']}")
+                output_changed = True
+            elif result["digest"] != base["digest"]:
+                notes.append("OUTPUT CHANGED (same count)")
+                output_changed = True
+            # Best-of is far less noisy than the median on a shared machine
+            change = result["best_ms"] / base["best_ms"] - 1 if base["best_ms"] else 0.0
+            notes.append(f"{change:+.0%} time")
+            if change > args.tolerance:
+                notes.append("SLOWER")
+                slower = True
+        print(f"{name:18} {result['lines']:6} {result['median_ms']:10.2f} {result['best_ms']:9.2f} "
+              f"{result['lines_per_sec']:9} {result['peak_kib']:9}  {', '.join(notes)}")
+
+    total_lines = sum(r["lines"] for r in results.values())
+    total_ms = sum(r["median_ms"] for r in results.values())
+    print(f"{'total':18} {total_lines:6} {total_ms:10.2f} {'':9} {round(total_lines / (total_ms / 1000)):9}")
+
+    if args.update_baseline:
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        with BASELINE_PATH.open("w", encoding="utf-8") as f:
+            json.dump({
+                "parser_version": PARSER_VERSION,
+                "backend": html_parsing.PARSER_BACKEND,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "pages": results,
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Wrote baseline: {BASELINE_PATH}")
+        return
+
+    if baseline is None:
+        print("No baseline yet; run with --update-baseline to record one")
+    elif baseline.get("backend") != html_parsing.PARSER_BACKEND:
+        print(f"Note: baseline was recorded with the {baseline.get('backend')} backend")
+    if output_changed:
+        print("Parser output differs from the baseline; if intended, rerun with --update-baseline")
+        sys.exit(1)
+    if slower and args.fail_on_slower:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark: trigram index queries versus the linear scan the search route does.
+
+The linear scan is a direct port of matches() in routes/dialogue.js run over
+the corpus held in memory as dicts (as the route holds dialogue_export.json).
+Every query's results are compared; any difference is reported and fails the
+run.
+
+Usage:
+  python benchmarks/bench_search.py exports/corpus
+  python benchmarks/bench_search.py exports/corpus --repeat 5 --limit 0
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from trigram_index import INDEX_FILE, SEARCH_LIMIT, TrigramIndex, build_index, js_parse_int  # noqa: E402
+
+QUERIES = [
+    {"keywords": "yoylecake"},
+    {"keywords": "the"},
+    {"keywords": "cake at stake"},
+    {"keywords": "elimination", "season": "2"},
+    {"keywords": "sorry", "character": "four"},
+    {"keywords": "xyzzy"},
+    {"keywords": "hi"},
+    {"character": "ball"},
+    {"season": "5"},
+    {"keywords": "why", "character": "leafy", "season": "1"},
+    {"keywords": "dream island"},
+    {"keywords": "really, really sorry"},
+]
+
+
+def matches(doc, keywords, character, season):
+    """Port of matches() in routes/dialogue.js."""
+    if season is not None:
+        if str(doc["season"]) != str(season):
+            return False
+    if character:
+        if character.lower() not in (doc["character"] or "").lower():
+            return False
+    if keywords:
+        if keywords.lower() not in (doc["dialogue"] or "").lower():
+            return False
+    return True
+
+
+def linear_search(docs, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+    if season:
+        parsed = js_parse_int(season)
+        season = parsed if parsed is not None else "NaN"
+    else:
+        season = None
+    results = []
+    for n, doc in enumerate(docs):
+        if matches(doc, keywords, character, season):
+            results.append(n)
+            if limit is not None and len(results) >= limit:
+                break
+    return results
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the trigram index against a linear scan")
+    parser.add_argument("corpus", type=Path, help="Corpus directory (export_dialogue.py --corpus)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=SEARCH_LIMIT, help="Result cut-off (0 = unlimited)")
+    args = parser.parse_args()
+    limit = args.limit or None
+
+    if not (args.corpus / INDEX_FILE).exists():
+        start = time.perf_counter()
+        build_index(args.corpus)
+        print(f"Built index in {time.perf_counter() - start:.2f}s")
+
+    with TrigramIndex(args.corpus) as index:
+        docs = list(index.corpus)
+        print(f"{len(docs)} lines, limit={limit}")
+        print(f"{'query':55} {'hits':>6} {'scan ms':>9} {'index ms':>9} {'speedup':>8}")
+        total_scan = total_index = 0.0
+        failed = False
+        for query in QUERIES:
+            scan_time, expected = best_of(lambda: linear_search(docs, limit=limit, **query), args.repeat)
+            index_time, actual = best_of(lambda: index.search(limit=limit, **query), args.repeat)
+            total_scan += scan_time
+            total_index += index_time
+            label = ", ".join(f"{k}={v!r}" for k, v in query.items())
+            flag = "" if actual == expected else "  MISMATCH"
+            failed = failed or bool(flag)
+            print(f"{label:55} {len(expected):6} {scan_time * 1000:9.2f} {index_time * 1000:9.2f} "
+                  f"{scan_time / max(index_time, 1e-9):7.1f}x{flag}")
+        print(f"{'total':55} {'':6} {total_scan * 1000:9.2f} {total_index * 1000:9.2f} "
+              f"{total_scan / max(total_index, 1e-9):7.1f}x")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
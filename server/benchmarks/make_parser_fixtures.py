@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Generate the synthetic transcript fixtures used by bench_parser.py.
+
+Each fixture is a full fandom page (navigation, infobox, table of contents,
+navbox, right rail, footer) around one transcript layout:
+
+  paragraph_style  <p><b>Name:</b> text</p>, multi-speaker <br> paragraphs,
+                   plain "Name: text", citations and stage directions
+  table_style      image + text tables (alt text or data-image-name speakers)
+  list_style       <li> lines, including nested <p> and unbolded speakers
+
+Output is deterministic (fixed seeds) and gzipped. The fixtures are checked
+in, so only rerun this when the fixture set itself should change, and then
+refresh the baseline with bench_parser.py --update-baseline.
+
+Usage:
+  python benchmarks/make_parser_fixtures.py
+"""
+
+import gzip
+import random
+from pathlib import Path
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+
+CHARS = ["Four", "X", "Two", "Leafy", "Firey", "Bubble", "Pen", "Pencil", "Match", "Golf Ball", "Tennis Ball",
+         "Ice Cube", "Black Hole", "Barf Bag", "Firey Jr.", "Taco", "Pillow", "Donut", "Book", "Ruby", "Gelatin",
+         "Bottle", "Eggy", "Teardrop", "Robot Flower", "Price Tag", "Loser", "Announcer", "Cake", "Lollipop"]
+WORDS = ("yoylecake dream island cake stake eliminated contestant vote challenge team jump swim rope ball "
+         "limbs recovery center zap host elimination win lose friend traitor sorry hey what why because really "
+         "never always maybe totally okay look over there we should go now please stop running").split()
+DIRECTIONS = ["[{c} zaps {d}]", "({c} laughs)", "[Cut to {c}]", "[{c} falls into the water]", "({c} sighs)"]
+OPENERS = ["Okay everyone, it is time for the next challenge and this time it is going to be",
+           "I just want to say that I am really, really sorry about what happened back there with the"]
+
+COMMON = ("the you i to a and it is that what we of this no in my be me on can for just have so are "
+          "not do all yeah your was oh but with get go know like it's i'm don't here out").split()
+_vocab_rng = random.Random(42)
+SYLLABLES = ["ba", "ko", "ri", "le", "fy", "mo", "tan", "zel", "pu", "ska", "dro", "vin", "qua", "ne", "ti",
+             "gor", "lu", "ash", "pe", "yo", "cle", "mi", "rux", "do", "sho", "fla", "ben", "wi", "tro", "ge"]
+RARE = sorted({"".join(_vocab_rng.choice(SYLLABLES) for _ in range(_vocab_rng.randint(1, 4))) for _ in range(8000)})
+_vocab_rng.shuffle(RARE)
+VOCAB = COMMON + WORDS + RARE
+WEIGHTS = [1.0 / (rank + 1) ** 1.05 for rank in range(len(VOCAB))]
+
+def sentence(rng):
+    if rng.random() < 0.05:
+        return rng.choice(OPENERS) + " " + " ".join(rng.choices(VOCAB, WEIGHTS, k=4)) + "!"
+    n = rng.randint(3, 18)
+    s = " ".join(rng.choices(VOCAB, WEIGHTS, k=n))
+    if rng.random() < 0.01:
+        s += " caf\u00e9 na\u00efve"
+    return s[0].upper() + s[1:] + rng.choice([".", "!", "?", "..."])
+
+CHROME_HEAD = """<!DOCTYPE html>
+<html lang="en" dir="ltr"><head><meta charset="UTF-8"><title>{title}/Transcript | Battle for Dream Island Wiki | Fandom</title>
+<script>window.RLQ = window.RLQ || []; {script}</script><style>{style}</style></head>
+<body class="skin-fandomdesktop mediawiki ltr"><div class="global-navigation"><nav class="global-navigation__links">{navlinks}</nav></div>
+<div class="main-container"><div class="fandom-community-header"><h2>Battle for Dream Island Wiki</h2>{navlinks}</div>
+<main class="page__main"><h1 class="page-header__title">{title}/Transcript</h1>
+<div id="content" class="page-content"><div id="mw-content-text" class="mw-body-content"><div class="mw-parser-output">
+<aside class="portable-infobox pi-background"><figure class="pi-item pi-image"><a href="#"><img src="https://static.wikia.nocookie.net/bfdi/images/1/1a/{slug}.png/revision/latest?cb=20200101" class="pi-image-thumbnail" alt="{title}" width="270" height="152"></a></figure></aside>
+<div id="toc" class="toc"><div class="toctitle"><h2>Contents</h2></div><ul>{toc}</ul></div>
+"""
+CHROME_TAIL = """<table class="navbox mw-collapsible"><tr><th>Episodes</th></tr><tr><td><ul>{navbox}</ul></td></tr></table>
+<div class="categories"><ul><li><a href="#">Transcripts</a></li><li>Four: category junk</li></ul></div>
+</div></div></div></main><aside class="page__right-rail"><div class="rail-module">{rail}</div></aside></div>
+<footer class="global-footer"><p>Four: this is footer text</p>{navlinks}</footer></body></html>
+"""
+
+def chrome(rng, title):
+    navlinks = "".join(f'<a href="/wiki/Page_{i}" class="nav-link">Link {i}</a>' for i in range(150))
+    rail = "".join(f"<div class=\"rail-item\"><p>{sentence(rng)}</p></div>" for _ in range(80))
+    script = ";".join(f"RLQ.push(function(){{mw.config.set('k{i}', {i});}})" for i in range(300))
+    style = "".join(f".c{i}{{margin:{i}px;padding:{i}px}}" for i in range(400))
+    toc = "".join(f'<li class="toclevel-1"><a href="#s{i}"><span class="toctext">Part {i}</span></a></li>' for i in range(8))
+    navbox = "".join(f"<li>{c}: not dialogue {i}</li>" for i, c in enumerate(CHARS))
+    slug = title.replace(" ", "_")
+    return (CHROME_HEAD.format(title=title, slug=slug, script=script, style=style, navlinks=navlinks, toc=toc),
+            CHROME_TAIL.format(navbox=navbox, rail=rail, navlinks=navlinks))
+
+def heading(i):
+    return f'<h2><span class="mw-headline" id="s{i}">Part {i}</span><span class="mw-editsection">[<a href="#">edit</a>]</span></h2>\n'
+
+def paragraph_page(rng, count):
+    body = []
+    for i in range(count):
+        if i % 150 == 0:
+            body.append(heading(i // 150))
+        c = rng.choice(CHARS)
+        r = rng.random()
+        if r < 0.08:
+            body.append(f"<p><i>{rng.choice(DIRECTIONS).format(c=c, d=rng.choice(CHARS))}</i></p>")
+        elif r < 0.12:
+            body.append(f"<p><b>{c}:</b> {sentence(rng)} <sup id=\"cite-{i}\" class=\"reference\"><a href=\"#n{i}\">[{i}]</a></sup></p>")
+        elif r < 0.17:
+            c2 = rng.choice(CHARS)
+            body.append(f"<p><b>{c}:</b> {sentence(rng)}<br><b>{c2}:</b> {sentence(rng)}</p>")
+        elif r < 0.22:
+            body.append(f"<p>{c}: {sentence(rng)}</p>")
+        elif r < 0.25:
+            body.append(f"<p><b>{c}</b>: {sentence(rng)} <i>(quietly)</i> <a href=\"#\">{rng.choice(WORDS)}</a></p>")
+        else:
+            body.append(f"<p><b>{c}:</b> {sentence(rng)}</p>")
+    return "\n".join(body)
+
+def table_page(rng, count):
+    body = []
+    for i in range(count):
+        if i % 100 == 0:
+            body.append(heading(i // 100))
+        c = rng.choice(CHARS)
+        file = c.replace(" ", "_").replace(".", "")
+        if rng.random() < 0.1:
+            body.append(f"<p><i>{rng.choice(DIRECTIONS).format(c=c, d=rng.choice(CHARS))}</i></p>")
+            continue
+        alt = c if rng.random() < 0.7 else ""
+        body.append(
+            f'<table style="width:100%"><tbody><tr><td style="width:60px"><a href="/wiki/{file}" class="image">'
+            f'<img alt="{alt}" src="data:image/gif;base64,R0lGODlhAQABAIABAAAAAP" data-image-name="{c}" '
+            f'data-src="https://static.wikia.nocookie.net/bfdi/images/{file}.png" width="50" height="50"></a></td>'
+            f'<td>{sentence(rng)}</td></tr></tbody></table>')
+    body.append('<table class="wikitable"><tr><th>Character</th><th>Votes</th></tr>' +
+                "".join(f"<tr><td>{c}</td><td>{rng.randint(10, 5000)}</td></tr>" for c in CHARS) + "</table>")
+    return "\n".join(body)
+
+def list_page(rng, count):
+    body = []
+    for i in range(count):
+        if i % 120 == 0:
+            if i:
+                body.append("</ul>")
+            body.append(heading(i // 120))
+            body.append("<ul>")
+        c = rng.choice(CHARS)
+        r = rng.random()
+        if r < 0.08:
+            body.append(f"<li><i>{rng.choice(DIRECTIONS).format(c=c, d=rng.choice(CHARS))}</i></li>")
+        elif r < 0.15:
+            body.append(f"<li>{c}: {sentence(rng)}</li>")
+        elif r < 0.18:
+            body.append(f"<li><p><b>{c}:</b> {sentence(rng)}</p></li>")
+        else:
+            body.append(f"<li><b>{c}:</b> {sentence(rng)}</li>")
+    body.append("</ul>")
+    return "\n".join(body)
+
+FIXTURES = [
+    ("paragraph_style", "The Four is Lava", paragraph_page, 1400, 1),
+    ("table_style", "Get Digging", table_page, 700, 2),
+    ("list_style", "Take the Plunge: Part 1", list_page, 1100, 3),
+]
+
+
+def main():
+    FIXTURE_DIR.mkdir(exist_ok=True)
+    for name, title, make_body, count, seed in FIXTURES:
+        rng = random.Random(seed)
+        head, tail = chrome(rng, title)
+        html = (head + make_body(rng, count) + "\n" + tail).encode("utf-8")
+        path = FIXTURE_DIR / f"{name}.html.gz"
+        with path.open("wb") as raw, gzip.GzipFile(filename="", fileobj=raw, mode="wb", mtime=0) as f:
+            f.write(html)
+        print(f"{path.name}: {len(html) / 1024:.0f} KiB ({path.stat().st_size / 1024:.0f} KiB gzipped)")
+
+
+if __name__ == "__main__":
+    main()
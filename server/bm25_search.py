@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+"""
+BM25-ranked search over a columnar corpus (see corpus_format.py).
+
+The search route returns the first 150 substring hits in collection order, so
+a common word fills the page with arbitrary lines. This module ranks instead:
+
+- a positional inverted index: for every token, the ascending line ids it
+  occurs in and its token positions within each line
+- BM25 scoring (k1=1.2, b=0.75) over line length in tokens
+- query syntax: bare words are optional, ranked terms; "quoted phrases" must
+  occur verbatim and "quoted words"~N must occur in order with at most N
+  other tokens between them
+- `character` / `season` filters with the route's semantics (case-insensitive
+  character substring, season compared after parseInt)
+
+Bare-word queries use MaxScore top-k retrieval: once k results are held,
+posting lists whose best possible contribution can no longer lift a line
+into the top k stop driving the search and are only probed for lines that
+can still make it, so a popular term never gets scored across the corpus.
+
+The index is written as bm25.idx inside the corpus directory.
+
+Usage:
+  python bm25_search.py build exports/corpus
+  python bm25_search.py query exports/corpus --keywords '"cake at stake" yoylecake' --season 1
+"""
+
+import argparse
+import heapq
+import itertools
+import json
+import math
+import mmap
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from corpus_format import U16, U32, Corpus
+from trigram_index import SEARCH_LIMIT, fold, js_parse_int
+
+INDEX_FILE = "bm25.idx"
+MAGIC = b"BFDIBM01"
+K1 = 1.2
+B = 0.75
+MAX_POSITION = 0xFFFF
+
+TOKEN_RE = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+QUERY_RE = re.compile(r'"([^"]*)"(?:~(\d+))?|(\S+)')
+
+END = sys.maxsize  # Cursor position past the last line
+# Line scores are summed with math.fsum, so they do not depend on the order
+# terms were visited in; the epsilon covers rounding in the pruning estimate.
+SCORE_EPSILON = 1e-9
+
+
+def tokenize(text):
+    """Lower-cased, accent-folded word tokens; apostrophes stay inside words."""
+    return TOKEN_RE.findall(fold(text.lower()))
+
+
+def parse_query(keywords):
+    """
+    Split a query into (phrases, terms): phrases is a list of (tokens, slop)
+    for quoted parts, terms the distinct bare-word tokens in query order.
+    An unterminated quote is read as bare words.
+    """
+    phrases = []
+    terms = []
+    for match in QUERY_RE.finditer(keywords or ""):
+        quoted, slop, bare = match.groups()
+        if bare is not None:
+            terms.extend(t for t in tokenize(bare) if t not in terms)
+            continue
+        tokens = tokenize(quoted)
+        if tokens:
+            phrases.append((tokens, int(slop) if slop else 0))
+    return phrases, terms
+
+
+def phrase_matches(position_lists, slop):
+    """
+    True if the tokens occur in order with at most `slop` extra tokens inside
+    the span. For each start, taking the earliest next position of every
+    following token gives the shortest ordered span from that start.
+    """
+    first, rest = position_lists[0], position_lists[1:]
+    for start in first:
+        end = start
+        for positions in rest:
+            i = bisect_right(positions, end)
+            if i == len(positions):
+                return False  # Later starts cannot find a position either
+            end = positions[i]
+        if end - start - len(rest) <= slop:
+            return True
+    return False
+
+
+def bm25_idf(line_count, df):
+    return math.log(1 + (line_count - df + 0.5) / (df + 0.5))
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def build_index(corpus_dir):
+    """Build bm25.idx for the corpus in `corpus_dir`. Returns the term count."""
+    corpus_dir = Path(corpus_dir)
+    docs = {}
+    starts = {}
+    positions = {}
+    with Corpus(corpus_dir) as corpus:
+        size = len(corpus)
+        lengths = array(U16)
+        for n in range(size):
+            tokens = tokenize(corpus.dialogue(n))[:MAX_POSITION + 1]
+            lengths.append(min(len(tokens), MAX_POSITION))
+            seen = {}
+            for position, token in enumerate(tokens):
+                seen.setdefault(token, []).append(position)
+            for token, token_positions in seen.items():
+                if token not in docs:
+                    docs[token] = array(U32)
+                    starts[token] = array(U32, [0])
+                    positions[token] = array(U16)
+                docs[token].append(n)
+                positions[token].extend(token_positions)
+                starts[token].append(len(positions[token]))
+
+    avgdl = (sum(lengths) / size) if size else 0.0
+    norms = [K1 * (1 - B + B * length / avgdl) if avgdl else K1 for length in lengths]
+
+    blob = bytearray()
+
+    def put(data):
+        blob.extend(b"\0" * (-len(blob) % 4))  # Keep every section 4-byte aligned
+        offset = len(blob)
+        blob.extend(data)
+        return offset
+
+    header = {"line_count": size, "avgdl": avgdl, "k1": K1, "b": B, "terms": {}}
+    header["doc_lengths"] = put(lengths.tobytes())
+    for token in sorted(docs):
+        token_docs, token_starts = docs[token], starts[token]
+        idf = bm25_idf(size, len(token_docs))
+        upper = 0.0
+        for i, n in enumerate(token_docs):
+            tf = token_starts[i + 1] - token_starts[i]
+            upper = max(upper, idf * tf * (K1 + 1) / (tf + norms[n]))
+        header["terms"][token] = [
+            put(token_docs.tobytes()),
+            len(token_docs),
+            put(token_starts.tobytes()),
+            put(positions[token].tobytes()),
+            len(positions[token]),
+            upper,
+        ]
+
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    pad = (-(len(MAGIC) + 4 + len(head))) % 4
+    path = corpus_dir / INDEX_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(head) + pad))
+        f.write(head + b" " * pad)
+        f.write(blob)
+    tmp.replace(path)
+    return len(docs)
+
+
+# =============================================================================
+# QUERY
+# =============================================================================
+
+class PostingCursor:
+    """Walks one term's posting list; `doc` is the current line id or END."""
+
+    __slots__ = ("term", "docs", "starts", "positions", "idf", "upper", "i", "size", "doc")
+
+    def __init__(self, term, docs, starts, positions, idf, upper):
+        self.term = term
+        self.docs = docs
+        self.starts = starts
+        self.positions = positions
+        self.idf = idf
+        self.upper = upper
+        self.i = 0
+        self.size = len(docs)
+        self.doc = docs[0] if self.size else END
+
+    def advance(self):
+        self.i += 1
+        self.doc = self.docs[self.i] if self.i < self.size else END
+
+    def seek(self, target):
+        """Move to the first line id >= target."""
+        if self.doc < target:
+            self.i = bisect_left(self.docs, target, self.i + 1)
+            self.doc = self.docs[self.i] if self.i < self.size else END
+
+    def tf(self):
+        return self.starts[self.i + 1] - self.starts[self.i]
+
+    def current_positions(self):
+        return self.positions[self.starts[self.i]:self.starts[self.i + 1]]
+
+
+class BM25Index:
+    """Memory-mapped BM25 index plus the corpus it ranks."""
+
+    def __init__(self, corpus_dir):
+        corpus_dir = Path(corpus_dir)
+        self.corpus = Corpus(corpus_dir)
+        self._file = (corpus_dir / INDEX_FILE).open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{corpus_dir / INDEX_FILE} is not a BM25 index")
+        (head_len,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + head_len])
+        if self.header["line_count"] != len(self.corpus):
+            raise ValueError("BM25 index is out of date with its corpus; rebuild it")
+        self._data = memoryview(self._map)[start + head_len:]
+        self.k1 = self.header["k1"]
+        self.b = self.header["b"]
+        self.avgdl = self.header["avgdl"]
+        offset = self.header["doc_lengths"]
+        lengths = self._data[offset:offset + len(self.corpus) * 2].cast(U16)
+        k1, b, avgdl = self.k1, self.b, self.avgdl
+        self.norms = [k1 * (1 - b + b * length / avgdl) if avgdl else k1 for length in lengths]
+        lengths.release()
+
+    def close(self):
+        self._data.release()
+        self._map.close()
+        self._file.close()
+        self.corpus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def cursor(self, term):
+        """A fresh PostingCursor for `term`, or None if it never occurs."""
+        entry = self.header["terms"].get(term)
+        if entry is None:
+            return None
+        docs_offset, df, starts_offset, positions_offset, position_count, upper = entry
+        return PostingCursor(
+            term,
+            self._data[docs_offset:docs_offset + df * 4].cast(U32),
+            self._data[starts_offset:starts_offset + (df + 1) * 4].cast(U32),
+            self._data[positions_offset:positions_offset + position_count * 2].cast(U16),
+            bm25_idf(len(self.corpus), df),
+            upper,
+        )
+
+    def score(self, cursor, n):
+        tf = cursor.tf()
+        return cursor.idf * tf * (self.k1 + 1) / (tf + self.norms[n])
+
+    def line_filter(self, character=None, season=None):
+        """Predicate on line ids for the route's character/season filters, or None."""
+        episodes = characters = None
+        if season not in (None, ""):
+            parsed = js_parse_int(season)
+            wanted = str(parsed) if parsed is not None else "NaN"
+            episodes = {i for i, episode in enumerate(self.corpus.episodes)
+                        if str(episode.get("season")) == wanted}
+        if character:
+            wanted = character.lower()
+            characters = {i for i, name in enumerate(self.corpus.characters) if wanted in name.lower()}
+        if episodes is None and characters is None:
+            return None
+        episode_ids, character_ids = self.corpus.episode_ids, self.corpus.character_ids
+        return lambda n: ((episodes is None or episode_ids[n] in episodes)
+                          and (characters is None or character_ids[n] in characters))
+
+    def search(self, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+        """
+        [(line_id, score)] best first; ties go to the earlier line. Without
+        keywords the filtered lines come back in corpus order with score 0.
+        `limit` None returns every match.
+        """
+        allowed = self.line_filter(character, season)
+        if not keywords or not keywords.strip():
+            lines = (n for n in range(len(self.corpus)) if allowed is None or allowed(n))
+            results = []
+            for n in lines:
+                if limit is not None and len(results) >= limit:
+                    break
+                results.append((n, 0.0))
+            return results
+
+        phrases, terms = parse_query(keywords)
+        k = limit if limit is not None else len(self.corpus)
+        if k <= 0:
+            return []
+        if phrases:
+            heap = self._phrase_search(phrases, terms, allowed, k)
+        else:
+            heap = self._max_score(terms, allowed, k)
+        return [(-neg_n, score) for score, neg_n in sorted(heap, reverse=True)]
+
+    def _max_score(self, terms, allowed, k):
+        """
+        MaxScore top-k over optional terms. Cursors are sorted by score upper
+        bound; the lowest ones whose bounds sum to no more than the current
+        k-th best score are "non-essential": they never select a line, only
+        add to lines the essential cursors found, and only while the line
+        could still beat the threshold.
+        """
+        cursors = sorted(filter(None, map(self.cursor, terms)), key=lambda c: c.upper)
+        bounds = list(itertools.accumulate(c.upper for c in cursors))
+        heap = []  # (score, -line_id): heap[0] is the worst kept result
+        threshold = -1.0
+        first_essential = 0
+        while first_essential < len(cursors):
+            essential = cursors[first_essential:]
+            n = min(c.doc for c in essential)
+            if n == END:
+                break
+            if allowed is not None and not allowed(n):
+                for c in essential:
+                    if c.doc == n:
+                        c.advance()
+                continue
+
+            parts = []
+            for c in essential:
+                if c.doc == n:
+                    parts.append(self.score(c, n))
+                    c.advance()
+            partial = sum(parts)
+            for i in range(first_essential - 1, -1, -1):
+                if partial + bounds[i] + SCORE_EPSILON <= threshold:
+                    break
+                c = cursors[i]
+                c.seek(n)
+                if c.doc == n:
+                    parts.append(self.score(c, n))
+                    partial += parts[-1]
+            score = math.fsum(parts)
+
+            if len(heap) < k:
+                heapq.heappush(heap, (score, -n))
+            elif score > threshold:
+                heapq.heapreplace(heap, (score, -n))
+            else:
+                continue
+            if len(heap) == k:
+                threshold = heap[0][0]
+                while first_essential < len(cursors) and bounds[first_essential] <= threshold:
+                    first_essential += 1
+        return heap
+
+    def _phrase_search(self, phrases, terms, allowed, k):
+        """
+        Phrases are required, so their terms are intersected first and the
+        position check runs only on lines holding all of them; bare terms
+        then add their scores to the survivors.
+        """
+        required = {}
+        for tokens, _ in phrases:
+            for token in tokens:
+                if token not in required:
+                    cursor = self.cursor(token)
+                    if cursor is None:
+                        return []
+                    required[token] = cursor
+        optional = [c for c in map(self.cursor, terms) if c is not None and c.term not in required]
+        drivers = sorted(required.values(), key=lambda c: c.size)
+
+        heap = []
+        n = drivers[0].doc
+        while n != END:
+            for c in drivers:
+                c.seek(n)
+                if c.doc != n:
+                    break
+            else:
+                if (allowed is None or allowed(n)) and all(
+                        phrase_matches([required[t].current_positions() for t in tokens], slop)
+                        for tokens, slop in phrases):
+                    parts = [self.score(c, n) for c in required.values()]
+                    for c in optional:
+                        c.seek(n)
+                        if c.doc == n:
+                            parts.append(self.score(c, n))
+                    score = math.fsum(parts)
+                    if len(heap) < k:
+                        heapq.heappush(heap, (score, -n))
+                    elif score > heap[0][0]:
+                        heapq.heapreplace(heap, (score, -n))
+                drivers[0].advance()
+                n = drivers[0].doc
+                continue
+            n = max(n, c.doc)
+        return heap
+
+    def search_docs(self, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+        docs = []
+        for n, score in self.search(keywords, character, season, limit):
+            doc = self.corpus.line(n)
+            doc["score"] = round(score, 4)
+            docs.append(doc)
+        return docs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the BM25 index of a corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build bm25.idx for a corpus directory")
+    build.add_argument("corpus", type=Path)
+    query = sub.add_parser("query", help="Run one ranked search")
+    query.add_argument("corpus", type=Path)
+    query.add_argument("--keywords")
+    query.add_argument("--character")
+    query.add_argument("--season")
+    query.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(args.corpus)
+        print(f"Indexed {count} terms into {args.corpus / INDEX_FILE}")
+        return
+
+    with BM25Index(args.corpus) as index:
+        for doc in index.search_docs(args.keywords, args.character, args.season, args.limit):
+            print(f"{doc['score']:7.3f} [S{doc['season']}] {doc['episode_title']} - "
+                  f"{doc['character']}: {doc['dialogue']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
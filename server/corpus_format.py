@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+Compact columnar corpus format for exported dialogue.
+
+A corpus is a directory:
+
+  meta.json          episode table, character dictionary, counts
+  episode_ids.u16    per-line episode id (index into meta["episodes"])
+  character_ids.u16  per-line character id (index into meta["characters"])
+  offsets.u32        line_count + 1 byte offsets into text.bin
+  text.bin           every dialogue line, UTF-8, packed back to back
+  ordinals.u32       per-line position in its episode (0xFFFFFFFF: none)
+  section_ids.u16    per-line section id (index into meta["sections"])
+  line_ids.bin       per-line line_id, 12 raw bytes each (all zero: none)
+
+Episode metadata (title, season, transcript/image URLs) is stored once per
+episode instead of once per line, characters are dictionary-encoded and the
+text is one blob, so the whole corpus is a fraction of dialogue_export.json.
+Corpus opens every file with mmap: looking up line N touches only the bytes
+of that line.
+
+Usage:
+  python corpus_format.py exports/corpus 1234    # print line 1234
+"""
+
+import json
+import mmap
+import os
+import shutil
+import sys
+from array import array
+from pathlib import Path
+
+FORMAT_VERSION = 2
+
+META_FILE = "meta.json"
+EPISODE_IDS_FILE = "episode_ids.u16"
+CHARACTER_IDS_FILE = "character_ids.u16"
+OFFSETS_FILE = "offsets.u32"
+TEXT_FILE = "text.bin"
+ORDINALS_FILE = "ordinals.u32"
+SECTION_IDS_FILE = "section_ids.u16"
+LINE_IDS_FILE = "line_ids.bin"
+
+NO_ORDINAL = 0xFFFFFFFF
+LINE_ID_BYTES = 12  # transcript_parser.LINE_ID_CHARS hex digits
+NO_LINE_ID = bytes(LINE_ID_BYTES)
+
+EPISODE_FIELDS = ["episode_title", "episode_number", "season", "season_name", "transcript", "image"]
+
+# array typecodes with the sizes the file names promise
+U16 = "H"
+U32 = "I" if array("I").itemsize == 4 else "L"
+
+
+class CorpusWriter:
+    """
+    Streaming writer: add() documents one at a time, then close(). Text goes
+    straight to disk; only the small per-line id/offset arrays stay in memory.
+    The corpus is built in a temporary directory and swapped in on close().
+    """
+
+    def __init__(self, out_dir):
+        self.out_dir = Path(out_dir)
+        self.tmp_dir = self.out_dir.with_name(self.out_dir.name + ".tmp")
+        if self.tmp_dir.exists():
+            shutil.rmtree(self.tmp_dir)
+        self.tmp_dir.mkdir(parents=True)
+        self._text = (self.tmp_dir / TEXT_FILE).open("wb")
+        self._line_ids = (self.tmp_dir / LINE_IDS_FILE).open("wb")
+        self.episodes = []
+        self.characters = []
+        self.sections = []
+        self._episode_ids = {}
+        self._character_ids = {}
+        self._section_ids = {}
+        self.episode_ids = array(U16)
+        self.character_ids = array(U16)
+        self.section_ids = array(U16)
+        self.ordinals = array(U32)
+        self.offsets = array(U32, [0])
+
+    def _episode_id(self, doc):
+        key = doc.get("episode_title")
+        episode_id = self._episode_ids.get(key)
+        if episode_id is None:
+            episode_id = len(self.episodes)
+            self._episode_ids[key] = episode_id
+            self.episodes.append({field: doc.get(field) for field in EPISODE_FIELDS})
+        return episode_id
+
+    def _character_id(self, name):
+        character_id = self._character_ids.get(name)
+        if character_id is None:
+            character_id = len(self.characters)
+            self._character_ids[name] = character_id
+            self.characters.append(name)
+        return character_id
+
+    def _section_id(self, name):
+        section_id = self._section_ids.get(name)
+        if section_id is None:
+            section_id = len(self.sections)
+            self._section_ids[name] = section_id
+            self.sections.append(name)
+        return section_id
+
+    def add(self, doc):
+        data = (doc.get("dialogue") or "").encode("utf-8")
+        self._text.write(data)
+        self.episode_ids.append(self._episode_id(doc))
+        self.character_ids.append(self._character_id(doc.get("character") or ""))
+        self.section_ids.append(self._section_id(doc.get("section")))
+        ordinal = doc.get("ordinal")
+        self.ordinals.append(NO_ORDINAL if ordinal is None else ordinal)
+        line_id = doc.get("line_id")
+        self._line_ids.write(bytes.fromhex(line_id) if line_id else NO_LINE_ID)
+        self.offsets.append(self.offsets[-1] + len(data))
+
+    def close(self):
+        self._text.close()
+        self._line_ids.close()
+        for name, values in ((EPISODE_IDS_FILE, self.episode_ids),
+                             (CHARACTER_IDS_FILE, self.character_ids),
+                             (OFFSETS_FILE, self.offsets),
+                             (ORDINALS_FILE, self.ordinals),
+                             (SECTION_IDS_FILE, self.section_ids)):
+            with (self.tmp_dir / name).open("wb") as f:
+                values.tofile(f)
+        meta = {
+            "format_version": FORMAT_VERSION,
+            "byteorder": sys.byteorder,
+            "line_count": len(self.episode_ids),
+            "episodes": self.episodes,
+            "characters": self.characters,
+            "sections": self.sections,
+        }
+        with (self.tmp_dir / META_FILE).open("w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+
+        old_dir = self.out_dir.with_name(self.out_dir.name + ".old")
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        if self.out_dir.exists():
+            os.replace(self.out_dir, old_dir)
+        os.replace(self.tmp_dir, self.out_dir)
+        if old_dir.exists():
+            shutil.rmtree(old_dir)
+        return len(self.episode_ids)
+
+
+def write_corpus(docs, out_dir):
+    """Write an iterable of export documents as a corpus. Returns line count."""
+    writer = CorpusWriter(out_dir)
+    for doc in docs:
+        writer.add(doc)
+    return writer.close()
+
+
+def _map(path):
+    """Read-only mmap of a file; empty files map to an empty buffer."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class Corpus:
+    """Read-only, memory-mapped view of a corpus directory."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with (self.path / META_FILE).open("r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+        if self.meta.get("format_version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus format {self.meta.get('format_version')}")
+        if self.meta.get("byteorder") != sys.byteorder:
+            raise ValueError(f"Corpus was written on a {self.meta.get('byteorder')}-endian machine")
+        self.episodes = self.meta["episodes"]
+        self.characters = self.meta["characters"]
+        self.sections = self.meta["sections"]
+
+        self._maps = [_map(self.path / name) for name in
+                      (EPISODE_IDS_FILE, CHARACTER_IDS_FILE, OFFSETS_FILE, TEXT_FILE,
+                       ORDINALS_FILE, SECTION_IDS_FILE, LINE_IDS_FILE)]
+        self.episode_ids = memoryview(self._maps[0]).cast(U16)
+        self.character_ids = memoryview(self._maps[1]).cast(U16)
+        self.offsets = memoryview(self._maps[2]).cast(U32)
+        self.text = memoryview(self._maps[3])
+        self.ordinals = memoryview(self._maps[4]).cast(U32)
+        self.section_ids = memoryview(self._maps[5]).cast(U16)
+        self.line_ids = memoryview(self._maps[6])
+
+    def __len__(self):
+        return len(self.episode_ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for view in (self.episode_ids, self.character_ids, self.offsets, self.text,
+                     self.ordinals, self.section_ids, self.line_ids):
+            view.release()
+        for m in self._maps:
+            if isinstance(m, mmap.mmap):
+                m.close()
+
+    def dialogue_bytes(self, n):
+        """UTF-8 bytes of line n as a zero-copy memoryview into text.bin."""
+        return self.text[self.offsets[n]:self.offsets[n + 1]]
+
+    def dialogue(self, n):
+        return str(self.dialogue_bytes(n), "utf-8")
+
+    def character(self, n):
+        return self.characters[self.character_ids[n]]
+
+    def episode(self, n):
+        return self.episodes[self.episode_ids[n]]
+
+    def ordinal(self, n):
+        ordinal = self.ordinals[n]
+        return None if ordinal == NO_ORDINAL else ordinal
+
+    def section(self, n):
+        return self.sections[self.section_ids[n]]
+
+    def line_id(self, n):
+        raw = bytes(self.line_ids[n * LINE_ID_BYTES:(n + 1) * LINE_ID_BYTES])
+        return None if raw == NO_LINE_ID else raw.hex()
+
+    def line(self, n):
+        """Line n as a document shaped like the JSON export."""
+        if not 0 <= n < len(self):
+            raise IndexError(n)
+        doc = dict(self.episode(n))
+        doc["character"] = self.character(n)
+        doc["dialogue"] = self.dialogue(n)
+        doc["line_id"] = self.line_id(n)
+        doc["ordinal"] = self.ordinal(n)
+        doc["section"] = self.section(n)
+        return doc
+
+    def __iter__(self):
+        for n in range(len(self)):
+            yield self.line(n)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print(__doc__.strip().splitlines()[-1])
+        sys.exit(2)
+    with Corpus(sys.argv[1]) as corpus:
+        print(json.dumps(corpus.line(int(sys.argv[2])), ensure_ascii=False, indent=2))
@@ -2,7 +2,7 @@
 # Run this to see what the BFDI wiki is actually returning
 
 import requests
-from bs4 import BeautifulSoup
+from html_parsing import PARSER_BACKEND, make_soup
 
 url = "https://battlefordreamisland.fandom.com/wiki/Take_the_Plunge:_Part_1/Transcript"
 
@@ -17,7 +17,9 @@ response = requests.get(url, headers=headers, timeout=30)
 print(f"Status: {response.status_code}")
 print(f"Content length: {len(response.text)} characters\n")
 
-soup = BeautifulSoup(response.content, "html.parser")
+# Full parse: the diagnostics below look outside the content div too
+soup = make_soup(response.content, content_only=False)
+print(f"Parser backend: {PARSER_BACKEND}")
 
 # Check for content div
 content_div = soup.find('div', {'class': 'mw-parser-output'})
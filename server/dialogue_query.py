@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Index-backed dialogue search straight against MongoDB.
+
+Takes the same parameters as GET /dialogue/search (routes/dialogue.js):
+
+- keywords   case-insensitive substring of the dialogue
+- character  case-insensitive substring of the character name
+- season     compared after parseInt, so "3" and "3rd" both mean season 3
+
+and returns results in transcript order (season, episode number, episode
+title, line ordinal, with _id as the tiebreak), one page at a time. The
+cursor of a page encodes that sort key of the last line it returned; the
+next page continues after it (keyset paging), so page 100 costs the same
+as page 1.
+
+Two keyword modes:
+
+  regex  exact route semantics (any substring, e.g. "lav" matches "lava")
+  text   the "dialogue_text" text index: a phrase search over whole words,
+         far faster on the full collection but "lav" no longer matches "lava"
+
+`setup` creates the indexes the queries rely on:
+
+  line_id            unique; the scraper syncs lines by it
+  episode_ordinal    (episode_title, ordinal)        a line by position, an episode in order
+  transcript_order   (season, episode_number, episode_title, ordinal, _id)
+                                                     sort + paging, season filter
+  character_season   (character, season)             character filter, scanned by key
+  dialogue_text      text index on dialogue (no stemming or stop words)
+
+Usage:
+  python dialogue_query.py setup
+  python dialogue_query.py search --keywords "yoylecake" --season 1
+  python dialogue_query.py search --character four --limit 20 --cursor WzEsMSwiVGFrZS...
+  python dialogue_query.py search --keywords "dream island" --mode text --explain
+"""
+
+import argparse
+import base64
+import binascii
+import json
+import os
+import re
+import sys
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from dotenv import load_dotenv
+from pymongo import ASCENDING, TEXT, IndexModel, MongoClient
+from pymongo.server_api import ServerApi
+
+DB_NAME = "BFDISearch"
+COLLECTION_NAME = "BFDI_Dialogue"
+
+PAGE_SIZE = 150  # Same as EXPORT_LIMIT in routes/dialogue.js
+MODES = ("regex", "text")
+RESULT_FIELDS = [
+    "episode_title", "episode_number", "season", "season_name",
+    "character", "dialogue", "transcript", "image", "line_id", "ordinal", "section",
+]
+RESULT_PROJECTION = {field: 1 for field in RESULT_FIELDS}
+# Transcript order; ordinal is per episode, _id breaks ties (and orders
+# older documents stored without an ordinal)
+SORT_FIELDS = ["season", "episode_number", "episode_title", "ordinal", "_id"]
+SORT = [(field, ASCENDING) for field in SORT_FIELDS]
+
+# Needed by the scraper's sync: one document per line_id (older documents
+# without one are skipped by the sparse index), and lines in episode order
+LINE_INDEXES = [
+    IndexModel([("line_id", ASCENDING)], name="line_id", unique=True, sparse=True),
+    IndexModel([("episode_title", ASCENDING), ("ordinal", ASCENDING)], name="episode_ordinal"),
+]
+
+INDEXES = LINE_INDEXES + [
+    IndexModel(SORT, name="transcript_order"),
+    IndexModel([("character", ASCENDING), ("season", ASCENDING)], name="character_season"),
+    # "none": index every word as written, so common words like "the" can be searched
+    IndexModel([("dialogue", TEXT)], name="dialogue_text", default_language="none",
+               language_override="text_language"),
+]
+
+LEADING_INT_RE = re.compile(r"^\s*([+-]?\d+)")
+
+
+def get_client():
+    load_dotenv()
+    uri = os.getenv("MONGODB_URI")
+    if not uri:
+        raise RuntimeError("MONGODB_URI not set in environment/.env")
+    return MongoClient(uri, server_api=ServerApi("1"))
+
+
+def ensure_indexes(collection):
+    """Create the search indexes (a no-op for ones that already exist). Returns their names."""
+    return collection.create_indexes(INDEXES)
+
+
+def parse_season(season):
+    """parseInt semantics: the leading integer of `season`, or None if there is none."""
+    if season is None or isinstance(season, int):
+        return season
+    match = LEADING_INT_RE.match(str(season))
+    return int(match.group(1)) if match else None
+
+
+def build_filter(keywords=None, character=None, season=None, mode="regex", after=None):
+    """
+    MongoDB filter for one search. Empty strings mean "no filter", like the
+    route; a season with no leading digits matches nothing.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    query = {}
+    if season not in (None, ""):
+        number = parse_season(season)
+        # The route compares String(doc.season) to "NaN" here, which never matches
+        query["season"] = number if number is not None else {"$in": []}
+    if character:
+        query["character"] = {"$regex": re.escape(character), "$options": "i"}
+    if keywords:
+        if mode == "text":
+            phrase = keywords.replace('"', " ").strip()
+            query["$text"] = {"$search": f'"{phrase}"', "$caseSensitive": False}
+        else:
+            query["dialogue"] = {"$regex": re.escape(keywords), "$options": "i"}
+    if after is not None:
+        query["$or"] = after_key(after)
+    return query
+
+
+def after_key(key):
+    """
+    Keyset condition "sort key > `key`" (a SORT_FIELDS list), spelled out
+    field by field: greater in the first field, or equal in it and greater
+    in the next, and so on. "Greater" follows BSON sort order, where null
+    and missing come before any value: greater than None is {"$ne": None}
+    (older lines without an ordinal sort before the numbered ones).
+    """
+    branches = []
+    for i, field in enumerate(SORT_FIELDS):
+        branch = dict(zip(SORT_FIELDS[:i], key[:i]))
+        branch[field] = {"$ne": None} if key[i] is None else {"$gt": key[i]}
+        branches.append(branch)
+    return branches
+
+
+def encode_cursor(doc):
+    """Opaque cursor for the page after `doc`: its sort key as URL-safe base64 JSON."""
+    key = [doc.get(field) for field in SORT_FIELDS]
+    key[-1] = str(key[-1])
+    return base64.urlsafe_b64encode(json.dumps(key, ensure_ascii=False).encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if not isinstance(key, list) or len(key) != len(SORT_FIELDS):
+            raise ValueError
+        key[-1] = ObjectId(key[-1])
+        return key
+    except (binascii.Error, UnicodeError, ValueError, InvalidId, TypeError, AttributeError):
+        raise ValueError(f"invalid cursor: {cursor!r}") from None
+
+
+def search(collection, keywords=None, character=None, season=None, limit=PAGE_SIZE, cursor=None,
+           mode="regex"):
+    """
+    One page of matching lines in transcript order. Returns (docs, next_cursor);
+    next_cursor is None on the last page. Each doc's _id is a string.
+    """
+    limit = max(1, int(limit))
+    query = build_filter(keywords, character, season, mode, decode_cursor(cursor))
+    docs = list(
+        collection.find(query, RESULT_PROJECTION)
+        .sort(SORT)
+        .limit(limit + 1)  # One extra to learn whether another page exists
+    )
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1])
+    for doc in docs:
+        doc["_id"] = str(doc["_id"])
+    return docs, next_cursor
+
+
+def explain(collection, keywords=None, character=None, season=None, limit=PAGE_SIZE, cursor=None,
+            mode="regex"):
+    """Winning plan stages and scan counts for a search, for checking index use."""
+    query = build_filter(keywords, character, season, mode, decode_cursor(cursor))
+    plan = collection.find(query, RESULT_PROJECTION).sort(SORT).limit(limit + 1).explain()
+
+    stages = []
+    node = plan.get("queryPlanner", {}).get("winningPlan", {})
+    node = node.get("queryPlan", node)  # Slot-based engine nests the classic shape
+    while node:
+        label = node.get("stage", "?")
+        if node.get("indexName"):
+            label += f"({node['indexName']})"
+        stages.append(label)
+        node = node.get("inputStage") or (node.get("inputStages") or [None])[0]
+    stats = plan.get("executionStats", {})
+    return {
+        "stages": stages,
+        "keys_examined": stats.get("totalKeysExamined"),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "returned": stats.get("nReturned"),
+        "millis": stats.get("executionTimeMillis"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search BFDI dialogue in MongoDB using its indexes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("setup", help="Create the search indexes")
+    find = sub.add_parser("search", help="One page of search results as JSON")
+    find.add_argument("--keywords")
+    find.add_argument("--character")
+    find.add_argument("--season")
+    find.add_argument("--mode", choices=MODES, default="regex", help="Keyword matching (see module docs)")
+    find.add_argument("--limit", type=int, default=PAGE_SIZE, help="Results per page")
+    find.add_argument("--cursor", help="next_cursor of the previous page")
+    find.add_argument("--explain", action="store_true", help="Show the query plan instead of results")
+    args = parser.parse_args()
+
+    collection = get_client()[DB_NAME][COLLECTION_NAME]
+    if args.command == "setup":
+        names = ensure_indexes(collection)
+        print(f"Indexes on {DB_NAME}.{COLLECTION_NAME}: {', '.join(names)}")
+        return
+
+    params = dict(keywords=args.keywords, character=args.character, season=args.season,
+                  limit=args.limit, cursor=args.cursor, mode=args.mode)
+    if args.explain:
+        print(json.dumps(explain(collection, **params), indent=2))
+        return
+    docs, next_cursor = search(collection, **params)
+    json.dump({"results": docs, "next_cursor": next_cursor}, sys.stdout, ensure_ascii=False, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,24 +4,60 @@ Export dialogue documents from MongoDB to local JSON files.
 Usage examples:
   python export_dialogue.py                   # exports all docs to exports/dialogue_export.json
   python export_dialogue.py --out my_dump.json
+  python export_dialogue.py --format ndjson   # one document per line to exports/dialogue_export.ndjson
   python export_dialogue.py --per-episode     # writes one JSON per episode into exports/episodes/
+  python export_dialogue.py --corpus          # also writes the compact columnar corpus into exports/corpus/
+                                              # plus its trigram/BM25 search indexes and facet cube
+  python export_dialogue.py --shards          # per-season and per-episode shards + manifest into exports/shards/
+
+The shards are an export artifact only: no consumer (routes/dialogue.js or the
+client) reads them yet, so they do not shrink client downloads by themselves.
 
 Requires MONGODB_URI in .env (same as scraper). DB: BFDISearch, collection: BFDI_Dialogue.
 """
 
 import argparse
+import gzip
+import hashlib
+import itertools
 import json
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+import brotli
 from dotenv import load_dotenv
 from pymongo import MongoClient
 from pymongo.server_api import ServerApi
 
+import bm25_search
+import facet_cube
+import trigram_index
+from corpus_format import write_corpus
+
 DB_NAME = "BFDISearch"
 COLLECTION_NAME = "BFDI_Dialogue"
 DEFAULT_OUT = Path(__file__).resolve().parent / "exports" / "dialogue_export.json"
 DEFAULT_EPISODE_DIR = Path(__file__).resolve().parent / "exports" / "episodes"
+DEFAULT_CORPUS_DIR = Path(__file__).resolve().parent / "exports" / "corpus"
+DEFAULT_SHARD_DIR = Path(__file__).resolve().parent / "exports" / "shards"
+
+# Fields written by the scraper; anything else in the collection is left out
+EXPORT_FIELDS = [
+    "episode_title", "episode_number", "season", "season_name",
+    "character", "dialogue", "transcript", "image", "line_id", "ordinal", "section",
+]
+EXPORT_PROJECTION = {field: 1 for field in EXPORT_FIELDS}
+EXPORT_BATCH_SIZE = 2000
+# Transcript order: lines synced into an episode later still sort by ordinal
+EPISODE_SORT = [("season", 1), ("episode_number", 1), ("episode_title", 1), ("ordinal", 1), ("_id", 1)]
+EPISODE_WRITERS = 4
+SHARD_MANIFEST = "manifest.json"
+SHARD_HASH_CHARS = 12
+SHARD_MANIFEST_VERSION = 1
 
 
 def get_client():
@@ -32,49 +68,225 @@ def get_client():
     return MongoClient(uri, server_api=ServerApi("1"))
 
 
-def export_all(collection, out_path: Path):
+def indent_json(text, prefix="  "):
+    """
+    Indent JSON text one array level. Splits only at "\n": with
+    ensure_ascii=False strings keep U+2028, U+0085 and the like unescaped,
+    and textwrap.indent (str.splitlines) would indent inside them.
+    """
+    return prefix + text.replace("\n", "\n" + prefix)
+
+
+def export_all(collection, out_path: Path, fmt: str = "json", batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Stream the collection to `out_path`, in transcript order, without holding it in memory.
+    fmt="json" writes the same indented JSON array as before, one document at
+    a time; fmt="ndjson" writes one compact document per line. The file is
+    written under a temporary name and renamed into place when complete.
+    """
     out_path.parent.mkdir(parents=True, exist_ok=True)
-    docs = list(collection.find({}))
-    with out_path.open("w", encoding="utf-8") as f:
-        json.dump(docs, f, ensure_ascii=False, indent=2, default=str)
-    return len(docs)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    cursor = collection.find({}, EXPORT_PROJECTION, sort=EPISODE_SORT,
+                             batch_size=batch_size, allow_disk_use=True)
+    count = 0
+    with tmp_path.open("w", encoding="utf-8") as f:
+        if fmt == "ndjson":
+            for doc in cursor:
+                f.write(json.dumps(doc, ensure_ascii=False, default=str))
+                f.write("\n")
+                count += 1
+        else:
+            f.write("[")
+            for doc in cursor:
+                f.write(",\n" if count else "\n")
+                f.write(indent_json(json.dumps(doc, ensure_ascii=False, indent=2, default=str)))
+                count += 1
+            f.write("\n]" if count else "]")
+    os.replace(tmp_path, out_path)
+    return count
 
 
 def sanitize_filename(name: str) -> str:
     return "".join(c if c.isalnum() or c in ("-", "_", " ") else "_" for c in name).strip().replace(" ", "_")
 
 
-def export_per_episode(collection, out_dir: Path):
+def write_json_atomic(out_path: Path, docs):
+    """Write to a temp file in the same directory, then rename into place."""
+    fd, tmp = tempfile.mkstemp(dir=out_path.parent, prefix=f".{out_path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(docs, f, ensure_ascii=False, indent=2, default=str)
+        os.replace(tmp, out_path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def iter_episodes(collection, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    One sorted pass over the collection, yielding (episode_title, docs) per
+    episode. Only one episode's documents are materialized at a time.
+    """
+    cursor = collection.find({}, EXPORT_PROJECTION, sort=EPISODE_SORT,
+                             batch_size=batch_size, allow_disk_use=True)
+    for title, group in itertools.groupby(cursor, key=lambda doc: doc.get("episode_title")):
+        yield title, list(group)
+
+
+def export_per_episode(collection, out_dir: Path, workers: int = EPISODE_WRITERS):
     out_dir.mkdir(parents=True, exist_ok=True)
-    episodes = collection.distinct("episode")
     total = 0
-    for ep in episodes:
-        docs = list(collection.find({"episode": ep}))
-        total += len(docs)
-        safe = sanitize_filename(ep or "unknown") or "unknown"
-        out_path = out_dir / f"{safe}.json"
-        with out_path.open("w", encoding="utf-8") as f:
-            json.dump(docs, f, ensure_ascii=False, indent=2, default=str)
-    return total, len(episodes)
+    episodes = 0
+    pending = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for title, docs in iter_episodes(collection):
+            total += len(docs)
+            episodes += 1
+            safe = sanitize_filename(title or "unknown") or "unknown"
+            pending.append(pool.submit(write_json_atomic, out_dir / f"{safe}.json", docs))
+            # Bound the number of episodes held in memory waiting for a writer
+            if len(pending) >= workers * 2:
+                pending.pop(0).result()
+        for future in pending:
+            future.result()
+    return total, episodes
+
+
+def export_corpus(collection, out_dir: Path, batch_size: int = EXPORT_BATCH_SIZE):
+    """Write the columnar corpus (see corpus_format.py) in transcript order."""
+    out_dir.parent.mkdir(parents=True, exist_ok=True)
+    cursor = collection.find({}, EXPORT_PROJECTION, sort=EPISODE_SORT,
+                             batch_size=batch_size, allow_disk_use=True)
+    return write_corpus(cursor, out_dir)
+
+
+def write_shard(out_dir: Path, stem: str, docs):
+    """
+    Write `docs` as compact JSON plus .gz and .br copies, named by content
+    hash so they can be cached forever. Returns the shard's manifest entry.
+    """
+    data = json.dumps(docs, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{stem}.{digest[:SHARD_HASH_CHARS]}.json"
+    entry = {"file": name, "sha256": digest, "lines": len(docs), "bytes": len(data)}
+    encoded = {
+        "json": data,
+        "gzip": gzip.compress(data, compresslevel=9, mtime=0),
+        "br": brotli.compress(data, quality=11),
+    }
+    for encoding, payload in encoded.items():
+        suffix = {"json": "", "gzip": ".gz", "br": ".br"}[encoding]
+        (out_dir / f"{name}{suffix}").write_bytes(payload)
+        if suffix:
+            entry[f"{encoding}_bytes"] = len(payload)
+    return entry
+
+
+def export_shards(collection, out_dir: Path, workers: int = EPISODE_WRITERS, batch_size: int = EXPORT_BATCH_SIZE):
+    """
+    Write one shard per season and one per episode from a single sorted pass,
+    plus manifest.json describing them. Shards go into a temporary directory
+    that replaces `out_dir` when complete, so stale hashes never linger.
+    Export only: routes/dialogue.js and the client still load
+    dialogue_export.json, and nothing reads the shards yet.
+    """
+    tmp_dir = out_dir.with_name(out_dir.name + ".tmp")
+    if tmp_dir.exists():
+        shutil.rmtree(tmp_dir)
+    (tmp_dir / "seasons").mkdir(parents=True)
+    (tmp_dir / "episodes").mkdir()
+
+    seasons = []
+    total = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        episodes = iter_episodes(collection, batch_size)
+        for season, group in itertools.groupby(episodes, key=lambda item: item[1][0].get("season")):
+            season_docs = []
+            episode_jobs = []
+            for title, docs in group:
+                season_docs.extend(docs)
+                safe = sanitize_filename(title or "unknown") or "unknown"
+                episode_jobs.append((title, docs[0].get("episode_number"),
+                                     pool.submit(write_shard, tmp_dir / "episodes", safe, docs)))
+            season_stem = f"season-{sanitize_filename(str(season)) or 'unknown'}"
+            season_entry = write_shard(tmp_dir / "seasons", season_stem, season_docs)
+            season_entry["file"] = f"seasons/{season_entry['file']}"
+            season_entry = {"season": season, "season_name": season_docs[0].get("season_name"),
+                            **season_entry, "episodes": []}
+            for title, number, future in episode_jobs:
+                episode_entry = future.result()
+                episode_entry["file"] = f"episodes/{episode_entry['file']}"
+                season_entry["episodes"].append({"episode_title": title, "episode_number": number, **episode_entry})
+            seasons.append(season_entry)
+            total += len(season_docs)
+
+    manifest = {
+        "version": SHARD_MANIFEST_VERSION,
+        "encodings": ["gzip", "br"],
+        "lines": total,
+        "seasons": seasons,
+    }
+    with (tmp_dir / SHARD_MANIFEST).open("w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, default=str)
+
+    old_dir = out_dir.with_name(out_dir.name + ".old")
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    if out_dir.exists():
+        os.replace(out_dir, old_dir)
+    os.replace(tmp_dir, out_dir)
+    if old_dir.exists():
+        shutil.rmtree(old_dir)
+    return total, len(seasons), sum(len(season["episodes"]) for season in seasons)
 
 
 def main():
     parser = argparse.ArgumentParser(description="Export BFDI dialogue from MongoDB")
-    parser.add_argument("--out", type=Path, default=DEFAULT_OUT, help="Path to combined JSON export")
+    parser.add_argument("--out", type=Path, default=None, help="Path to combined export (default: exports/dialogue_export.<format>)")
+    parser.add_argument("--format", choices=("json", "ndjson"), default="json", help="Combined export format")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE, help="MongoDB cursor batch size")
     parser.add_argument("--per-episode", action="store_true", help="Also write one JSON file per episode")
     parser.add_argument("--episode-dir", type=Path, default=DEFAULT_EPISODE_DIR, help="Directory for per-episode exports")
+    parser.add_argument("--corpus", action="store_true", help="Also write the compact columnar corpus")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR, help="Directory for the columnar corpus")
+    parser.add_argument("--episode-writers", type=int, default=EPISODE_WRITERS, help="Threads writing per-episode files")
+    parser.add_argument("--shards", action="store_true", help="Also write compressed per-season/per-episode shards with a manifest")
+    parser.add_argument("--shard-dir", type=Path, default=DEFAULT_SHARD_DIR, help="Directory for sharded exports")
     args = parser.parse_args()
 
     client = get_client()
     collection = client[DB_NAME][COLLECTION_NAME]
 
-    count = export_all(collection, args.out)
-    print(f"Exported {count} documents to {args.out}")
+    out_path = args.out or DEFAULT_OUT.with_suffix(f".{args.format}")
+    start = time.perf_counter()
+    count = export_all(collection, out_path, args.format, args.batch_size)
+    elapsed = time.perf_counter() - start
+    print(f"Exported {count} documents to {out_path} in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} docs/s)")
+
+    if args.corpus:
+        lines = export_corpus(collection, args.corpus_dir, args.batch_size)
+        size = sum(p.stat().st_size for p in args.corpus_dir.iterdir())
+        print(f"Wrote columnar corpus ({lines} lines, {size / 1024:.0f} KiB) to {args.corpus_dir}")
+        trigram_count = trigram_index.build_index(args.corpus_dir)
+        print(f"Indexed {trigram_count} trigrams into {args.corpus_dir / trigram_index.INDEX_FILE}")
+        term_count = bm25_search.build_index(args.corpus_dir)
+        print(f"Indexed {term_count} terms into {args.corpus_dir / bm25_search.INDEX_FILE}")
+        shape = facet_cube.build_cube(args.corpus_dir)
+        print(f"Built {shape[0] - 1}x{shape[1] - 1}x{shape[2] - 1} facet cube into "
+              f"{args.corpus_dir / facet_cube.CUBE_FILE}")
 
     if args.per_episode:
-        total, ep_count = export_per_episode(collection, args.episode_dir)
+        total, ep_count = export_per_episode(collection, args.episode_dir, args.episode_writers)
         print(f"Exported {total} documents across {ep_count} episode files into {args.episode_dir}")
 
+    if args.shards:
+        total, season_count, ep_count = export_shards(collection, args.shard_dir, args.episode_writers, args.batch_size)
+        print(f"Sharded {total} documents into {season_count} seasons / {ep_count} episodes "
+              f"(gzip + brotli) under {args.shard_dir}")
+
 
 if __name__ == "__main__":
     main()
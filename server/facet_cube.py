@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Precomputed facet cube of line and word counts over a columnar corpus
+(see corpus_format.py).
+
+The cube is indexed [character, season, episode]; the last slot of every axis
+is "all", so any combination of filters (e.g. one character in one season
+across all episodes) is a single array lookup:
+
+  lines[c, s, e]   number of dialogue lines
+  words[c, s, e]   number of whitespace-separated words in those lines
+
+It is built with numpy from the corpus' integer columns: word counts come
+from one pass over text.bin, and each measure is one bincount over a flat
+(character, season, episode) cell index. The cube is saved as facets.npz
+inside the corpus directory.
+
+Usage:
+  python facet_cube.py build exports/corpus
+  python facet_cube.py count exports/corpus --character Four --episode "The Power of Three"
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+
+from corpus_format import Corpus
+
+CUBE_FILE = "facets.npz"
+WHITESPACE = np.frombuffer(b" \t\n\r\x0b\x0c", dtype=np.uint8)  # What bytes.split() splits on
+
+
+def line_word_counts(corpus):
+    """Words per line (bytes.split() semantics), computed over text.bin at once."""
+    text = np.frombuffer(corpus.text, dtype=np.uint8)
+    offsets = np.frombuffer(corpus.offsets, dtype=np.uint32).astype(np.int64)
+    space = np.isin(text, WHITESPACE)
+    # A word starts at a non-space byte that follows a space or begins a line
+    follows_space = np.empty(len(text), dtype=bool)
+    if len(text):
+        follows_space[0] = True
+        follows_space[1:] = space[:-1]
+        starts = offsets[:-1][offsets[:-1] < len(text)]
+        follows_space[starts] = True
+    word_starts = np.concatenate(([0], np.cumsum(~space & follows_space, dtype=np.int64)))
+    return word_starts[offsets[1:]] - word_starts[offsets[:-1]]
+
+
+def build_cube(corpus_dir):
+    """Build facets.npz for the corpus in `corpus_dir`. Returns the cube shape."""
+    corpus_dir = Path(corpus_dir)
+    with Corpus(corpus_dir) as corpus:
+        characters = list(corpus.characters)
+        episodes = [episode.get("episode_title") or "" for episode in corpus.episodes]
+        episode_seasons = [str(episode.get("season")) for episode in corpus.episodes]
+        seasons = sorted(set(episode_seasons), key=lambda s: (not s.isdigit(), int(s) if s.isdigit() else 0, s))
+        season_codes = np.array([seasons.index(s) for s in episode_seasons], dtype=np.int64)
+
+        episode_ids = np.frombuffer(corpus.episode_ids, dtype=np.uint16).astype(np.int64)
+        character_ids = np.frombuffer(corpus.character_ids, dtype=np.uint16).astype(np.int64)
+        season_ids = season_codes[episode_ids] if len(episode_ids) else episode_ids
+        words = line_word_counts(corpus)
+
+    shape = (len(characters) + 1, len(seasons) + 1, len(episodes) + 1)
+    cells = np.ravel_multi_index((character_ids, season_ids, episode_ids), shape)
+    size = shape[0] * shape[1] * shape[2]
+    cubes = {
+        "lines": np.bincount(cells, minlength=size).reshape(shape),
+        "words": np.bincount(cells, weights=words, minlength=size).astype(np.int64).reshape(shape),
+    }
+    for cube in cubes.values():
+        # Fill the "all" slots one axis at a time; later axes sum earlier totals
+        cube[:, :, -1] = cube[:, :, :-1].sum(axis=2)
+        cube[:, -1, :] = cube[:, :-1, :].sum(axis=1)
+        cube[-1, :, :] = cube[:-1, :, :].sum(axis=0)
+
+    path = corpus_dir / CUBE_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        np.savez_compressed(
+            f,
+            lines=cubes["lines"].astype(np.uint32),
+            words=cubes["words"].astype(np.uint32),
+            characters=np.array(characters, dtype=str),
+            seasons=np.array(seasons, dtype=str),
+            episodes=np.array(episodes, dtype=str),
+        )
+    tmp.replace(path)
+    return shape
+
+
+class FacetCube:
+    """Loaded facet cube; count() and the top_*() helpers are array lookups."""
+
+    def __init__(self, corpus_dir):
+        with np.load(Path(corpus_dir) / CUBE_FILE, allow_pickle=False) as data:
+            # Stored as uint32 to stay small; signed in memory so negation sorts
+            self.lines = data["lines"].astype(np.int64)
+            self.words = data["words"].astype(np.int64)
+            self.characters = data["characters"].tolist()
+            self.seasons = data["seasons"].tolist()
+            self.episodes = data["episodes"].tolist()
+        self._character_index = {name: i for i, name in enumerate(self.characters)}
+        for i, name in enumerate(self.characters):
+            self._character_index.setdefault(name.lower(), i)
+        self._season_index = {season: i for i, season in enumerate(self.seasons)}
+        self._episode_index = {title.lower(): i for i, title in enumerate(self.episodes)}
+
+    @staticmethod
+    def _slot(index, key, size):
+        """Axis position for `key`: the "all" slot for None, -1 if unknown."""
+        if key is None:
+            return size
+        return index.get(key, -1)
+
+    def cell(self, character=None, season=None, episode=None):
+        """(c, s, e) cube index, or None if any filter names nothing in the corpus."""
+        if character is not None and character not in self._character_index:
+            character = character.lower()
+        c = self._slot(self._character_index, character, len(self.characters))
+        s = self._slot(self._season_index, str(season) if season is not None else None, len(self.seasons))
+        e = self._slot(self._episode_index, episode.lower() if episode is not None else None,
+                       len(self.episodes))
+        if min(c, s, e) < 0:
+            return None
+        return c, s, e
+
+    def count(self, character=None, season=None, episode=None):
+        """{'lines', 'words'} for a character name / season / episode title (None = all)."""
+        cell = self.cell(character, season, episode)
+        if cell is None:
+            return {"lines": 0, "words": 0}
+        return {"lines": int(self.lines[cell]), "words": int(self.words[cell])}
+
+    def top_characters(self, season=None, episode=None, n=10, measure="lines"):
+        """[(character, count)] with the most lines (or words), best first."""
+        cell = self.cell(None, season, episode)
+        if cell is None:
+            return []
+        column = getattr(self, measure)[:-1, cell[1], cell[2]]
+        order = np.argsort(-column, kind="stable")[:n]
+        return [(self.characters[i], int(column[i])) for i in order if column[i]]
+
+    def top_episodes(self, character=None, season=None, n=10, measure="lines"):
+        """[(episode_title, count)] with the most lines (or words), best first."""
+        cell = self.cell(character, season, None)
+        if cell is None:
+            return []
+        row = getattr(self, measure)[cell[0], cell[1], :-1]
+        order = np.argsort(-row, kind="stable")[:n]
+        return [(self.episodes[i], int(row[i])) for i in order if row[i]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the facet cube of a corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build facets.npz for a corpus directory")
+    build.add_argument("corpus", type=Path)
+    count = sub.add_parser("count", help="Line/word counts for a filter combination")
+    count.add_argument("corpus", type=Path)
+    count.add_argument("--character")
+    count.add_argument("--season")
+    count.add_argument("--episode")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        shape = build_cube(args.corpus)
+        print(f"Built {shape[0] - 1} characters x {shape[1] - 1} seasons x {shape[2] - 1} episodes "
+              f"cube into {args.corpus / CUBE_FILE}")
+        return
+
+    cube = FacetCube(args.corpus)
+    result = cube.count(args.character, args.season, args.episode)
+    print(f"{result['lines']} lines, {result['words']} words")
+    if args.character is None:
+        for name, lines in cube.top_characters(args.season, args.episode, n=5):
+            print(f"  {lines:6}  {name}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
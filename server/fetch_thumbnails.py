@@ -2,84 +2,264 @@
 Fetch YouTube thumbnails for episodes using yt-dlp search and save a thumbnail map.
 
 - Uses EPISODES from episodes.py
-- For each title, runs yt-dlp with ytsearch1:<title> BFDI to grab the first result thumbnail
+- For each title, runs a flat yt-dlp search (ytsearch1:<title> BFDI) for the first result
+  and downloads that video's largest thumbnail
 - Saves thumbnails under server/exports/thumbnails
 - Writes an index JSON at server/exports/thumbnails/index.json with:
     { "episode_title": {"filename": "<file>", "video_url": "<url>", "id": "<video_id>"}, ... }
 
+Runs are incremental: titles whose index entry points at a valid image file are
+skipped, search results are cached in search_cache.json for --search-ttl seconds,
+and index.json is rewritten atomically after every finished episode, so an
+interrupted run keeps its progress. Searches run on a small worker pool, each
+worker reusing one YoutubeDL instance and one HTTP session.
+
 Prereqs: yt-dlp installed (pip install yt-dlp). Internet access required for fetching.
 Usage:
   python fetch_thumbnails.py
+  python fetch_thumbnails.py --workers 8 --force
 """
 
+import argparse
 import json
 import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from urllib.parse import urlparse
 
+import requests
 from yt_dlp import YoutubeDL
 
 from episodes import EPISODES
 
 OUT_DIR = Path(__file__).resolve().parent / "exports" / "thumbnails"
 INDEX_PATH = OUT_DIR / "index.json"
+SEARCH_CACHE_PATH = OUT_DIR / "search_cache.json"
+
+WORKERS = 4
+SEARCH_TTL = 30 * 86400  # Search results for an episode title rarely change
+IMAGE_EXTENSIONS = ("jpg", "png", "webp", "jpeg")
+IMAGE_MAGIC = (b"\xff\xd8\xff", b"\x89PNG\r\n\x1a\n")
+
+_local = threading.local()
 
 
 def sanitize(name: str) -> str:
     return "".join(c if c.isalnum() or c in ("-", "_") else "_" for c in name).strip("_") or "untitled"
 
 
-def fetch_thumbnail(title: str, season: int | None = None):
-    query = f"ytsearch1:{title} BFDI"
+def search_query(title: str, season: int | None = None) -> str:
     if season:
-        query = f"ytsearch1:{title} BFDI Season {season}"
+        return f"ytsearch1:{title} BFDI Season {season}"
+    return f"ytsearch1:{title} BFDI"
+
+
+def is_valid_image(path: Path) -> bool:
+    """File exists, is non-empty and starts like a JPEG/PNG/WebP image."""
+    try:
+        with path.open("rb") as f:
+            head = f.read(12)
+    except OSError:
+        return False
+    if head.startswith(b"RIFF"):
+        return head[8:12] == b"WEBP"
+    return any(head.startswith(magic) for magic in IMAGE_MAGIC)
+
+
+def write_json_atomic(path: Path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def load_json(path: Path) -> dict:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+class JsonStore:
+    """A dict persisted as JSON, saved atomically on every update."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = load_json(path)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self.data.get(key)
+
+    def put(self, key, value):
+        with self._lock:
+            self.data[key] = value
+            write_json_atomic(self.path, self.data)
+
+
+# =============================================================================
+# PER-THREAD CLIENTS
+# =============================================================================
 
-    safe = sanitize(title)
-    outtmpl = str(OUT_DIR / f"{safe}.%(ext)s")
+def get_ydl() -> YoutubeDL:
+    """One flat-search YoutubeDL per worker thread, created on first use."""
+    ydl = getattr(_local, "ydl", None)
+    if ydl is None:
+        ydl = _local.ydl = YoutubeDL({
+            "quiet": True,
+            "no_warnings": True,
+            "skip_download": True,
+            "extract_flat": "in_playlist",
+        })
+    return ydl
 
-    ydl_opts = {
-        "skip_download": True,
-        "writethumbnail": True,
-        "writeinfojson": False,
-        "quiet": True,
-        "outtmpl": outtmpl,
+
+def get_http() -> requests.Session:
+    session = getattr(_local, "http", None)
+    if session is None:
+        session = _local.http = requests.Session()
+    return session
+
+
+# =============================================================================
+# SEARCH + DOWNLOAD
+# =============================================================================
+
+def best_thumbnail_url(entry: dict) -> str | None:
+    thumbnails = entry.get("thumbnails") or []
+    if thumbnails:
+        best = max(thumbnails, key=lambda t: (t.get("width") or 0) * (t.get("height") or 0))
+        if best.get("url"):
+            return best["url"]
+    if entry.get("id"):
+        return f"https://i.ytimg.com/vi/{entry['id']}/hqdefault.jpg"
+    return None
+
+
+def search_video(query: str) -> dict | None:
+    """First search result as {'id', 'video_url', 'thumbnail_url'}, or None."""
+    info = get_ydl().extract_info(query, download=False)
+    entries = [e for e in (info.get("entries") or []) if e]
+    if not entries:
+        return None
+    entry = entries[0]
+    video_url = entry.get("webpage_url") or entry.get("url")
+    if video_url and not video_url.startswith("http"):
+        video_url = f"https://www.youtube.com/watch?v={entry.get('id')}"
+    return {
+        "id": entry.get("id"),
+        "video_url": video_url,
+        "thumbnail_url": best_thumbnail_url(entry),
     }
 
-    with YoutubeDL(ydl_opts) as ydl:
-        info = ydl.extract_info(query, download=True)
 
-    # Resolve thumbnail file (yt-dlp saves alongside)
-    # Find the first file matching the safe prefix
-    for ext in ("jpg", "png", "webp", "jpeg"):
-        candidate = OUT_DIR / f"{safe}.{ext}"
-        if candidate.exists():
-            return candidate.name, info.get("webpage_url"), info.get("id")
-    return None, info.get("webpage_url"), info.get("id")
+def cached_search(search_cache: JsonStore, query: str, ttl: float) -> dict | None:
+    cached = search_cache.get(query)
+    if cached and time.time() - cached.get("searched_at", 0) < ttl:
+        return cached
+    result = search_video(query)
+    if result:
+        result["searched_at"] = time.time()
+        search_cache.put(query, result)
+    return result
+
+
+def download_thumbnail(url: str, safe: str) -> str:
+    response = get_http().get(url, timeout=30)
+    response.raise_for_status()
+    ext = Path(urlparse(url).path).suffix.lstrip(".").lower()
+    if ext not in IMAGE_EXTENSIONS:
+        ext = "jpg"
+    path = OUT_DIR / f"{safe}.{ext}"
+    fd, tmp = tempfile.mkstemp(dir=OUT_DIR, prefix=f".{safe}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(response.content)
+        if not is_valid_image(Path(tmp)):
+            raise ValueError(f"not an image: {url}")
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return path.name
+
+
+def fetch_thumbnail(title: str, season: int | None, search_cache: JsonStore, ttl: float):
+    result = cached_search(search_cache, search_query(title, season), ttl)
+    if not result:
+        return None, None, None
+    if not result.get("thumbnail_url"):
+        return None, result.get("video_url"), result.get("id")
+    filename = download_thumbnail(result["thumbnail_url"], sanitize(title))
+    return filename, result.get("video_url"), result.get("id")
+
+
+def has_valid_thumbnail(entry) -> bool:
+    return bool(entry and entry.get("filename") and is_valid_image(OUT_DIR / entry["filename"]))
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Fetch YouTube thumbnails for every episode")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Parallel searches/downloads")
+    parser.add_argument("--search-ttl", type=float, default=SEARCH_TTL, help="Seconds to reuse cached search results")
+    parser.add_argument("--force", action="store_true", help="Refetch titles that already have a valid thumbnail")
+    args = parser.parse_args()
+
     OUT_DIR.mkdir(parents=True, exist_ok=True)
-    thumb_index = {}
+    thumb_index = JsonStore(INDEX_PATH)
+    search_cache = JsonStore(SEARCH_CACHE_PATH)
 
+    todo = []
+    skipped = 0
     for ep in EPISODES:
         title = ep.get("title")
-        season = ep.get("season")
-        try:
-            filename, url, vid = fetch_thumbnail(title, season)
+        if not args.force and has_valid_thumbnail(thumb_index.get(title)):
+            skipped += 1
+            continue
+        todo.append(ep)
+    print(f"{len(todo)} episodes to fetch, {skipped} already have thumbnails")
+
+    fetched = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = {
+            pool.submit(fetch_thumbnail, ep.get("title"), ep.get("season"), search_cache, args.search_ttl): ep
+            for ep in todo
+        }
+        for future in as_completed(futures):
+            title = futures[future].get("title")
+            try:
+                filename, url, vid = future.result()
+            except Exception as e:
+                print(f"FAIL {title}: {e}")
+                continue
             if filename:
-                thumb_index[title] = {
+                thumb_index.put(title, {
                     "filename": filename,
                     "video_url": url,
                     "id": vid,
-                }
+                })
+                fetched += 1
                 print(f"OK thumbnail for {title} -> {filename}")
             else:
                 print(f"NO THUMB for {title} (id={vid} url={url})")
-        except Exception as e:
-            print(f"FAIL {title}: {e}")
 
-    with INDEX_PATH.open("w", encoding="utf-8") as f:
-        json.dump(thumb_index, f, ensure_ascii=False, indent=2)
-    print(f"Wrote index: {INDEX_PATH} ({len(thumb_index)} entries)")
+    print(f"Wrote index: {INDEX_PATH} ({len(thumb_index.data)} entries, {fetched} fetched, {skipped} skipped)")
 
 
 if __name__ == "__main__":
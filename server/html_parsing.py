@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+HTML parser backend selection and content-only parsing for transcript pages.
+
+A fandom page is mostly site chrome (nav, rail, ads, scripts); the parser
+only ever looks at the `mw-parser-output` content div and the infobox title
+card image. make_soup() builds a tree of just those elements with the
+fastest available backend (lxml when installed, else Python's html.parser).
+Set BFDI_HTML_PARSER to force a backend, e.g. "html.parser" or "html5lib".
+"""
+
+import os
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    DEFAULT_BACKEND = "lxml"
+except ImportError:
+    DEFAULT_BACKEND = "html.parser"
+
+PARSER_BACKEND = os.getenv("BFDI_HTML_PARSER", DEFAULT_BACKEND)
+
+# Elements kept by a content-only parse; everything inside them is kept too
+CONTENT_CLASSES = ["mw-parser-output", "pi-image-thumbnail"]
+CONTENT_STRAINER = SoupStrainer(class_=CONTENT_CLASSES)
+
+
+def make_soup(markup, backend=None, content_only=True):
+    """
+    Parse `markup` (bytes, str or a binary file object) into a BeautifulSoup.
+    Pass bytes rather than decoded text so the backend can sniff the encoding.
+
+    With content_only, only the content div and title card image are built.
+    Pages without a content div (odd layouts, error pages) are re-parsed in
+    full so the parser's fallbacks still see the whole document.
+    """
+    backend = backend or PARSER_BACKEND
+    if hasattr(markup, "read"):
+        markup = markup.read()
+    if content_only:
+        soup = BeautifulSoup(markup, backend, parse_only=CONTENT_STRAINER)
+        if soup.find('div', {'class': 'mw-parser-output'}) is not None:
+            return soup
+    return BeautifulSoup(markup, backend)
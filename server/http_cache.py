@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent, compressed HTTP response cache with conditional revalidation.
+
+Each URL is stored as one gzip file under the cache directory (named by the
+SHA-256 of the URL) holding a JSON header line followed by the raw body.
+CachingSession wraps a requests/cloudscraper session:
+
+- entries younger than `ttl` seconds are served without touching the network
+- older entries are revalidated with If-None-Match / If-Modified-Since, and a
+  304 answer is turned back into the cached 200 response
+- in offline mode only the cache is consulted; a miss raises CacheMiss
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Response headers worth keeping; everything else (content-encoding,
+# content-length, cookies, ...) describes the original transfer only.
+KEPT_HEADERS = ('content-type', 'etag', 'last-modified', 'date')
+
+
+class CacheMiss(Exception):
+    """Raised in offline mode when a URL is not in the cache."""
+
+
+class HttpCache:
+    def __init__(self, cache_dir, ttl=None):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def path_for(self, url):
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        return self.cache_dir / digest[:2] / f"{digest}.gz"
+
+    def load(self, url):
+        """Return (entry, body) or (None, None)."""
+        path = self.path_for(url)
+        try:
+            with gzip.open(path, "rb") as f:
+                raw = f.read()
+        except (OSError, EOFError):
+            return None, None
+        header, _, body = raw.partition(b"\n")
+        try:
+            entry = json.loads(header)
+        except ValueError:
+            return None, None
+        if entry.get('url') != url:
+            return None, None
+        return entry, body
+
+    def store(self, url, status, headers, body, fetched_at=None):
+        entry = {
+            'url': url,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() in KEPT_HEADERS},
+            'fetched_at': fetched_at if fetched_at is not None else time.time(),
+        }
+        path = self.path_for(url)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as f:
+                f.write(json.dumps(entry).encode("utf-8") + b"\n")
+                f.write(body)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        return entry
+
+    def discard(self, url):
+        try:
+            self.path_for(url).unlink()
+        except FileNotFoundError:
+            pass
+
+    def is_fresh(self, entry):
+        if self.ttl is None:
+            return False
+        return time.time() - entry.get('fetched_at', 0) < self.ttl
+
+
+def cached_response(url, entry, body, state):
+    """Build a requests.Response from a cache entry."""
+    response = requests.Response()
+    response.url = url
+    response.status_code = entry['status']
+    response.reason = "OK" if entry['status'] == 200 else ""
+    response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+    response.headers['X-Cache'] = state
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    return response
+
+
+class CachingSession:
+    """
+    Wraps a session with an HttpCache. `cacheable(url, response)` decides
+    which 200 responses are worth storing (defaults to all of them).
+    Set `cache` to None to bypass caching entirely.
+    """
+
+    def __init__(self, session, cache, offline=False, cacheable=None):
+        self.session = session
+        self.cache = cache
+        self.offline = offline
+        self.cacheable = cacheable
+
+    def get(self, url, **kwargs):
+        if self.cache is None:
+            if self.offline:
+                raise CacheMiss(url)
+            return self.session.get(url, **kwargs)
+
+        entry, body = self.cache.load(url)
+        if entry is not None and (self.offline or self.cache.is_fresh(entry)):
+            return cached_response(url, entry, body, "HIT")
+        if self.offline:
+            raise CacheMiss(url)
+
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None:
+            cached_headers = CaseInsensitiveDict(entry.get('headers', {}))
+            if cached_headers.get('etag'):
+                headers['If-None-Match'] = cached_headers['etag']
+            if cached_headers.get('last-modified'):
+                headers['If-Modified-Since'] = cached_headers['last-modified']
+
+        response = self.session.get(url, headers=headers, **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            merged = dict(entry.get('headers', {}))
+            merged.update(response.headers)
+            entry = self.cache.store(url, entry['status'], merged, body)
+            return cached_response(url, entry, body, "REVALIDATED")
+
+        if response.status_code == 200 and (self.cacheable is None or self.cacheable(url, response)):
+            self.cache.store(url, 200, response.headers, response.content)
+            response.headers['X-Cache'] = "MISS"
+        return response
+
+    def post(self, url, **kwargs):
+        if self.offline:
+            raise CacheMiss(url)
+        return self.session.post(url, **kwargs)
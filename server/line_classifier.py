@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+"""
+Line classification for the transcript parser.
+
+The parser asks the same few questions thousands of times per episode: is
+this string junk, is it a stage direction, which character is this. All the
+patterns are compiled once into a single alternation, and name
+normalization / known-character lookups are memoized.
+"""
+
+import re
+from functools import lru_cache
+
+from episodes import EPISODES
+
+
+# =============================================================================
+# EXPANDED CHARACTER LIST (80+ characters)
+# =============================================================================
+
+KNOWN_CHARACTERS = {
+    # Hosts
+    'announcer', 'four', 'two', 'x', 'one', 'purple face',
+    'firey speaker box', 'flower speaker box', 'puffball speaker box',
+    
+    # Original BFDI contestants
+    'blocky', 'bubble', 'coiny', 'david', 'eraser', 'firey', 'flower',
+    'golf ball', 'ice cube', 'leafy', 'match', 'needle', 'pen', 'pencil',
+    'pin', 'rocky', 'snowball', 'spongy', 'teardrop', 'tennis ball', 'woody',
+    
+    # BFDIA additions
+    'book', 'bomby', 'dora', 'fries', 'gelatin', 'golf ball', 'nickel',
+    'puffball', 'ruby', 'yellow face',
+    
+    # BFB/TPOT additions  
+    'balloony', 'barf bag', 'basketball', 'bell', 'black hole', 'bottle',
+    'bracelety', 'cake', 'clock', 'cloudy', 'eggy', 'fanny', 'firey jr',
+    'foldy', 'gaty', 'grassy', 'lightning', 'liy', 'lollipop', 'loser',
+    'marker', 'naily', 'pie', 'pillow', 'price tag', 'profily', 'remote',
+    'robot flower', 'roboty', 'saw', 'stapy', 'taco', 'tree', 'tv', 'winner',
+    'donut',
+    
+    # Alternate names / nicknames
+    'gb', 'tb', 'td', 'icy', 'needy', 'leafy', 'firey',
+    '8-ball', 'eight ball',
+    
+    # Groups and other
+    'everyone', 'all', 'both', 'contestants', 'freesmart', 'team',
+    'narrator', 'announcer at stake', 'speaker', 'host',
+    
+    # Creators (filter these out but recognize them)
+    'cary', 'michael', 'jacknjellify',
+}
+
+# Episode titles to filter out (these appear as garbage in transcripts)
+EPISODE_TITLES = {ep['title'].lower() for ep in EPISODES}
+
+# Section headers and garbage patterns to filter
+GARBAGE_PATTERNS = [
+    r'^contents$',
+    r'^transcript$',
+    r'^gallery$',
+    r'^trivia$',
+    r'^goofs$',
+    r'^continuity$',
+    r'^references$',
+    r'^the beginning$',
+    r'^intro$',
+    r'^opening$',
+    r'^ending$',
+    r'^credits$',
+    r'^cake at stake',
+    r'^after the intro',
+    r'^before cake at stake',
+    r'^after cake at stake',
+    r'^the contest',
+    r'^elimination$',
+    r'^stinger$',
+    r'^cold open',
+    r'^categories$',
+    r'^\d+$',  # Just numbers
+    r'^episode \d+',
+    r'^\[\d+\]$',  # References like [1]
+    r'^edit$',
+    r'^edit source$',
+    r'well rested$',  # Common garbage
+    r'look who it is$',
+]
+
+# Creator commentary patterns to filter
+CREATOR_PATTERNS = [
+    r"^hi,? it'?s me,? cary",
+    r"^hey,? it'?s cary",
+    r"^this is cary",
+    r"^thank you (so much )?for watching",
+    r"^don'?t forget to (vote|subscribe|like)",
+    r"^see you (next time|in the next)",
+    r"^if you enjoyed",
+    r"^make sure to",
+    r"^leave a comment",
+    r"^the voting",
+]
+
+# =============================================================================
+# COMPILED CLASSIFIERS
+# =============================================================================
+
+# Every pattern above plus the bare-timestamp and trailing "[]" checks,
+# combined into one compiled alternation.
+_GARBAGE_RE = re.compile(
+    "|".join(f"(?:{p})" for p in GARBAGE_PATTERNS + CREATOR_PATTERNS + [
+        r'^\d{1,2}:\d{2}$',  # Just a timestamp like "0:00" or "12:34"
+        r'\[\]$',           # Ends with [] (wiki section header artifact)
+    ])
+)
+
+_PUNCT_RE = re.compile(r'[^\w\s\-]')
+_SPACE_RE = re.compile(r'\s+')
+
+# Common spelling corrections applied after normalization
+CHARACTER_CORRECTIONS = {
+    'ice-cube': 'ice cube',
+    'icecube': 'ice cube',
+    'golfball': 'golf ball',
+    'tennisball': 'tennis ball',
+    'yellowface': 'yellow face',
+    'yellow-face': 'yellow face',
+    'blackhole': 'black hole',
+    'black-hole': 'black hole',
+    'barfbag': 'barf bag',
+    'barf-bag': 'barf bag',
+    'fireysr': 'firey',
+    'fireyjr': 'firey jr',
+    'firey-jr': 'firey jr',
+    'robotflower': 'robot flower',
+    'robot-flower': 'robot flower',
+    'pricetag': 'price tag',
+    'price-tag': 'price tag',
+}
+
+
+@lru_cache(maxsize=4096)
+def normalize_character(name):
+    """Normalize character name for matching."""
+    name = name.lower().strip()
+    name = _PUNCT_RE.sub('', name)  # Remove punctuation except hyphen
+    name = _SPACE_RE.sub(' ', name)  # Normalize whitespace
+    return CHARACTER_CORRECTIONS.get(name, name)
+
+
+@lru_cache(maxsize=4096)
+def is_known_character(name):
+    """Check if name is a known character."""
+    return normalize_character(name) in KNOWN_CHARACTERS
+
+
+@lru_cache(maxsize=16384)
+def is_garbage(text):
+    """Check if text is garbage that should be filtered."""
+    text_lower = text.lower().strip()
+
+    # Too short
+    if len(text_lower) < 3:
+        return True
+
+    # Is an episode title
+    if text_lower in EPISODE_TITLES:
+        return True
+
+    # Section headers, creator commentary, timestamps, "[]" artifacts
+    return _GARBAGE_RE.search(text_lower) is not None
+
+
+def is_stage_direction(text):
+    """Check if text is a stage direction."""
+    text = text.strip()
+    if not text:
+        return True
+    # Full brackets
+    return (text[0] == '[' and text[-1] == ']') or (text[0] == '(' and text[-1] == ')')
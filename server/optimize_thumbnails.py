@@ -0,0 +1,197 @@
+"""
+Resize and re-encode fetched thumbnails into small, content-hashed WebP variants.
+
+Reads the thumbnail index written by fetch_thumbnails.py and, for every episode,
+produces two variants of its thumbnail:
+
+- card:   320 px wide, the size result cards display
+- retina: 640 px wide, for 2x screens
+
+Variants are named by the SHA-256 of their encoded bytes, so identical images
+(e.g. two episodes that resolved to the same video) share one file and the files
+can be cached forever. Every written file is re-opened and checked against its
+expected size, dimensions and hash before it goes into the manifest at
+server/exports/thumbnails/optimized/manifest.json:
+
+  { "variants": {"card": 320, "retina": 640},
+    "episodes": { "episode_title": {
+        "source": "<file>", "source_sha256": "...",
+        "card":   {"file": "<hash>.webp", "width": 320, "height": 180, "bytes": 9123},
+        "retina": {...} }, ... } }
+
+Sources whose hash is unchanged since the last run are not re-encoded, and
+variant files no longer referenced by the manifest are removed.
+
+Prereqs: Pillow installed (pip install Pillow).
+Usage:
+  python optimize_thumbnails.py
+  python optimize_thumbnails.py --quality 75 --force
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+THUMB_DIR = Path(__file__).resolve().parent / "exports" / "thumbnails"
+INDEX_PATH = THUMB_DIR / "index.json"
+OUT_DIR = THUMB_DIR / "optimized"
+MANIFEST_PATH = OUT_DIR / "manifest.json"
+
+VARIANTS = {"card": 320, "retina": 640}
+WEBP_QUALITY = 80
+WORKERS = 4
+HASH_CHARS = 16
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_bytes_atomic(path: Path, data: bytes):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def encode_variant(image: Image.Image, width: int, quality: int) -> tuple[bytes, int, int]:
+    """WebP bytes of `image` scaled to `width` (never upscaled), plus its size."""
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+    buf = io.BytesIO()
+    image.save(buf, "WEBP", quality=quality, method=6)
+    return buf.getvalue(), image.width, image.height
+
+
+def verify_variant(entry: dict) -> bool:
+    """True if the variant file exists and matches its manifest entry."""
+    path = OUT_DIR / entry["file"]
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return False
+    if len(data) != entry["bytes"] or not entry["file"].startswith(sha256_bytes(data)[:HASH_CHARS]):
+        return False
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            return image.format == "WEBP" and image.size == (entry["width"], entry["height"])
+    except OSError:
+        return False
+
+
+def optimize_source(source: Path, quality: int) -> dict:
+    """Encode and write every variant of one source image; returns its entry."""
+    raw = source.read_bytes()
+    with Image.open(io.BytesIO(raw)) as opened:
+        image = ImageOps.exif_transpose(opened).convert("RGB")
+    entry = {"source": source.name, "source_sha256": sha256_bytes(raw)}
+    for name, width in VARIANTS.items():
+        data, w, h = encode_variant(image, width, quality)
+        filename = f"{sha256_bytes(data)[:HASH_CHARS]}.webp"
+        path = OUT_DIR / filename
+        if not path.exists() or path.stat().st_size != len(data):
+            write_bytes_atomic(path, data)
+        entry[name] = {"file": filename, "width": w, "height": h, "bytes": len(data)}
+        if not verify_variant(entry[name]):
+            raise ValueError(f"{filename} failed verification")
+    return entry
+
+
+def load_json(path: Path) -> dict:
+    try:
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build resized, content-hashed WebP thumbnails")
+    parser.add_argument("--quality", type=int, default=WEBP_QUALITY, help="WebP quality (0-100)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Images encoded in parallel")
+    parser.add_argument("--force", action="store_true", help="Re-encode even if the source is unchanged")
+    args = parser.parse_args()
+
+    OUT_DIR.mkdir(parents=True, exist_ok=True)
+    thumb_index = load_json(INDEX_PATH)
+    previous_manifest = load_json(MANIFEST_PATH)
+    previous = {}
+    if not args.force and previous_manifest.get("quality") == args.quality:
+        previous = previous_manifest.get("episodes", {})
+
+    # Group titles by source file hash: identical images are encoded once
+    sources = {}
+    missing = 0
+    for title, info in thumb_index.items():
+        source = THUMB_DIR / (info or {}).get("filename", "")
+        if not info or not info.get("filename") or not source.is_file():
+            missing += 1
+            continue
+        digest = sha256_bytes(source.read_bytes())
+        sources.setdefault(digest, (source, []))[1].append(title)
+
+    episodes = {}
+    todo = []
+    reused = 0
+    for digest, (source, titles) in sources.items():
+        cached = next((previous[t] for t in titles if t in previous
+                       and previous[t].get("source_sha256") == digest), None)
+        if cached and all(name in cached and verify_variant(cached[name]) for name in VARIANTS):
+            reused += 1
+            for title in titles:
+                episodes[title] = {**cached, "source": source.name}
+        else:
+            todo.append((source, titles))
+
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        futures = [(titles, pool.submit(optimize_source, source, args.quality)) for source, titles in todo]
+        for titles, future in futures:
+            try:
+                entry = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"FAIL {', '.join(titles)}: {e}")
+                continue
+            for title in titles:
+                episodes[title] = dict(entry)
+
+    manifest = {"variants": VARIANTS, "quality": args.quality,
+                "episodes": dict(sorted(episodes.items()))}
+    write_bytes_atomic(MANIFEST_PATH, json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"))
+
+    referenced = {entry[name]["file"] for entry in episodes.values() for name in VARIANTS}
+    removed = 0
+    for path in OUT_DIR.glob("*.webp"):
+        if path.name not in referenced:
+            path.unlink()
+            removed += 1
+
+    source_bytes = sum(p.stat().st_size for p, _ in sources.values())
+    card_bytes = sum(OUT_DIR.joinpath(f).stat().st_size
+                     for f in {e["card"]["file"] for e in episodes.values()})
+    print(f"{len(episodes)} episodes, {len(sources)} distinct images "
+          f"({len(todo) - failed} encoded, {reused} unchanged, {failed} failed, {missing} missing); "
+          f"removed {removed} stale files")
+    print(f"Sources {source_bytes / 1024:.0f} KiB -> card variants {card_bytes / 1024:.0f} KiB")
+    print(f"Wrote manifest: {MANIFEST_PATH}")
+
+
+if __name__ == "__main__":
+    main()
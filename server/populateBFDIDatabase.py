@@ -1,18 +1,43 @@
 # -*- coding: utf-8 -*-
+"""
+Scrape BFDI transcripts from the fandom wiki into MongoDB.
 
-import cloudscraper
+Importing this module has no side effects: the MongoDB client and the
+cloudscraper session are created on first use (get_client(),
+get_collection(), get_scraper(); the old `client`, `db`, `collection` and
+`scraper` module attributes still work), and the log file is only created
+when something is logged. Parsing lives in transcript_parser.py.
+"""
+
+import argparse
 import os
 import re
+import threading
 import time
 import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 from urllib.parse import quote
-from bs4 import BeautifulSoup, NavigableString
-from pymongo.mongo_client import MongoClient
-from pymongo.server_api import ServerApi
 from dotenv import load_dotenv
 from episodes import EPISODES
+from html_parsing import make_soup
+from http_cache import CachingSession, HttpCache
+# Parsing names are re-exported for scripts that still import them from here
+from line_classifier import (
+    KNOWN_CHARACTERS, EPISODE_TITLES, GARBAGE_PATTERNS, CREATOR_PATTERNS,
+    normalize_character, is_known_character, is_garbage, is_stage_direction,
+)
+from rate_limit import HostRateLimiter, RateLimitedSession, ThreadLocalSession
+from response_archive import RecordingSession, ReplaySession, ResponseArchive
+from scrape_manifest import ScrapeManifest
+from scrape_metrics import BufferedLogWriter, ScrapeMetrics
+from transcript_parser import (
+    PARSER_VERSION, SPEAKER_LINE_RE, PRUNED_TAGS, PRUNED_TABLE_CLASSES, CANDIDATE_TAGS,
+    get_title_card_image, extract_dialogue_from_table, extract_dialogue_from_paragraph,
+    extract_dialogue_from_list_item, is_pruned, collect_dialogue_nodes, parse_dialogue_advanced,
+)
+from wiki_api import WIKI_API, PAGES_PER_PARSE, fetch_revision_metadata, fetch_transcripts_html, transcript_page_title
 
 load_dotenv()
 
@@ -20,138 +45,146 @@ load_dotenv()
 # CONFIGURATION
 # =============================================================================
 
-uri = os.getenv('MONGODB_URI')
-client = MongoClient(uri, server_api=ServerApi('1'))
-
 DB_NAME = "BFDISearch"
 COLLECTION_NAME = "BFDI_Dialogue"
 
-db = client[DB_NAME]
-collection = db[COLLECTION_NAME]
-
 WIKI_BASE = "https://battlefordreamisland.fandom.com/wiki"
 
 BASE_DELAY = 4.0
 MAX_RETRIES = 5
 
+# Concurrency: episodes are scraped by a bounded worker pool and every request
+# to a host takes a token from that host's shared bucket.
+CONCURRENT_WORKERS = 4
+REQUESTS_PER_SECOND = 0.5       # Per host; 0 disables the limiter (legacy per-episode sleep)
+REQUEST_BURST = 2
+
+# On-disk response cache (transcript pages and ?action=render fallbacks).
+# Entries younger than CACHE_TTL are reused as-is; older ones are revalidated
+# with ETag/Last-Modified. CACHE_ONLY never touches the network.
+CACHE_DIR = Path(__file__).parent / "cache" / "http"
+CACHE_TTL = 24 * 3600           # Seconds
+CACHE_ONLY = False
+RENDER_SUFFIX = "?action=render"
+
+# Raw response archive (see response_archive.py): --record appends every
+# response fetched from the wiki, --replay answers every request from it.
+ARCHIVE_PATH = CACHE_DIR.parent / "responses.gz"
+
+# Prefer transcripts saved by hand in ../html over fetching them
+USE_LOCAL_HTML = True
+
 # Control behavior
 CLEAR_EXISTING = False          # If True, wipe collection before scrape
-SKIP_EPISODES_WITH_DATA = True  # If True, skip episodes already in DB
+SKIP_EPISODES_WITH_DATA = True  # If True, skip episodes already in DB (non-incremental runs)
+INCREMENTAL = True              # If True, only scrape episodes whose wiki revision or parser changed
+
+# "page" fetches each transcript page (plus ?action=render fallback);
+# "api" renders transcripts in batches through the MediaWiki API.
+FETCH_MODE = "page"
+
+
+def is_cacheable_response(url, response):
+    """Only cache bodies fetch_page_with_retry would accept."""
+    min_len = 2000 if url.endswith(RENDER_SUFFIX) else 4000
+    return len(response.content) >= min_len
 
-scraper = cloudscraper.create_scraper(
-    browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
-)
 
 # =============================================================================
-# LOGGING
+# CLIENTS (created on first use)
 # =============================================================================
-LOG_DIR = Path(__file__).parent / "logs"
-LOG_DIR.mkdir(exist_ok=True)
-LOG_FILE = LOG_DIR / f"scrape_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
 
-HTML_DIR = Path(__file__).resolve().parent.parent / "html"
+_client = None
+_scraper = None
+_clients_lock = threading.Lock()
 
 
-def log(message):
-    msg = str(message)
-    print(msg)
-    with LOG_FILE.open("a", encoding="utf-8") as f:
-        f.write(msg + "\n")
+def get_client():
+    """The shared MongoClient, connected on first call."""
+    global _client
+    with _clients_lock:
+        if _client is None:
+            from pymongo.mongo_client import MongoClient
+            from pymongo.server_api import ServerApi
+            _client = MongoClient(os.getenv('MONGODB_URI'), server_api=ServerApi('1'))
+        return _client
+
+
+def get_collection():
+    return get_client()[DB_NAME][COLLECTION_NAME]
+
+
+def get_scraper():
+    """
+    The shared session stack: CachingSession -> RateLimitedSession ->
+    ThreadLocalSession, which holds one cloudscraper per worker thread (all
+    of them behind the same rate limiter). Pages go through it;
+    revision/API lookups use `.session`.
+    """
+    global _scraper
+    with _clients_lock:
+        if _scraper is None:
+            import cloudscraper
+            _scraper = CachingSession(
+                RateLimitedSession(
+                    ThreadLocalSession(lambda: cloudscraper.create_scraper(
+                        browser={'browser': 'chrome', 'platform': 'windows', 'desktop': True}
+                    )),
+                    HostRateLimiter(REQUESTS_PER_SECOND, REQUEST_BURST),
+                    on_wait=lambda url, waited: metrics.add_time("ratelimit", waited),
+                ),
+                HttpCache(CACHE_DIR, CACHE_TTL),
+                offline=CACHE_ONLY,
+                cacheable=is_cacheable_response,
+            )
+        return _scraper
+
+
+_LAZY_ATTRIBUTES = {
+    'client': get_client,
+    'db': lambda: get_client()[DB_NAME],
+    'collection': get_collection,
+    'scraper': get_scraper,
+}
+
 
+def __getattr__(name):
+    # Module attributes from before the clients were lazy
+    factory = _LAZY_ATTRIBUTES.get(name)
+    if factory is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return factory()
 
 # =============================================================================
-# EXPANDED CHARACTER LIST (80+ characters)
+# LOGGING
 # =============================================================================
+LOG_DIR = Path(__file__).parent / "logs"
+RUN_STAMP = datetime.now().strftime('%Y%m%d_%H%M%S')
+LOG_FILE = LOG_DIR / f"scrape_{RUN_STAMP}.txt"
+METRICS_FILE = LOG_DIR / f"metrics_{RUN_STAMP}.jsonl"
 
-KNOWN_CHARACTERS = {
-    # Hosts
-    'announcer', 'four', 'two', 'x', 'one', 'purple face',
-    'firey speaker box', 'flower speaker box', 'puffball speaker box',
-    
-    # Original BFDI contestants
-    'blocky', 'bubble', 'coiny', 'david', 'eraser', 'firey', 'flower',
-    'golf ball', 'ice cube', 'leafy', 'match', 'needle', 'pen', 'pencil',
-    'pin', 'rocky', 'snowball', 'spongy', 'teardrop', 'tennis ball', 'woody',
-    
-    # BFDIA additions
-    'book', 'bomby', 'dora', 'fries', 'gelatin', 'golf ball', 'nickel',
-    'puffball', 'ruby', 'yellow face',
-    
-    # BFB/TPOT additions  
-    'balloony', 'barf bag', 'basketball', 'bell', 'black hole', 'bottle',
-    'bracelety', 'cake', 'clock', 'cloudy', 'eggy', 'fanny', 'firey jr',
-    'foldy', 'gaty', 'grassy', 'lightning', 'liy', 'lollipop', 'loser',
-    'marker', 'naily', 'pie', 'pillow', 'price tag', 'profily', 'remote',
-    'robot flower', 'roboty', 'saw', 'stapy', 'taco', 'tree', 'tv', 'winner',
-    'donut',
-    
-    # Alternate names / nicknames
-    'gb', 'tb', 'td', 'icy', 'needy', 'leafy', 'firey',
-    '8-ball', 'eight ball',
-    
-    # Groups and other
-    'everyone', 'all', 'both', 'contestants', 'freesmart', 'team',
-    'narrator', 'announcer at stake', 'speaker', 'host',
-    
-    # Creators (filter these out but recognize them)
-    'cary', 'michael', 'jacknjellify',
-}
+HTML_DIR = Path(__file__).resolve().parent.parent / "html"
+
+_log_lock = threading.Lock()
+_log_writer = BufferedLogWriter(LOG_FILE)  # Creates LOG_DIR and the file on first flush
+
+# Per-episode stage timings and request counters (see scrape_metrics.py)
+metrics = ScrapeMetrics(METRICS_FILE)
+
+
+def log(message):
+    msg = str(message)
+    with _log_lock:
+        print(msg)
+        _log_writer.write(msg)
 
-# Episode titles to filter out (these appear as garbage in transcripts)
-EPISODE_TITLES = {ep['title'].lower() for ep in EPISODES}
-
-# Section headers and garbage patterns to filter
-GARBAGE_PATTERNS = [
-    r'^contents$',
-    r'^transcript$',
-    r'^gallery$',
-    r'^trivia$',
-    r'^goofs$',
-    r'^continuity$',
-    r'^references$',
-    r'^the beginning$',
-    r'^intro$',
-    r'^opening$',
-    r'^ending$',
-    r'^credits$',
-    r'^cake at stake',
-    r'^after the intro',
-    r'^before cake at stake',
-    r'^after cake at stake',
-    r'^the contest',
-    r'^elimination$',
-    r'^stinger$',
-    r'^cold open',
-    r'^categories$',
-    r'^\d+$',  # Just numbers
-    r'^episode \d+',
-    r'^\[\d+\]$',  # References like [1]
-    r'^edit$',
-    r'^edit source$',
-    r'well rested$',  # Common garbage
-    r'look who it is$',
-]
-
-# Creator commentary patterns to filter
-CREATOR_PATTERNS = [
-    r"^hi,? it'?s me,? cary",
-    r"^hey,? it'?s cary",
-    r"^this is cary",
-    r"^thank you (so much )?for watching",
-    r"^don'?t forget to (vote|subscribe|like)",
-    r"^see you (next time|in the next)",
-    r"^if you enjoyed",
-    r"^make sure to",
-    r"^leave a comment",
-    r"^the voting",
-]
 
 # =============================================================================
 # HELPER FUNCTIONS
 # =============================================================================
 
 def get_existing_episodes():
-    existing = collection.distinct('episode_title')
+    existing = get_collection().distinct('episode_title')
     return set(existing)
 
 
@@ -165,360 +198,133 @@ def normalized_key(s):
     return re.sub(r'[^a-z0-9]', '', s.lower())
 
 
-def find_local_html(title):
+class LocalHtmlIndex:
     """
-    Look for a saved HTML transcript in ../html matching the episode title.
-    Returns Path or None.
+    normalized_key -> path for every *.html file in a directory. Built once
+    and rebuilt only when the directory's mtime changes, so a run doesn't
+    re-walk the directory for every episode.
     """
-    if not HTML_DIR.exists():
-        return None
-    target_key = normalized_key(title)
-    for html_file in HTML_DIR.glob("*.html"):
-        name_key = normalized_key(html_file.name)
-        if target_key in name_key:
-            return html_file
-    return None
-
-
-def get_title_card_image(soup):
-    try:
-        img = soup.find('img', {'class': 'pi-image-thumbnail'})
-        if img and img.get('src'):
-            return img['src'].split("/revision")[0]
-    except:
-        pass
-    return None
-
-
-def normalize_character(name):
-    """Normalize character name for matching."""
-    name = name.lower().strip()
-    name = re.sub(r'[^\w\s\-]', '', name)  # Remove punctuation except hyphen
-    name = re.sub(r'\s+', ' ', name)  # Normalize whitespace
-    
-    # Common corrections
-    corrections = {
-        'ice-cube': 'ice cube',
-        'icecube': 'ice cube',
-        'golfball': 'golf ball',
-        'tennisball': 'tennis ball',
-        'yellowface': 'yellow face',
-        'yellow-face': 'yellow face',
-        'blackhole': 'black hole',
-        'black-hole': 'black hole',
-        'barfbag': 'barf bag',
-        'barf-bag': 'barf bag',
-        'fireysr': 'firey',
-        'fireyjr': 'firey jr',
-        'firey-jr': 'firey jr',
-        'robotflower': 'robot flower',
-        'robot-flower': 'robot flower',
-        'pricetag': 'price tag',
-        'price-tag': 'price tag',
-    }
-    
-    return corrections.get(name, name)
 
+    def __init__(self, directory):
+        self.directory = directory
+        self._mtime = None
+        self._exact = {}
+        self._entries = []
+        self._lock = threading.Lock()
 
-def is_known_character(name):
-    """Check if name is a known character."""
-    normalized = normalize_character(name)
-    return normalized in KNOWN_CHARACTERS
-
-
-def is_garbage(text):
-    """Check if text is garbage that should be filtered."""
-    text_lower = text.lower().strip()
-    
-    # Too short
-    if len(text_lower) < 3:
-        return True
-    
-    # Is an episode title
-    if text_lower in EPISODE_TITLES:
-        return True
-    
-    # Matches garbage patterns
-    for pattern in GARBAGE_PATTERNS:
-        if re.search(pattern, text_lower):
-            return True
-    
-    # Matches creator commentary
-    for pattern in CREATOR_PATTERNS:
-        if re.search(pattern, text_lower):
-            return True
-    
-    # Ends with [] (wiki section header artifact)
-    if text_lower.endswith('[]'):
-        return True
-    
-    # Just a timestamp like "0:00" or "12:34"
-    if re.match(r'^\d{1,2}:\d{2}$', text_lower):
-        return True
-    
-    return False
+    def _refresh(self):
+        try:
+            mtime = self.directory.stat().st_mtime_ns
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return
+        entries = []
+        if mtime is not None:
+            entries = sorted((normalized_key(path.stem), path) for path in self.directory.glob("*.html"))
+        self._exact = {}
+        for key, path in entries:
+            self._exact.setdefault(key, path)
+        self._entries = entries
+        self._mtime = mtime
+
+    def lookup(self, title):
+        target_key = normalized_key(title)
+        if not target_key:
+            return None
+        with self._lock:
+            self._refresh()
+            exact = self._exact.get(target_key)
+            if exact is not None:
+                return exact
+            entries = self._entries
+
+        # Saved pages often carry extra words ("... Transcript _ Fandom").
+        # Take the closest name containing the title, but never one where the
+        # title runs into a digit ("...Nightmare" must not match "...Nightmare 2").
+        best = None
+        for key, path in entries:
+            start = key.find(target_key)
+            while start != -1:
+                end = start + len(target_key)
+                if end == len(key) or not key[end].isdigit():
+                    if best is None or len(key) < len(best[0]):
+                        best = (key, path)
+                    break
+                start = key.find(target_key, start + 1)
+        return best[1] if best else None
 
 
-def is_stage_direction(text):
-    """Check if text is a stage direction."""
-    text = text.strip()
-    if not text:
-        return True
-    # Full brackets
-    if (text.startswith('[') and text.endswith(']')) or \
-       (text.startswith('(') and text.endswith(')')):
-        return True
-    return False
+local_html_index = LocalHtmlIndex(HTML_DIR)
 
 
-def extract_dialogue_from_table(table):
+def find_local_html(title):
     """
-    Handle transcripts that are laid out as small two-column tables:
-    first cell has an image (character), second cell has the line.
+    Look for a saved HTML transcript in ../html matching the episode title.
+    Returns Path or None.
     """
-    # Try to find a character from any image alt/data attributes.
-    character = None
-    for img in table.find_all('img'):
-        alt = (img.get('alt') or img.get('data-image-name') or "").strip()
-        if not alt:
-            continue
-        norm = normalize_character(alt)
-        if is_known_character(norm):
-            character = norm
-            break
-
-    if not character:
-        return None
-
-    # Pick the text cell (non-image).
-    text_candidates = []
-    for td in table.find_all('td'):
-        if td.find('img'):
-            continue
-        text = td.get_text(separator=' ', strip=True)
-        if text:
-            text_candidates.append(text)
-
-    if not text_candidates:
-        return None
-
-    dialogue = max(text_candidates, key=len).strip()
-    if not dialogue or is_stage_direction(dialogue) or is_garbage(dialogue):
+    if not USE_LOCAL_HTML:
         return None
+    return local_html_index.lookup(title)
 
-    return {
-        'character': character,
-        'dialogue': dialogue
-    }
-
-
-def extract_dialogue_bruteforce_tables(soup):
-    """
-    Very permissive fallback for stubborn pages:
-    - Any table with an <img> whose alt or data-image-name yields a character.
-    - Picks the longest non-image cell text.
-    """
-    lines = []
-    for table in soup.find_all('table'):
-        character = None
-        for img in table.find_all('img'):
-            alt = (img.get('alt') or img.get('data-image-name') or "").strip()
-            if not alt:
-                continue
-            norm = normalize_character(alt)
-            if is_known_character(norm):
-                character = norm
-                break
-        if not character:
-            continue
 
-        text_candidates = []
-        for td in table.find_all('td'):
-            if td.find('img'):
-                continue
-            text = td.get_text(separator=' ', strip=True)
-            if text:
-                text_candidates.append(text)
-        if not text_candidates:
-            continue
-        dialogue = max(text_candidates, key=len).strip()
-        if dialogue and not is_stage_direction(dialogue) and not is_garbage(dialogue):
-            lines.append({'character': character, 'dialogue': dialogue})
-    return lines
+def replaying():
+    """True when requests are answered from a response archive."""
+    return isinstance(get_scraper().session.session, ReplaySession)
 
 
-def extract_dialogue_from_paragraph(p_tag, episode_title):
+def use_archive(path, mode):
     """
-    Extract dialogue from a paragraph tag.
-    BFDI wiki often formats as: <b>Character</b>: Dialogue text
-    Or: <b>Character:</b> Dialogue text
+    Route wiki requests through the response archive at `path`.
+    "record" appends every response fetched from the network; "replay"
+    serves every request from the archive, with no network, rate limit,
+    HTTP cache or ../html pages, so a re-parse is deterministic.
     """
-    results = []
-    
-    # Get the full text
-    full_text = p_tag.get_text(separator=' ', strip=True)
-    
-    if not full_text or is_garbage(full_text) or is_stage_direction(full_text):
-        return results
-    
-    # Strategy 1: Look for bold tags containing character names
-    bold_tags = p_tag.find_all('b')
-    
-    for bold in bold_tags:
-        bold_text = bold.get_text(strip=True)
-        
-        # Clean up the bold text (remove trailing colon)
-        char_name = bold_text.rstrip(':').strip()
-        
-        if is_known_character(char_name):
-            # Get the dialogue after this bold tag
-            dialogue_parts = []
-            
-            for sibling in bold.next_siblings:
-                if isinstance(sibling, NavigableString):
-                    text = str(sibling).strip()
-                    if text.startswith(':'):
-                        text = text[1:].strip()
-                    if text:
-                        dialogue_parts.append(text)
-                elif sibling.name == 'b':
-                    # Next character's line, stop here
-                    break
-                elif sibling.name in ['i', 'em']:
-                    # Italics might be stage direction, skip
-                    continue
-                else:
-                    text = sibling.get_text(strip=True)
-                    if text and not is_stage_direction(text):
-                        dialogue_parts.append(text)
-            
-            dialogue = ' '.join(dialogue_parts).strip()
-            dialogue = re.sub(r'^[:\s]+', '', dialogue)  # Remove leading colons/spaces
-            
-            if dialogue and len(dialogue) > 2 and not is_garbage(dialogue):
-                results.append({
-                    'character': normalize_character(char_name),
-                    'dialogue': dialogue
-                })
-    
-    # Strategy 2: If no bold tags found, try "Character: Dialogue" pattern
-    if not results:
-        # Pattern: "CharacterName: dialogue text"
-        match = re.match(r'^([A-Za-z][A-Za-z\s\-\'\.]{1,25}):\s*(.+)$', full_text)
-        if match:
-            char_name = match.group(1).strip()
-            dialogue = match.group(2).strip()
-            
-            if is_known_character(char_name) and dialogue and not is_garbage(dialogue):
-                results.append({
-                    'character': normalize_character(char_name),
-                    'dialogue': dialogue
-                })
-    
-    return results
-
-
-def parse_dialogue_advanced(soup, episode_title):
-    """
-    Advanced parsing that handles multiple transcript formats.
-    """
-    dialogue_lines = []
-    
-    # Find the content div
-    content_div = soup.find('div', {'class': 'mw-parser-output'})
-    if not content_div:
-        content_div = soup.find('div', {'id': 'mw-content-text'})
-    if not content_div:
-        # Fallback to article/body to avoid hard failure on render snapshots
-        content_div = soup.find('article') or soup.find('body') or soup
-    
-    # Remove table of contents
-    for toc in content_div.find_all('div', {'id': 'toc'}):
-        toc.decompose()
-    for toc in content_div.find_all('div', {'class': 'toc'}):
-        toc.decompose()
-
-    # Remove citation footnotes that pollute dialogue text
-    for ref in content_div.find_all(['sup', 'span'], {'class': 'reference'}):
-        ref.decompose()
-    
-    # Remove navboxes/infoboxes but keep small dialogue tables; leave wikitables for bruteforce fallback
-    for table in content_div.find_all('table'):
-        classes = table.get('class', [])
-        if any(c in ['navbox', 'infobox', 'toccolours', 'mw-collapsible'] for c in classes):
-            table.decompose()
-    
-    # Remove navigation elements
-    for nav in content_div.find_all(['nav', 'aside', 'footer']):
-        nav.decompose()
-    
-    # Remove category links
-    for cat in content_div.find_all('div', {'class': 'categories'}):
-        cat.decompose()
-    
-    # Process paragraphs
-    for p in content_div.find_all('p'):
-        lines = extract_dialogue_from_paragraph(p, episode_title)
-        dialogue_lines.extend(lines)
-
-    # Process dialogue-style tables (image + text layout)
-    for table in content_div.find_all('table'):
-        line = extract_dialogue_from_table(table)
-        if line:
-            dialogue_lines.append(line)
-
-    # Bruteforce tables as a fallback (runs even if we already found some)
-    brute_lines = extract_dialogue_bruteforce_tables(content_div)
-    dialogue_lines.extend(brute_lines)
-
-    # Also check for dialogue in list items (some transcripts use <li>)
-    for li in content_div.find_all('li'):
-        # Skip TOC items
-        parent = li.find_parent('div', {'id': 'toc'})
-        if parent:
-            continue
-        
-        li_text = li.get_text(strip=True)
-        
-        # Try "Character: Dialogue" pattern
-        match = re.match(r'^([A-Za-z][A-Za-z\s\-\'\.]{1,25}):\s*(.+)$', li_text)
-        if match:
-            char_name = match.group(1).strip()
-            dialogue = match.group(2).strip()
-            
-            if is_known_character(char_name) and dialogue and not is_garbage(dialogue):
-                dialogue_lines.append({
-                    'character': normalize_character(char_name),
-                    'dialogue': dialogue
-                })
-    
-    # Deduplicate while preserving order
-    seen = set()
-    unique_lines = []
-    for line in dialogue_lines:
-        key = (line['character'], line['dialogue'][:50])  # Use first 50 chars for dedup
-        if key not in seen:
-            seen.add(key)
-            unique_lines.append(line)
-    
-    return unique_lines, None
+    global USE_LOCAL_HTML
+    scraper = get_scraper()
+    archive = ResponseArchive(path)
+    limited = scraper.session
+    if mode == "replay":
+        limited.session = ReplaySession(archive)
+        limited.limiter = None
+        scraper.cache = None
+        scraper.offline = False
+        USE_LOCAL_HTML = False
+        log(f"Replaying {len(archive)} archived responses from {path}; no network requests will be made")
+    else:
+        limited.session = RecordingSession(limited.session, archive)
+        log(f"Recording responses to {path} ({len(archive)} already archived)")
+        if scraper.cache is not None:
+            log("  Pages served by the HTTP cache are not recorded; seed them with "
+                "response_archive.py import-cache")
+    return archive
 
 
 def fetch_page_with_retry(url, max_retries=MAX_RETRIES):
+    scraper = get_scraper()
+
     def do_request(target_url, attempt, note=""):
         try:
-            response = scraper.get(target_url, timeout=30)
-            return response, None
+            with metrics.stage("render" if note else "fetch"):
+                response = scraper.get(target_url, timeout=30)
         except Exception as e:
+            metrics.count("errors")
             return None, f"{note}request error: {e}"
+        metrics.observe_response(response)
+        return response, None
+
+    if scraper.offline or replaying():
+        # Retrying can't change a cache-only or archived answer
+        max_retries = 1
 
-    render_suffix = "?action=render"
     for attempt in range(max_retries):
         wait = 0
         if attempt > 0:
+            metrics.count("retries")
             wait = (attempt + 1) * 5 + random.uniform(1, 3)
             log(f"    Waiting {wait:.1f}s before retry...")
-            time.sleep(wait)
+            with metrics.stage("backoff"):
+                time.sleep(wait)
 
         # Try normal page
         response, err = do_request(url, attempt)
@@ -547,7 +353,7 @@ def fetch_page_with_retry(url, max_retries=MAX_RETRIES):
 
         if content_len < 4000:
             # Fallback to rendered view to strip junk and bypass short bodies
-            render_url = url + render_suffix
+            render_url = url + RENDER_SUFFIX
             render_resp, render_err = do_request(render_url, attempt, note="render ")
             if render_err is None and render_resp.status_code == 200 and len(render_resp.content) >= 2000:
                 log(f"    Used action=render fallback (len={len(render_resp.content)})")
@@ -563,11 +369,194 @@ def fetch_page_with_retry(url, max_retries=MAX_RETRIES):
     return None, "Max retries exceeded", False
 
 
+# MongoDB error code for "transactions need a replica set or mongos"
+ILLEGAL_OPERATION = 20
+
+
+def replace_lines(titles, docs):
+    """
+    Replace every stored line of the episodes in `titles` with `docs`.
+    The delete and a single unordered insert_many run in one transaction, so
+    readers never see a half-written episode and re-scrapes never duplicate.
+    Falls back to a plain delete + insert on a standalone mongod.
+    """
+    titles = list(titles)
+    collection = get_collection()
+
+    def write(session=None):
+        if len(titles) == 1:
+            collection.delete_many({'episode_title': titles[0]}, session=session)
+        else:
+            collection.delete_many({'episode_title': {'$in': titles}}, session=session)
+        if docs:
+            collection.insert_many(docs, ordered=False, session=session)
+
+    run_in_transaction(write)
+    return len(docs)
+
+
+def run_in_transaction(write):
+    """
+    Call write(session) inside a transaction and return its result; on a
+    standalone mongod, which has no transactions, call write(None) instead.
+    """
+    from pymongo.errors import OperationFailure
+
+    try:
+        with get_client().start_session() as session:
+            return session.with_transaction(write)
+    except OperationFailure as e:
+        if e.code != ILLEGAL_OPERATION:
+            raise
+        return write(None)
+
+
+def replace_episode_lines(title, docs):
+    """Replace every stored line of one episode with `docs`."""
+    return replace_lines([title], docs)
+
+
+def ensure_line_indexes():
+    """Create the unique line_id index sync_lines() relies on (no-op if present)."""
+    from dialogue_query import LINE_INDEXES
+    return get_collection().create_indexes(LINE_INDEXES)
+
+
+def sync_lines(titles, docs):
+    """
+    Make the stored lines of the episodes in `titles` match `docs`, writing
+    only the difference: lines are matched on line_id, new ones are
+    upserted, changed ones get a $set of the changed fields, and lines
+    that are gone (including old ones without a line_id) are deleted.
+    An episode in `titles` with no docs at all is left untouched: an empty
+    parse (say, after a wiki layout change) must not wipe its stored lines.
+    Runs in one transaction where available, like replace_lines().
+    Returns {'inserted', 'updated', 'deleted', 'unchanged'} counts.
+    """
+    from pymongo import DeleteMany, UpdateOne
+
+    parsed = {doc['episode_title'] for doc in docs}
+    skipped = [title for title in titles if title not in parsed]
+    if skipped:
+        log(f"    KEEP: no lines parsed for {', '.join(skipped)}; stored lines left as they are")
+    titles = [title for title in titles if title in parsed]
+    if not titles:
+        return dict.fromkeys(('inserted', 'updated', 'deleted', 'unchanged'), 0)
+    collection = get_collection()
+    scope = {'episode_title': titles[0] if len(titles) == 1 else {'$in': titles}}
+
+    def write(session=None):
+        stored = {
+            doc.get('line_id'): doc
+            for doc in collection.find(scope, {'_id': 0}, session=session)
+        }
+        stored.pop(None, None)
+        counts = dict.fromkeys(('inserted', 'updated', 'deleted', 'unchanged'), 0)
+        ops = []
+        for doc in docs:
+            old = stored.get(doc['line_id'])
+            if old is None:
+                ops.append(UpdateOne({'line_id': doc['line_id']}, {'$set': doc}, upsert=True))
+                counts['inserted'] += 1
+                continue
+            changed = {key: value for key, value in doc.items() if old.get(key) != value}
+            if changed:
+                ops.append(UpdateOne({'line_id': doc['line_id']}, {'$set': changed}))
+                counts['updated'] += 1
+            else:
+                counts['unchanged'] += 1
+        ops.append(DeleteMany({**scope, 'line_id': {'$nin': [doc['line_id'] for doc in docs]}}))
+        result = collection.bulk_write(ops, ordered=False, session=session)
+        counts['deleted'] = result.deleted_count
+        return counts
+
+    return run_in_transaction(write)
+
+
+def build_episode_docs(episode, dialogue_lines, transcript_url, image_url):
+    """MongoDB documents for one episode's parsed lines."""
+    title = episode['title']
+    season = episode['season']
+    return [
+        {
+            'episode_title': title,
+            'episode_number': episode['number'],
+            'season': season,
+            'season_name': episode.get('season_name', f'Season {season}'),
+            'character': line['character'],
+            'dialogue': line['dialogue'],
+            'transcript': transcript_url,
+            'image': image_url,
+            'line_id': line['line_id'],
+            'ordinal': line['ordinal'],
+            'section': line.get('section'),
+        }
+        for line in dialogue_lines
+    ]
+
+
+def store_episode_lines(episode, dialogue_lines, transcript_url, image_url):
+    """Build documents for one episode's parsed lines and sync them to the collection."""
+    docs = build_episode_docs(episode, dialogue_lines, transcript_url, image_url)
+    with metrics.stage("write"):
+        counts = sync_lines([episode['title']], docs)
+
+    log(f"    SUCCESS: {len(docs)} dialogue lines ({counts['inserted']} new, {counts['updated']} updated, "
+        f"{counts['deleted']} removed, {counts['unchanged']} unchanged)")
+    return len(docs)
+
+
+def parse_soup(soup, title):
+    """(title card image, dialogue lines, parse error) for one transcript page."""
+    with metrics.stage("parse"):
+        image_url = get_title_card_image(soup)
+        dialogue_lines, parse_error = parse_dialogue_advanced(soup, title)
+    return image_url, dialogue_lines, parse_error
+
+
+def scrape_episode_from_html(episode, html):
+    """
+    Parse transcript HTML that was already fetched (e.g. by the batch API
+    mode) and store its lines. Returns the number of lines written.
+    """
+    with metrics.episode(episode['title'], number=episode['number'], source="api") as record:
+        record['lines'] = _scrape_episode_from_html(episode, html, record)
+    return record['lines']
+
+
+def _scrape_episode_from_html(episode, html, record):
+    title = episode['title']
+    transcript_url = build_transcript_url(title)
+    log(f"\n[{episode['number']}] Parsing: {title} (batch API)")
+
+    try:
+        with metrics.stage("parse"):
+            soup = make_soup(html)
+        image_url, dialogue_lines, parse_error = parse_soup(soup, title)
+        if parse_error:
+            log(f"    {parse_error}")
+        if not dialogue_lines:
+            log(f"    WARNING: No valid dialogue found!")
+            return 0
+        return store_episode_lines(episode, dialogue_lines, transcript_url, image_url)
+    except Exception as e:
+        log(f"    ERROR: {e}")
+        record['error'] = str(e)
+        import traceback
+        traceback.print_exc()
+        return 0
+
+
 def scrape_episode(episode):
+    """Fetch, parse and store one episode. Returns the number of lines written."""
+    with metrics.episode(episode['title'], number=episode['number']) as record:
+        record['lines'] = _scrape_episode(episode, record)
+    return record['lines']
+
+
+def _scrape_episode(episode, record):
     title = episode['title']
     number = episode['number']
-    season = episode['season']
-    season_name = episode.get('season_name', f'Season {season}')
     
     transcript_url = build_transcript_url(title)
     log(f"\n[{number}] Scraping: {title}")
@@ -579,24 +568,26 @@ def scrape_episode(episode):
     if local_path:
         try:
             log(f"    Using local HTML: {local_path.name}")
-            with local_path.open("r", encoding="utf-8", errors="ignore") as f:
-                html = f.read()
-            soup = BeautifulSoup(html, "html.parser")
+            with local_path.open("rb") as f, metrics.stage("parse"):
+                soup = make_soup(f)
             used_local = True
+            record['source'] = "local"
         except Exception as e:
             log(f"    Failed to read local HTML ({local_path.name}): {e}")
     
     # If no local soup, fetch from web
     if soup is None:
+        record['source'] = "web"
         response, error, _ = fetch_page_with_retry(transcript_url)
         if error:
             log(f"    SKIP: {error}")
+            record['error'] = error
             return 0
-        soup = BeautifulSoup(response.content, "html.parser")
+        with metrics.stage("parse"):
+            soup = make_soup(response.content)
     
     try:
-        image_url = get_title_card_image(soup)
-        dialogue_lines, parse_error = parse_dialogue_advanced(soup, title)
+        image_url, dialogue_lines, parse_error = parse_soup(soup, title)
         
         if parse_error:
             log(f"    {parse_error}")
@@ -605,13 +596,15 @@ def scrape_episode(episode):
             # If local HTML yielded nothing, try network fetch as fallback
             if used_local:
                 log("    Local HTML produced no dialogue; attempting live fetch fallback...")
+                record['source'] = "web"
                 response, error, _ = fetch_page_with_retry(transcript_url)
                 if error:
                     log(f"    Fallback fetch failed: {error}")
+                    record['error'] = error
                     return 0
-                soup = BeautifulSoup(response.content, "html.parser")
-                image_url = get_title_card_image(soup)
-                dialogue_lines, parse_error = parse_dialogue_advanced(soup, title)
+                with metrics.stage("parse"):
+                    soup = make_soup(response.content)
+                image_url, dialogue_lines, parse_error = parse_soup(soup, title)
                 if parse_error:
                     log(f"    {parse_error}")
             
@@ -619,34 +612,102 @@ def scrape_episode(episode):
             log(f"    WARNING: No valid dialogue found!")
             return 0
         
-        inserted = 0
-        for line in dialogue_lines:
-            doc = {
-                'episode_title': title,
-                'episode_number': number,
-                'season': season,
-                'season_name': season_name,
-                'character': line['character'],
-                'dialogue': line['dialogue'],
-                'transcript': transcript_url,
-                'image': image_url
-            }
-            collection.insert_one(doc)
-            inserted += 1
-        
-        log(f"    SUCCESS: {inserted} dialogue lines inserted")
-        return inserted
+        return store_episode_lines(episode, dialogue_lines, transcript_url, image_url)
         
     except Exception as e:
         log(f"    ERROR: {e}")
+        record['error'] = str(e)
         import traceback
         traceback.print_exc()
         return 0
 
 
+def plan_scrape(incremental, skip_existing, existing_episodes, api_url=WIKI_API, stored_titles=None):
+    """
+    Decide which episodes need scraping. Returns (manifest, revisions,
+    pending): the scrape manifest (None unless incremental), current wiki
+    revisions by title, and the episodes to scrape in EPISODES order.
+    Cached pages of episodes whose revision changed are discarded.
+    `stored_titles` (episodes with lines in the collection), if given, is
+    checked before trusting the manifest: an episode it has no lines for is
+    re-scraped even if unchanged, e.g. after the collection was wiped.
+    """
+    scraper = get_scraper()
+    manifest = None
+    revisions = {}
+    if incremental:
+        manifest = ScrapeManifest() if CLEAR_EXISTING else ScrapeManifest.load()
+        if not scraper.offline and not replaying():
+            try:
+                # Revision lookups must see the live wiki, so skip the page cache
+                meta = fetch_revision_metadata(
+                    scraper.session, [transcript_page_title(ep['title']) for ep in EPISODES], api=api_url)
+                revisions = {ep['title']: meta.get(transcript_page_title(ep['title'])) for ep in EPISODES}
+                log(f"Fetched revision metadata for {len(revisions)} transcripts")
+            except Exception as e:
+                log(f"Revision lookup failed ({e}); relying on the manifest alone")
+
+    pending = []
+    for episode in EPISODES:
+        title = episode['title']
+        if incremental:
+            revision = revisions.get(title)
+            reason = manifest.needs_scrape(title, revision, PARSER_VERSION)
+            if reason is None and stored_titles is not None and title not in stored_titles:
+                reason = "no stored lines"
+            if reason is None:
+                log(f"    SKIP (unchanged): {title}")
+                continue
+            log(f"    QUEUE ({reason}): {title}")
+            if scraper.cache is not None and manifest.revision_changed(title, revision):
+                url = build_transcript_url(title)
+                scraper.cache.discard(url)
+                scraper.cache.discard(url + RENDER_SUFFIX)
+        elif skip_existing and title in existing_episodes:
+            log(f"    SKIP (already scraped): {title}")
+            continue
+        pending.append(episode)
+    return manifest, revisions, pending
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape BFDI transcripts into MongoDB")
+    parser.add_argument("--workers", type=int, default=CONCURRENT_WORKERS,
+                        help="Number of episodes scraped concurrently (1 = sequential)")
+    parser.add_argument("--rps", type=float, default=REQUESTS_PER_SECOND,
+                        help="Requests per second per host (0 = no limiter, fixed per-episode sleep)")
+    parser.add_argument("--burst", type=int, default=REQUEST_BURST,
+                        help="Token bucket burst size per host")
+    parser.add_argument("--cache-ttl", type=float, default=CACHE_TTL,
+                        help="Seconds a cached page is reused before revalidation")
+    parser.add_argument("--cache-only", action="store_true", default=CACHE_ONLY,
+                        help="Offline mode: serve pages from the HTTP cache only")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the HTTP cache")
+    parser.add_argument("--fetch-mode", choices=("page", "api"), default=FETCH_MODE,
+                        help="page: one transcript page per request; api: batched MediaWiki API renders "
+                             "(saved ../html pages are still read first)")
+    parser.add_argument("--api-url", default=WIKI_API,
+                        help="MediaWiki api.php endpoint (point at a local stand-in server for testing)")
+    parser.add_argument("--api-batch", type=int, default=PAGES_PER_PARSE,
+                        help="Transcripts rendered per API request in --fetch-mode api")
+    parser.add_argument("--no-incremental", dest="incremental", action="store_false", default=INCREMENTAL,
+                        help="Ignore the scrape manifest and fall back to SKIP_EPISODES_WITH_DATA")
+    archive = parser.add_mutually_exclusive_group()
+    archive.add_argument("--record", action="store_true",
+                         help="Append every wiki response to the response archive")
+    archive.add_argument("--replay", action="store_true",
+                         help="Answer every request from the response archive (offline, ignores ../html)")
+    parser.add_argument("--archive", type=Path, default=ARCHIVE_PATH,
+                        help="Response archive file for --record / --replay")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     log("=" * 60)
-    log("BFDI Search - Database Population Script v8 (SMART PARSER)")
+    log(f"BFDI Search - Database Population Script v{PARSER_VERSION} (SMART PARSER)")
     log("=" * 60)
     log("Features:")
     log("  - Bold tag parsing for character names")
@@ -656,8 +717,9 @@ def main():
     log("=" * 60)
     
     try:
-        client.admin.command('ping')
+        get_client().admin.command('ping')
         log("✓ Connected to MongoDB")
+        ensure_line_indexes()
     except Exception as e:
         log(f"✗ MongoDB connection failed: {e}")
         return
@@ -665,16 +727,40 @@ def main():
     # Optionally clear existing data; otherwise keep and skip already-scraped episodes
     if CLEAR_EXISTING:
         log(f"\nClearing existing data for fresh scrape...")
-        collection.delete_many({})
+        get_collection().delete_many({})
         log("✓ Collection cleared")
     else:
         log("\nPreserving existing data (CLEAR_EXISTING=False)")
     
-    existing_episodes = get_existing_episodes() if SKIP_EPISODES_WITH_DATA else set()
-    if SKIP_EPISODES_WITH_DATA:
+    skip_existing = SKIP_EPISODES_WITH_DATA and not args.incremental
+    existing_episodes = get_existing_episodes() if skip_existing else set()
+    if args.incremental:
+        log("Incremental mode: scraping only new, changed or stale-parser episodes")
+    elif skip_existing:
         log(f"Will skip episodes already in DB ({len(existing_episodes)} found)")
     else:
         log("Will re-scrape all episodes (SKIP_EPISODES_WITH_DATA=False)")
+
+    scraper = get_scraper()
+    limited = scraper.session
+    if args.rps > 0:
+        limited.limiter = HostRateLimiter(args.rps, args.burst)
+        log(f"Rate limit: {args.rps:g} req/s per host (burst {args.burst}), {max(args.workers, 1)} worker(s)")
+    else:
+        limited.limiter = None
+        log("Rate limit disabled; sleeping between episodes")
+
+    if args.no_cache:
+        scraper.cache = None
+        log("HTTP cache disabled")
+    else:
+        scraper.cache.ttl = args.cache_ttl
+        log(f"HTTP cache: {CACHE_DIR} (ttl {args.cache_ttl:g}s)")
+    scraper.offline = args.cache_only
+    if scraper.offline:
+        log("Cache-only mode: no network requests will be made")
+    if args.record or args.replay:
+        use_archive(args.archive, "replay" if args.replay else "record")
     
     log(f"\nScraping {len(EPISODES)} episodes...\n")
     
@@ -682,22 +768,83 @@ def main():
     successful = 0
     failed = 0
     failed_episodes = []
-    
-    for episode in EPISODES:
-        if SKIP_EPISODES_WITH_DATA and episode['title'] in existing_episodes:
-            log(f"    SKIP (already scraped): {episode['title']}")
-            continue
-        lines = scrape_episode(episode)
-        
+
+    stored_titles = get_existing_episodes() if args.incremental else None
+    manifest, revisions, pending = plan_scrape(args.incremental, skip_existing, existing_episodes, args.api_url,
+                                               stored_titles)
+
+    def record(episode, lines):
+        nonlocal total_lines, successful, failed
         if lines > 0:
             total_lines += lines
             successful += 1
+            if manifest is not None:
+                manifest.record(episode['title'], revisions.get(episode['title']), PARSER_VERSION, lines)
+                manifest.save()
         else:
             failed += 1
             failed_episodes.append(episode['title'])
-        
-        delay = BASE_DELAY + random.uniform(1.0, 3.0)
-        time.sleep(delay)
+
+    if args.fetch_mode == "api" and pending and not scraper.offline:
+        # Fetch everything in a handful of API requests; anything the batch
+        # can't serve goes through the regular per-page path below. Saved
+        # ../html pages win over the API, as they do over page fetches.
+        local = {ep['title'] for ep in pending if find_local_html(ep['title'])}
+        page_titles = [transcript_page_title(ep['title']) for ep in pending if ep['title'] not in local]
+        known = None
+        if revisions:
+            known = {transcript_page_title(t): rev for t, rev in revisions.items()}
+        html_by_page = {}
+        if page_titles:
+            try:
+                with metrics.stage("fetch"):
+                    html_by_page, stats = fetch_transcripts_html(
+                        scraper.session, page_titles, api=args.api_url, batch_size=args.api_batch, revisions=known)
+                metrics.count("requests", stats['requests'])
+                metrics.count("bytes", stats['bytes'])
+                log(f"Batch API: {len(html_by_page)}/{len(page_titles)} transcripts in "
+                    f"{stats['requests']} requests ({stats['bytes'] / 1024:.0f} KiB)")
+            except Exception as e:
+                log(f"Batch API fetch failed ({e}); falling back to page fetches")
+
+        fallback = []
+        for episode in pending:
+            html = html_by_page.get(transcript_page_title(episode['title']))
+            lines = scrape_episode_from_html(episode, html) if html else 0
+            if lines > 0:
+                record(episode, lines)
+            else:
+                fallback.append(episode)
+        if local:
+            log(f"\n{len(local)} episode(s) have saved ../html pages; reading those instead of the API")
+        if len(fallback) > len(local):
+            log(f"\n{len(fallback) - len(local)} episode(s) not served by the batch API; fetching pages")
+        pending = fallback
+
+    if args.workers > 1 and limited.limiter is not None:
+        # Counters are only touched here, on the main thread.
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = {pool.submit(scrape_episode, ep): ep for ep in pending}
+            for future in as_completed(futures):
+                episode = futures[future]
+                try:
+                    lines = future.result()
+                except Exception as e:
+                    log(f"    ERROR ({episode['title']}): {e}")
+                    lines = 0
+                record(episode, lines)
+        # Keep the failure list in episode order regardless of completion order
+        order = {ep['title']: i for i, ep in enumerate(EPISODES)}
+        failed_episodes.sort(key=lambda t: order.get(t, len(order)))
+    else:
+        for episode in pending:
+            lines = scrape_episode(episode)
+            record(episode, lines)
+
+            if limited.limiter is None and not scraper.offline and not replaying():
+                delay = BASE_DELAY + random.uniform(1.0, 3.0)
+                with metrics.stage("ratelimit"):
+                    time.sleep(delay)
     
     log("\n" + "=" * 60)
     log("SUMMARY")
@@ -714,9 +861,12 @@ def main():
             log(f"  - {ep}")
         if len(failed_episodes) > 10:
             log(f"  ... and {len(failed_episodes) - 10} more")
-    
+
+    metrics.summary(log)
+    metrics.close()
     log("=" * 60)
     log(f"Log written to: {LOG_FILE}")
+    log(f"Metrics written to: {METRICS_FILE}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Per-host request rate limiting for the scrapers.
+
+A TokenBucket refills at `rate` tokens per second up to `burst` tokens; every
+request takes one token and blocks until one is available. HostRateLimiter
+keeps one bucket per host so all worker threads share the same budget for
+the wiki, and RateLimitedSession wraps a requests/cloudscraper session so
+callers keep using `.get(url, ...)` exactly as before. requests sessions are
+not thread-safe (and cloudscraper keeps cookies and challenge state on
+them), so ThreadLocalSession gives every worker thread its own session
+while the limiter stays shared.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """Thread-safe token bucket. `rate` is tokens per second."""
+
+    def __init__(self, rate, burst=1):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = max(1.0, float(burst))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def acquire(self, tokens=1.0):
+        """Block until `tokens` are available, then take them. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class HostRateLimiter:
+    """One shared TokenBucket per host."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket_for(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, url):
+        return self.bucket_for(url).acquire()
+
+
+class RateLimitedSession:
+    """
+    Wraps a session so every request first takes a token for its host.
+    Set `limiter` to None to disable limiting. `on_wait(url, seconds)`, if
+    set, is called whenever a request had to wait for its token.
+    """
+
+    def __init__(self, session, limiter, on_wait=None):
+        self.session = session
+        self.limiter = limiter
+        self.on_wait = on_wait
+
+    def _acquire(self, url):
+        if self.limiter is None:
+            return
+        waited = self.limiter.acquire(url)
+        if waited and self.on_wait is not None:
+            self.on_wait(url, waited)
+
+    def get(self, url, **kwargs):
+        self._acquire(url)
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        self._acquire(url)
+        return self.session.post(url, **kwargs)
+
+
+class ThreadLocalSession:
+    """
+    Session-like object backed by one `factory()` session per thread,
+    created the first time that thread makes a request.
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._local = threading.local()
+
+    @property
+    def current(self):
+        """This thread's session."""
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self.factory()
+        return session
+
+    def get(self, url, **kwargs):
+        return self.current.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.current.post(url, **kwargs)
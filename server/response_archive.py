@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+Append-only archive of raw wiki responses, for recording a scrape and
+replaying it offline.
+
+The archive is one file of concatenated gzip members, one member per
+response: a JSON header line followed by the raw body, the same layout as
+an HttpCache entry:
+
+  {"key": "GET https://...", "url": "https://...", "method": "GET",
+   "status": 200, "headers": {...}, "fetched_at": 1733400000.0,
+   "sha256": "<body hash>", "bytes": 183022}
+
+Concatenated gzip members are themselves a valid gzip file (zcat works),
+records are only ever appended, and a member cut short by a crash is
+dropped (and truncated away before the next append). A damaged member (bad
+deflate data or CRC) is treated the same way: reading stops there, so it
+and every record after it are dropped and overwritten by the next append.
+
+Requests are keyed by method and full URL, plus a hash of the body for
+POSTs; the newest record for a key wins, and a response identical to the
+newest one is not stored again, so re-recording an unchanged wiki adds
+nothing. A 429 or 5xx never replaces an earlier 200 for the same request.
+
+- RecordingSession wraps a session and appends every response it gets
+- ReplaySession answers get()/post() from the archive and never touches
+  the network; a request that was never recorded raises ArchiveMiss
+
+Usage:
+  python response_archive.py list cache/responses.gz
+  python response_archive.py show cache/responses.gz "https://battlefordreamisland.fandom.com/wiki/Power_of_Three/Transcript"
+  python response_archive.py import-cache cache/http cache/responses.gz
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+import requests
+
+from http_cache import CacheMiss, cached_response
+
+# Headers describing the original transfer rather than the body stored here
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection',
+                   'keep-alive', 'set-cookie')
+READ_CHUNK = 1 << 20
+
+
+class ArchiveMiss(CacheMiss):
+    """Raised in replay when a request was never recorded."""
+
+
+def request_key(method, url, params=None, data=None, json_body=None):
+    """Archive key of a request: method, full URL and, if any, a body hash."""
+    prepared = requests.Request(method, url, params=params, data=data, json=json_body).prepare()
+    key = f"{method} {prepared.url}"
+    body = prepared.body
+    if body:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        key += f" {hashlib.sha256(body).hexdigest()}"
+    return key
+
+
+def key_from_kwargs(method, url, kwargs):
+    return request_key(method, url, kwargs.get('params'), kwargs.get('data'), kwargs.get('json'))
+
+
+def iter_members(f):
+    """
+    Yield (offset, length, data) for every complete gzip member in `f`,
+    from the current position. Stops at the end of the file, at a
+    truncated last member or at the first damaged one.
+    """
+    offset = f.tell()
+    pending = b""
+    while True:
+        decomp = zlib.decompressobj(zlib.MAX_WBITS | 16)
+        start = offset
+        out = []
+        while not decomp.eof:
+            chunk = pending or f.read(READ_CHUNK)
+            pending = b""
+            if not chunk:
+                return
+            try:
+                out.append(decomp.decompress(chunk))
+            except zlib.error:
+                return
+            offset += len(chunk)
+        pending = decomp.unused_data
+        offset -= len(pending)
+        yield start, offset - start, b"".join(out)
+
+
+def is_transient(status):
+    return status == 429 or status >= 500
+
+
+def split_record(data):
+    header, _, body = data.partition(b"\n")
+    return json.loads(header), body
+
+
+class ResponseArchive:
+    """
+    Index over one archive file: key -> (offset, length, header) of the
+    newest record. Built by scanning the file once when opened.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._index = {}
+        self._lock = threading.Lock()
+        self.records = 0
+        self.valid_end = 0
+        self._scan()
+
+    def _scan(self):
+        try:
+            f = self.path.open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for offset, length, data in iter_members(f):
+                try:
+                    entry, _ = split_record(data)
+                except ValueError:
+                    continue
+                self._add(entry['key'], offset, length, entry)
+                self.records += 1
+                self.valid_end = offset + length
+
+    def _add(self, key, offset, length, entry):
+        previous = self.entry(key)
+        # A rate-limit or server error never hides a good response recorded earlier
+        if previous and previous['status'] == 200 and is_transient(entry['status']):
+            return
+        self._index[key] = (offset, length, entry)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def keys(self):
+        return self._index.keys()
+
+    def entry(self, key):
+        """Header of the newest record for `key`, or None."""
+        item = self._index.get(key)
+        return item[2] if item else None
+
+    def load(self, key):
+        """Return (entry, body) of the newest record for `key`, or (None, None)."""
+        item = self._index.get(key)
+        if item is None:
+            return None, None
+        offset, length, _ = item
+        with self._lock, self.path.open("rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return split_record(gzip.decompress(member))
+
+    def append(self, key, url, method, status, headers, body, fetched_at=None):
+        """Append one response. Returns False if it matches the newest record for `key`."""
+        digest = hashlib.sha256(body).hexdigest()
+        entry = {
+            'key': key,
+            'url': url,
+            'method': method,
+            'status': status,
+            'headers': {k: v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS},
+            'fetched_at': fetched_at if fetched_at is not None else time.time(),
+            'sha256': digest,
+            'bytes': len(body),
+        }
+        member = gzip.compress(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n" + body, mtime=0)
+        with self._lock:
+            previous = self.entry(key)
+            if previous and previous['sha256'] == digest and previous['status'] == status:
+                return False
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                if f.tell() != self.valid_end:
+                    # Drop a member left half-written by an interrupted run
+                    f.truncate(self.valid_end)
+                f.write(member)
+                f.flush()
+                os.fsync(f.fileno())
+            self._add(key, self.valid_end, len(member), entry)
+            self.valid_end += len(member)
+            self.records += 1
+        return True
+
+    def __iter__(self):
+        """(entry, body) for every record in the file, oldest first."""
+        try:
+            f = self.path.open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for _, _, data in iter_members(f):
+                yield split_record(data)
+
+
+class RecordingSession:
+    """Wraps a session and appends every response (except bodiless 304s) to `archive`."""
+
+    def __init__(self, session, archive):
+        self.session = session
+        self.archive = archive
+
+    def _record(self, method, url, kwargs, response):
+        if response.status_code != 304:
+            self.archive.append(key_from_kwargs(method, url, kwargs), url, method,
+                                response.status_code, response.headers, response.content)
+        return response
+
+    def get(self, url, **kwargs):
+        return self._record("GET", url, kwargs, self.session.get(url, **kwargs))
+
+    def post(self, url, **kwargs):
+        return self._record("POST", url, kwargs, self.session.post(url, **kwargs))
+
+
+class ReplaySession:
+    """Serves requests from `archive` only; responses carry X-Cache: REPLAY."""
+
+    def __init__(self, archive):
+        self.archive = archive
+
+    def _replay(self, method, url, kwargs):
+        key = key_from_kwargs(method, url, kwargs)
+        entry, body = self.archive.load(key)
+        if entry is None:
+            raise ArchiveMiss(key)
+        return cached_response(url, entry, body, "REPLAY")
+
+    def get(self, url, **kwargs):
+        return self._replay("GET", url, kwargs)
+
+    def post(self, url, **kwargs):
+        return self._replay("POST", url, kwargs)
+
+
+def import_cache(cache_dir, archive):
+    """Append every HttpCache entry under `cache_dir`. Returns (added, unchanged)."""
+    added = unchanged = 0
+    for path in sorted(Path(cache_dir).glob("*/*.gz")):
+        try:
+            with gzip.open(path, "rb") as f:
+                entry, body = split_record(f.read())
+        except (OSError, EOFError, ValueError):
+            continue
+        url = entry.get('url')
+        if not url:
+            continue
+        if archive.append(request_key("GET", url), url, "GET", entry['status'], entry.get('headers', {}),
+                          body, entry.get('fetched_at')):
+            added += 1
+        else:
+            unchanged += 1
+    return added, unchanged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or seed a raw response archive")
+    sub = parser.add_subparsers(dest="command", required=True)
+    list_cmd = sub.add_parser("list", help="One line per archived request (newest record)")
+    list_cmd.add_argument("archive", type=Path)
+    show = sub.add_parser("show", help="Write the archived body of a GET URL to stdout")
+    show.add_argument("archive", type=Path)
+    show.add_argument("url")
+    seed = sub.add_parser("import-cache", help="Append the entries of an HttpCache directory")
+    seed.add_argument("cache_dir", type=Path)
+    seed.add_argument("archive", type=Path)
+    args = parser.parse_args()
+
+    archive = ResponseArchive(args.archive)
+    if args.command == "list":
+        for key in sorted(archive.keys()):
+            entry = archive.entry(key)
+            fetched = time.strftime("%Y-%m-%d %H:%M", time.localtime(entry['fetched_at']))
+            print(f"{entry['status']}  {entry['bytes']:8}  {fetched}  {key}")
+        size = archive.path.stat().st_size if archive.path.exists() else 0
+        print(f"{len(archive)} requests, {archive.records} records, {size / 1048576:.1f} MiB", file=sys.stderr)
+    elif args.command == "show":
+        entry, body = archive.load(request_key("GET", args.url))
+        if entry is None:
+            print(f"Not archived: {args.url}", file=sys.stderr)
+            return 1
+        print(f"Status {entry['status']}, {entry['bytes']} bytes, fetched "
+              f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['fetched_at']))}", file=sys.stderr)
+        sys.stdout.buffer.write(body)
+    else:
+        added, unchanged = import_cache(args.cache_dir, archive)
+        print(f"Imported {added} responses ({unchanged} already archived) into {args.archive}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
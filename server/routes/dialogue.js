@@ -6,11 +6,17 @@ const router = express.Router();
 
 // Load dialogue from local export
 const EXPORT_PATH = path.join(__dirname, '..', 'exports', 'dialogue_export.json');
-const THUMB_INDEX_PATH = path.join(__dirname, '..', 'exports', 'thumbnails', 'index.json');
+const THUMB_DIR = path.join(__dirname, '..', 'exports', 'thumbnails');
+const THUMB_INDEX_PATH = path.join(THUMB_DIR, 'index.json');
+// Written by optimize_thumbnails.py; its files are verified when it is written
+const THUMB_MANIFEST_PATH = path.join(THUMB_DIR, 'optimized', 'manifest.json');
+const PLACEHOLDER_THUMB = '/thumbnails/placeholder.jpg';
 const EXPORT_LIMIT = 150;
 
 let dialogueCache = [];
 let thumbIndex = {};
+// episode_title -> { thumbnail, thumbnail_2x? }, resolved once at load time
+let thumbUrls = {};
 
 function loadDialogue() {
   try {
@@ -27,20 +33,43 @@ function loadDialogue() {
   }
 }
 
-function loadThumbIndex() {
+function readJsonObject(filePath, label) {
   try {
-    const raw = fs.readFileSync(THUMB_INDEX_PATH, 'utf-8');
-    const parsed = JSON.parse(raw);
+    const parsed = JSON.parse(fs.readFileSync(filePath, 'utf-8'));
     if (parsed && typeof parsed === 'object') {
-      thumbIndex = parsed;
-      console.log(`Loaded thumbnail index (${Object.keys(thumbIndex).length}) from ${THUMB_INDEX_PATH}`);
-    } else {
-      throw new Error('Thumbnail index is not an object');
+      return parsed;
     }
+    throw new Error(`${label} is not an object`);
   } catch (err) {
-    console.error(`Failed to load thumbnail index at ${THUMB_INDEX_PATH}:`, err.message);
-    thumbIndex = {};
+    console.error(`Failed to load ${label} at ${filePath}:`, err.message);
+    return null;
+  }
+}
+
+function loadThumbIndex() {
+  thumbIndex = readJsonObject(THUMB_INDEX_PATH, 'thumbnail index') || {};
+  console.log(`Loaded thumbnail index (${Object.keys(thumbIndex).length}) from ${THUMB_INDEX_PATH}`);
+
+  const manifest = fs.existsSync(THUMB_MANIFEST_PATH)
+    ? readJsonObject(THUMB_MANIFEST_PATH, 'thumbnail manifest')
+    : null;
+  const optimized = (manifest && manifest.episodes) || {};
+  thumbUrls = {};
+  for (const [title, entry] of Object.entries(optimized)) {
+    if (entry && entry.card && entry.card.file) {
+      thumbUrls[title] = { thumbnail: `/thumbnails/optimized/${entry.card.file}` };
+      if (entry.retina && entry.retina.file) {
+        thumbUrls[title].thumbnail_2x = `/thumbnails/optimized/${entry.retina.file}`;
+      }
+    }
+  }
+  // Episodes without optimized variants fall back to the original file, checked once here
+  for (const [title, t] of Object.entries(thumbIndex)) {
+    if (!thumbUrls[title] && t && t.filename && fs.existsSync(path.join(THUMB_DIR, t.filename))) {
+      thumbUrls[title] = { thumbnail: `/thumbnails/${t.filename}` };
+    }
   }
+  console.log(`Resolved thumbnails for ${Object.keys(thumbUrls).length} episodes (${Object.keys(optimized).length} optimized)`);
 }
 
 // initial load
@@ -64,14 +93,7 @@ function matches(doc, keywords, character, season) {
 }
 
 function withThumbnail(doc) {
-  const t = thumbIndex[doc.episode_title];
-  if (t && t.filename) {
-    const thumbPath = path.join(__dirname, '..', 'exports', 'thumbnails', t.filename);
-    if (fs.existsSync(thumbPath)) {
-      return { ...doc, thumbnail: `/thumbnails/${t.filename}` };
-    }
-  }
-  return { ...doc, thumbnail: `/thumbnails/placeholder.jpg` };
+  return { ...doc, ...(thumbUrls[doc.episode_title] || { thumbnail: PLACEHOLDER_THUMB }) };
 }
 
 // All dialogue (limited)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Per-episode scrape manifest for incremental runs.
+
+For every scraped episode the manifest remembers the wiki revision it was
+parsed from (revision id + content sha1), the parser version that produced
+the stored lines and how many lines were written. An episode only needs
+re-scraping when its transcript revision changed or the parser is newer.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+MANIFEST_PATH = Path(__file__).parent / "cache" / "scrape_manifest.json"
+
+
+class ScrapeManifest:
+    def __init__(self, path=MANIFEST_PATH):
+        self.path = Path(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        manifest = cls(path)
+        try:
+            with manifest.path.open("r", encoding="utf-8") as f:
+                data = json.load(f)
+            manifest.entries = data.get('episodes', {})
+        except FileNotFoundError:
+            pass
+        return manifest
+
+    def get(self, title):
+        return self.entries.get(title)
+
+    def needs_scrape(self, title, revision, parser_version):
+        """
+        Return a reason string if the episode must be (re-)scraped, else None.
+        `revision` is the current metadata from the wiki, or None if unknown.
+        """
+        entry = self.entries.get(title)
+        if not entry or not entry.get('line_count'):
+            return "not scraped yet"
+        if entry.get('parser_version') != parser_version:
+            return f"parser v{entry.get('parser_version')} -> v{parser_version}"
+        if self.revision_changed(title, revision):
+            return f"revision {entry.get('revid')} -> {revision.get('revid')}"
+        return None
+
+    def revision_changed(self, title, revision):
+        """True if the wiki reports a different revision than the one scraped."""
+        entry = self.entries.get(title)
+        if not entry or revision is None:
+            return False
+        return (revision.get('revid'), revision.get('sha1')) != (entry.get('revid'), entry.get('sha1'))
+
+    def record(self, title, revision, parser_version, line_count):
+        """`revision` None (e.g. an offline re-parse) keeps the recorded revision."""
+        with self._lock:
+            if revision is None:
+                revision = self.entries.get(title) or {}
+            self.entries[title] = {
+                'revid': revision.get('revid'),
+                'sha1': revision.get('sha1'),
+                'timestamp': revision.get('timestamp'),
+                'parser_version': parser_version,
+                'line_count': line_count,
+                'scraped_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            }
+
+    def save(self):
+        """Write atomically so an interrupted run never leaves a torn manifest."""
+        with self._lock:
+            payload = json.dumps({'episodes': self.entries}, ensure_ascii=False, indent=2, sort_keys=True)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(payload)
+            os.replace(tmp, self.path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
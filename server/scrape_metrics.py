@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Structured per-episode instrumentation for the scrapers.
+
+ScrapeMetrics keeps one record per scraped episode:
+
+  {"type": "episode", "title": ..., "number": ..., "elapsed": 3.21,
+   "stages": {"ratelimit": 1.9, "fetch": 0.8, "render": 0.0, "backoff": 0.0,
+              "parse": 0.4, "write": 0.1},
+   "requests": 2, "retries": 0, "errors": 0, "status": {"200": 2},
+   "cache": {"MISS": 1, "HIT": 1}, "bytes": 183022, "cache_bytes": 91311,
+   "lines": 412, "error": null, "wait": 0.01, "peak_rss_kib": 88412}
+
+Stage times are exclusive: a stage nested inside another (the rate limiter
+wait inside a fetch, say) is only counted once, in the inner stage, and
+"wait" is the rest of the elapsed time (queued between stages). Records
+are appended as JSON lines to logs/metrics_<run>.jsonl through a
+BufferedLogWriter, followed by one {"type": "run"} record with the totals.
+summary() logs the stage breakdown and the slowest episodes.
+
+BufferedLogWriter is also what log() writes the text log through: lines are
+buffered in memory and appended in one write every `flush_lines` lines or
+`flush_interval` seconds, and at exit.
+"""
+
+import atexit
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+STAGES = ("ratelimit", "fetch", "render", "backoff", "parse", "write")
+COUNTERS = ("requests", "retries", "errors", "bytes", "cache_bytes")
+
+FLUSH_LINES = 64
+FLUSH_INTERVAL = 2.0  # Seconds
+
+
+def peak_rss_kib():
+    """Peak resident set size of this process in KiB, or None if unknown."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak  # macOS reports bytes
+
+
+class BufferedLogWriter:
+    """
+    Thread-safe line writer that appends to `path` in batches. The file (and
+    its directory) is only created by the first flush, so a writer nobody
+    uses leaves nothing behind.
+    """
+
+    def __init__(self, path, flush_lines=FLUSH_LINES, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        atexit.register(self.flush)
+
+    def write(self, line):
+        with self._lock:
+            self._buffer.append(line)
+            if (len(self._buffer) >= self.flush_lines
+                    or time.monotonic() - self._last_flush >= self.flush_interval):
+                self._flush_locked()
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def _flush_locked(self):
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as f:
+            f.write("\n".join(self._buffer) + "\n")
+        self._buffer.clear()
+
+
+def new_record(title, **fields):
+    return {
+        "type": "episode",
+        "title": title,
+        **fields,
+        "started": time.time(),
+        "elapsed": 0.0,
+        "stages": dict.fromkeys(STAGES, 0.0),
+        **dict.fromkeys(COUNTERS, 0),
+        "status": {},
+        "cache": {},
+        "lines": 0,
+        "error": None,
+    }
+
+
+class ScrapeMetrics:
+    """
+    Collects episode records and run totals. Records are attached to the
+    current thread (track() / episode()), so code deep in the fetch path can
+    call stage() and observe_response() without passing the record around;
+    work done for no episode (e.g. batch API requests) only counts towards
+    the run totals.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.writer = BufferedLogWriter(path) if path else None
+        self.run = new_record(None)
+        self.run["type"] = "run"
+        self.episodes = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    # -- episode records ------------------------------------------------------
+
+    def start(self, title, **fields):
+        """New record for one episode; its clock starts now."""
+        record = new_record(title, **fields)
+        record["_clock"] = time.perf_counter()
+        return record
+
+    def finish(self, record, lines=None, error=None):
+        """Close `record`, add it to the run and write it out."""
+        record["elapsed"] = round(time.perf_counter() - record.pop("_clock"), 4)
+        if lines is not None:
+            record["lines"] = lines
+        if error is not None:
+            record["error"] = str(error)
+        record["stages"] = {name: round(secs, 4) for name, secs in record["stages"].items()}
+        # Time in no stage: queued between pipeline stages, waiting for a batch
+        record["wait"] = round(max(0.0, record["elapsed"] - sum(record["stages"].values())), 4)
+        record["peak_rss_kib"] = peak_rss_kib()
+        with self._lock:
+            self.episodes.append(record)
+            self.run["lines"] += record["lines"]
+        if self.writer is not None:
+            self.writer.write(json.dumps(record, ensure_ascii=False))
+
+    def current(self):
+        return getattr(self._local, "record", None)
+
+    @contextmanager
+    def track(self, record):
+        """Attribute everything measured on this thread to `record`."""
+        previous = self.current()
+        self._local.record = record
+        try:
+            yield record
+        finally:
+            self._local.record = previous
+
+    @contextmanager
+    def episode(self, title, **fields):
+        """start() + track() + finish(); set record['lines'] inside the block."""
+        record = self.start(title, **fields)
+        error = None
+        try:
+            with self.track(record):
+                yield record
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.finish(record, error=error)
+
+    # -- measurements ---------------------------------------------------------
+
+    def add_time(self, name, seconds, record=None):
+        """Add `seconds` to stage `name` of `record` (default: this thread's)."""
+        record = record or self.current()
+        with self._lock:
+            self.run["stages"][name] = self.run["stages"].get(name, 0.0) + seconds
+            if record is not None:
+                record["stages"][name] = record["stages"].get(name, 0.0) + seconds
+        # Exclusive timing: the enclosing stage must not count this time again
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1] += seconds
+
+    @contextmanager
+    def stage(self, name):
+        """Time the block as stage `name` (minus any stages nested inside it)."""
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            nested = stack.pop()
+            self.add_time(name, time.perf_counter() - start - nested)
+
+    def count(self, name, n=1, record=None):
+        record = record or self.current()
+        with self._lock:
+            self.run[name] = self.run.get(name, 0) + n
+            if record is not None:
+                record[name] = record.get(name, 0) + n
+
+    def observe_response(self, response, record=None):
+        """Count one HTTP response: status code, cache state, body size."""
+        record = record or self.current()
+        state = response.headers.get("X-Cache")
+        size = len(response.content)
+        # Cache hits, 304 revalidations and replays didn't download the body
+        size_counter = "cache_bytes" if state in ("HIT", "REVALIDATED", "REPLAY") else "bytes"
+        with self._lock:
+            for target in (self.run, record) if record is not None else (self.run,):
+                target["requests"] += 1
+                target[size_counter] += size
+                status = str(response.status_code)
+                target["status"][status] = target["status"].get(status, 0) + 1
+                if state:
+                    target["cache"][state] = target["cache"].get(state, 0) + 1
+
+    # -- reporting ------------------------------------------------------------
+
+    def summary(self, log, top=10):
+        """Log where the run's time went and its slowest episodes."""
+        run = self.run
+        stage_total = sum(run["stages"].values())
+        log("\nTime by stage (summed over workers):")
+        for name, secs in sorted(run["stages"].items(), key=lambda item: -item[1]):
+            if secs > 0:
+                log(f"  {name:10} {secs:9.1f}s  {secs / stage_total:6.1%}")
+
+        slowest = sorted(self.episodes, key=lambda r: -r["elapsed"])[:top]
+        if slowest:
+            log("\nSlowest episodes:")
+            for record in slowest:
+                stages = sorted([*record["stages"].items(), ("wait", record["wait"])], key=lambda item: -item[1])
+                breakdown = ", ".join(f"{name} {secs:.1f}s" for name, secs in stages[:3] if secs >= 0.05)
+                log(f"  {record['elapsed']:7.1f}s  {record['title']}" + (f"  ({breakdown})" if breakdown else ""))
+
+        statuses = " ".join(f"{code}x{n}" for code, n in sorted(run["status"].items()))
+        cache = " ".join(f"{state}x{n}" for state, n in sorted(run["cache"].items()))
+        log(f"\nRequests: {run['requests']} ({run['retries']} retries, {run['errors']} errors)"
+            + (f"; status {statuses}" if statuses else "") + (f"; cache {cache}" if cache else ""))
+        peak = peak_rss_kib()
+        log(f"Downloaded {run['bytes'] / 1048576:.1f} MiB ({run['cache_bytes'] / 1048576:.1f} MiB from cache)"
+            + (f"; peak RSS {peak / 1024:.0f} MiB" if peak else ""))
+
+    def close(self):
+        """Write the run record and flush the metrics file."""
+        run = dict(self.run)
+        run["started"] = datetime.fromtimestamp(run["started"]).isoformat(timespec="seconds")
+        run["elapsed"] = round(time.time() - self.run["started"], 3)
+        run["episodes"] = len(self.episodes)
+        run["stages"] = {name: round(secs, 4) for name, secs in run["stages"].items()}
+        run["peak_rss_kib"] = peak_rss_kib()
+        del run["title"]
+        if self.writer is not None:
+            self.writer.write(json.dumps(run, ensure_ascii=False))
+            self.writer.flush()
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+"""
+Staged scrape pipeline built on populateBFDIDatabase.py.
+
+  fetch threads --raw HTML--> process pool --parsed lines--> writer thread
+
+- Fetch threads load transcript HTML (saved ../html page, HTTP cache or the
+  wiki, through the shared per-host rate limiter). At most --queue-size pages
+  are held fetched-but-unparsed; further fetches wait for a free slot.
+- BeautifulSoup and parse_dialogue_advanced run in a process pool, so the
+  CPU-bound parse uses every core instead of holding one GIL.
+- The writer batches several episodes into one sync (one transaction) that
+  only writes the lines that changed, and records each written episode in
+  the scrape manifest.
+
+--reparse never touches the network: pages come from ../html and the HTTP
+cache only. After a parser change (PARSER_VERSION bump) it re-parses every
+stale episode in parallel; --all re-parses everything. --replay does the
+same from a response archive recorded with --record (see
+response_archive.py), so the input is exactly the recorded pages.
+
+Usage:
+  python scrape_pipeline.py                      # incremental scrape, same rules as populateBFDIDatabase.py
+  python scrape_pipeline.py --reparse            # re-parse cached HTML of stale episodes
+  python scrape_pipeline.py --reparse --all --sink ndjson --out exports/reparse.ndjson
+  python scrape_pipeline.py --replay --all --sink ndjson --out exports/replay.ndjson
+"""
+
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+
+import populateBFDIDatabase as scrape
+import transcript_parser
+from rate_limit import HostRateLimiter
+
+PARSE_WORKERS = os.cpu_count() or 2
+BATCH_EPISODES = 8
+FLUSH_INTERVAL = 5.0  # Seconds a partial batch may wait for more episodes
+
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+def load_raw(episode, skip_local=False):
+    """Return (raw_html, source, error) for one episode's transcript page."""
+    title = episode['title']
+    if not skip_local:
+        local_path = scrape.find_local_html(title)
+        if local_path:
+            try:
+                with scrape.metrics.stage("fetch"):
+                    return local_path.read_bytes(), "local", None
+            except OSError as e:
+                scrape.log(f"    Failed to read local HTML ({local_path.name}): {e}")
+    response, error, _ = scrape.fetch_page_with_retry(scrape.build_transcript_url(title))
+    if error:
+        return None, None, error
+    return response.content, "web", None
+
+
+def parse_transcript(raw, title):
+    """Process-pool worker: raw HTML -> (title card image, dialogue lines, parse seconds)."""
+    start = time.perf_counter()
+    image_url, dialogue_lines = transcript_parser.parse_html(raw, title)
+    return image_url, dialogue_lines, time.perf_counter() - start
+
+
+class MongoSink:
+    """Syncs each batch into MongoDB, writing only lines that are new, changed or gone."""
+    name = "mongo"
+
+    def write(self, titles, docs):
+        counts = scrape.sync_lines(titles, docs)
+        scrape.log(f"    SYNC {counts['inserted']} new, {counts['updated']} updated, "
+                   f"{counts['deleted']} removed, {counts['unchanged']} unchanged")
+        return len(docs)
+
+    def close(self):
+        pass
+
+
+class NdjsonSink:
+    """Writes documents to a file instead of MongoDB; renamed into place on close."""
+    name = "ndjson"
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.tmp_path = self.path.with_name(self.path.name + ".tmp")
+        self._file = self.tmp_path.open("w", encoding="utf-8")
+
+    def write(self, titles, docs):
+        for doc in docs:
+            self._file.write(json.dumps(doc, ensure_ascii=False, default=str))
+            self._file.write("\n")
+        return len(docs)
+
+    def close(self):
+        self._file.close()
+        os.replace(self.tmp_path, self.path)
+
+
+class BatchWriter(threading.Thread):
+    """
+    Consumes (episode, image_url, lines) items, or (episode, None, None) for
+    failures, and writes them to `sink` in batches of `batch_episodes`.
+    `on_result(episode, line_count)` runs on this thread for every episode.
+    Write time is split across a batch's metrics `records` by line count.
+    """
+
+    def __init__(self, sink, batch_episodes, on_result, records=None):
+        super().__init__(name="batch-writer", daemon=True)
+        self.sink = sink
+        self.batch_episodes = max(1, batch_episodes)
+        self.on_result = on_result
+        self.records = records if records is not None else {}
+        self.queue = queue.Queue()
+        self.batches = 0
+
+    def run(self):
+        batch = []
+        while True:
+            try:
+                item = self.queue.get(timeout=FLUSH_INTERVAL)
+            except queue.Empty:
+                self.flush(batch)
+                continue
+            if item is None:
+                self.flush(batch)
+                return
+            episode, image_url, lines = item
+            if not lines:
+                self.on_result(episode, 0)
+                continue
+            batch.append(item)
+            if len(batch) >= self.batch_episodes:
+                self.flush(batch)
+
+    def flush(self, batch):
+        if not batch:
+            return
+        docs = []
+        counts = []
+        for episode, image_url, lines in batch:
+            episode_docs = scrape.build_episode_docs(
+                episode, lines, scrape.build_transcript_url(episode['title']), image_url)
+            docs.extend(episode_docs)
+            counts.append(len(episode_docs))
+        try:
+            start = time.perf_counter()
+            self.sink.write([episode['title'] for episode, _, _ in batch], docs)
+            elapsed = time.perf_counter() - start
+            for (episode, _, _), count in zip(batch, counts):
+                scrape.metrics.add_time("write", elapsed * count / max(len(docs), 1),
+                                        self.records.get(episode['title']))
+            self.batches += 1
+            scrape.log(f"    WROTE {len(docs)} lines for {len(batch)} episode(s)")
+        except Exception as e:
+            scrape.log(f"    ERROR writing batch ({', '.join(ep['title'] for ep, _, _ in batch)}): {e}")
+            counts = [0] * len(batch)
+        for (episode, _, _), count in zip(batch, counts):
+            self.on_result(episode, count)
+        batch.clear()
+
+
+# =============================================================================
+# PIPELINE
+# =============================================================================
+
+def run_pipeline(episodes, sink, on_result, fetch_workers, parse_workers, queue_size, batch_episodes):
+    """Fetch, parse and write `episodes`; returns the writer's batch count."""
+    records = {}  # Metrics record per in-flight episode title
+
+    def finished(episode, lines):
+        record = records.pop(episode['title'], None)
+        if record is not None:
+            scrape.metrics.finish(record, lines)
+        on_result(episode, lines)
+
+    writer = BatchWriter(sink, batch_episodes, finished, records)
+    events = queue.Queue()
+    slots = threading.BoundedSemaphore(max(1, queue_size))
+
+    def fetch(episode, skip_local=False):
+        slots.acquire()  # Backpressure: wait while queue_size pages await parsing
+        title = episode['title']
+        record = records.get(title)
+        if record is None:
+            record = records[title] = scrape.metrics.start(title, number=episode['number'])
+        try:
+            with scrape.metrics.track(record):
+                raw, source, error = load_raw(episode, skip_local)
+        except Exception as e:
+            raw, source, error = None, None, f"fetch error: {e}"
+        record['source'] = source
+        events.put(("fetched", episode, (raw, source, error)))
+
+    with ProcessPoolExecutor(max_workers=max(1, parse_workers)) as parse_pool, \
+            ThreadPoolExecutor(max_workers=max(1, fetch_workers)) as fetch_pool:
+        # Start the parse processes before the writer and fetch threads exist
+        parse_pool.submit(int).result()
+        writer.start()
+        for episode in episodes:
+            fetch_pool.submit(fetch, episode)
+
+        active = len(episodes)
+        while active:
+            kind, episode, payload = events.get()
+            title = episode['title']
+            if kind == "fetched":
+                raw, source, error = payload
+                if error:
+                    slots.release()
+                    scrape.log(f"    SKIP: {title}: {error}")
+                    records[title]['error'] = error
+                    writer.queue.put((episode, None, None))
+                    active -= 1
+                    continue
+                future = parse_pool.submit(parse_transcript, raw, title)
+                future.add_done_callback(
+                    lambda f, episode=episode, source=source: events.put(("parsed", episode, (f, source))))
+            else:
+                slots.release()
+                future, source = payload
+                try:
+                    image_url, lines, parse_seconds = future.result()
+                    scrape.metrics.add_time("parse", parse_seconds, records[title])
+                except Exception as e:
+                    scrape.log(f"    ERROR parsing {title}: {e}")
+                    records[title]['error'] = str(e)
+                    image_url, lines = None, []
+                if not lines and source == "local":
+                    scrape.log(f"    Local HTML for {title} produced no dialogue; fetching the page instead")
+                    fetch_pool.submit(fetch, episode, True)
+                    continue
+                if not lines:
+                    scrape.log(f"    WARNING: No valid dialogue found for {title}")
+                writer.queue.put((episode, image_url, lines))
+                active -= 1
+
+    writer.queue.put(None)
+    writer.join()
+    sink.close()
+    return writer.batches
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape BFDI transcripts with parallel parsing")
+    parser.add_argument("--fetch-workers", type=int, default=scrape.CONCURRENT_WORKERS,
+                        help="Threads fetching pages")
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS,
+                        help="Processes parsing pages")
+    parser.add_argument("--queue-size", type=int, default=None,
+                        help="Pages held fetched-but-unparsed (default: 2 per parse worker)")
+    parser.add_argument("--batch-episodes", type=int, default=BATCH_EPISODES,
+                        help="Episodes written per batch")
+    parser.add_argument("--rps", type=float, default=scrape.REQUESTS_PER_SECOND,
+                        help="Requests per second per host (0 = no limiter)")
+    parser.add_argument("--burst", type=int, default=scrape.REQUEST_BURST,
+                        help="Token bucket burst size per host")
+    parser.add_argument("--cache-ttl", type=float, default=scrape.CACHE_TTL,
+                        help="Seconds a cached page is reused before revalidation")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--reparse", action="store_true",
+                      help="Offline: re-parse saved/cached HTML only")
+    mode.add_argument("--replay", action="store_true",
+                      help="Offline: re-parse exactly what the response archive holds (ignores ../html)")
+    mode.add_argument("--record", action="store_true",
+                      help="Append every wiki response to the response archive")
+    parser.add_argument("--archive", type=Path, default=scrape.ARCHIVE_PATH,
+                        help="Response archive file for --record / --replay")
+    parser.add_argument("--all", action="store_true",
+                        help="Process every episode, not just new/changed/stale ones")
+    parser.add_argument("--no-incremental", dest="incremental", action="store_false", default=scrape.INCREMENTAL,
+                        help="Ignore the scrape manifest and fall back to SKIP_EPISODES_WITH_DATA")
+    parser.add_argument("--sink", choices=("mongo", "ndjson"), default="mongo",
+                        help="Where parsed lines go")
+    parser.add_argument("--out", type=Path, default=Path(__file__).resolve().parent / "exports" / "pipeline.ndjson",
+                        help="Output file for --sink ndjson")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    queue_size = args.queue_size or 2 * max(1, args.parse_workers)
+
+    scrape.log("=" * 60)
+    scrape.log(f"BFDI Search - Scrape pipeline (parser v{scrape.PARSER_VERSION})")
+    scrape.log(f"  {args.fetch_workers} fetch thread(s), {args.parse_workers} parse process(es), "
+               f"queue {queue_size}, {args.batch_episodes} episode(s) per write")
+    scrape.log("=" * 60)
+
+    scraper = scrape.get_scraper()
+    scraper.session.limiter = HostRateLimiter(args.rps, args.burst) if args.rps > 0 else None
+    scraper.cache.ttl = args.cache_ttl
+    scraper.offline = args.reparse
+    if args.reparse:
+        scrape.log("Re-parse mode: pages come from ../html and the HTTP cache only")
+    if args.record or args.replay:
+        scrape.use_archive(args.archive, "replay" if args.replay else "record")
+
+    if args.sink == "mongo":
+        try:
+            scrape.get_client().admin.command('ping')
+            scrape.log("✓ Connected to MongoDB")
+            scrape.ensure_line_indexes()
+        except Exception as e:
+            scrape.log(f"✗ MongoDB connection failed: {e}")
+            return
+        sink = MongoSink()
+    else:
+        sink = NdjsonSink(args.out)
+
+    manifest, revisions = None, {}
+    if args.all:
+        episodes = list(scrape.EPISODES)
+        if args.incremental and args.sink == "mongo":
+            manifest = scrape.ScrapeManifest.load()
+    else:
+        skip_existing = scrape.SKIP_EPISODES_WITH_DATA and not args.incremental and args.sink == "mongo"
+        existing = scrape.get_existing_episodes() if skip_existing else set()
+        # The manifest only describes MongoDB, so only there can stored lines be checked
+        stored = scrape.get_existing_episodes() if args.incremental and args.sink == "mongo" else None
+        manifest, revisions, episodes = scrape.plan_scrape(args.incremental, skip_existing, existing,
+                                                           stored_titles=stored)
+        if args.sink != "mongo":
+            manifest = None  # The manifest describes what is stored in MongoDB
+    scrape.log(f"\nProcessing {len(episodes)} of {len(scrape.EPISODES)} episodes...\n")
+
+    totals = {'lines': 0, 'successful': 0}
+    failed_episodes = []
+
+    def on_result(episode, lines):
+        if lines > 0:
+            totals['lines'] += lines
+            totals['successful'] += 1
+            if manifest is not None:
+                manifest.record(episode['title'], revisions.get(episode['title']), scrape.PARSER_VERSION, lines)
+                manifest.save()
+        else:
+            failed_episodes.append(episode['title'])
+
+    start = time.perf_counter()
+    batches = run_pipeline(episodes, sink, on_result, args.fetch_workers, args.parse_workers,
+                           queue_size, args.batch_episodes)
+    elapsed = time.perf_counter() - start
+
+    order = {ep['title']: i for i, ep in enumerate(scrape.EPISODES)}
+    failed_episodes.sort(key=lambda t: order.get(t, len(order)))
+    scrape.log("\n" + "=" * 60)
+    scrape.log("SUMMARY")
+    scrape.log("=" * 60)
+    scrape.log(f"Episodes processed: {len(episodes)} in {elapsed:.1f}s "
+               f"({len(episodes) / max(elapsed, 1e-9):.1f} episodes/s)")
+    scrape.log(f"Successful: {totals['successful']}")
+    scrape.log(f"Failed/No transcript: {len(failed_episodes)}")
+    scrape.log(f"Total dialogue lines: {totals['lines']} in {batches} write batch(es) to {sink.name}")
+    if failed_episodes:
+        scrape.log(f"\nEpisodes without transcripts ({len(failed_episodes)}):")
+        for title in failed_episodes[:10]:
+            scrape.log(f"  - {title}")
+        if len(failed_episodes) > 10:
+            scrape.log(f"  ... and {len(failed_episodes) - 10} more")
+    scrape.metrics.summary(scrape.log)
+    scrape.metrics.close()
+    scrape.log("=" * 60)
+    scrape.log(f"Log written to: {scrape.LOG_FILE}")
+    scrape.log(f"Metrics written to: {scrape.METRICS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
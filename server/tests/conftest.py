@@ -0,0 +1,6 @@
+import sys
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(SERVER_DIR))
+sys.path.insert(0, str(SERVER_DIR / "benchmarks"))
@@ -0,0 +1,73 @@
+"""Keyset paging of dialogue_query.search() over a mongomock collection."""
+
+import random
+
+import pytest
+from bson import ObjectId
+
+import dialogue_query as dq
+
+mongomock = pytest.importorskip("mongomock")
+
+
+def sort_key(doc):
+    # BSON order: a missing ordinal sorts before every number
+    ordinal = doc.get("ordinal")
+    return (doc["season"], doc["episode_number"], doc["episode_title"],
+            (0, 0) if ordinal is None else (1, ordinal), doc["_id"])
+
+
+@pytest.fixture(scope="module")
+def collection():
+    rng = random.Random(25)
+    docs = []
+    for season in (1, 2):
+        for number in (1, 2, 3):
+            title = f"Episode {season}-{number}"
+            ordinals = list(range(6))
+            if number == 2:
+                ordinals += [None, None, None]  # Older lines stored before ordinals, same episode
+            if number == 3 and season == 2:
+                ordinals = [None] * 4           # An episode not re-scraped since
+            for ordinal in ordinals:
+                doc = {"_id": ObjectId(), "season": season, "episode_number": number,
+                       "episode_title": title, "character": rng.choice(["four", "x", "leafy"]),
+                       "dialogue": rng.choice(["Lava!", "Yoylecake", "lava cake"])}
+                if ordinal is not None:
+                    doc["ordinal"] = ordinal
+                docs.append(doc)
+    rng.shuffle(docs)  # _id order must not matter
+    coll = mongomock.MongoClient().db.dialogue
+    coll.insert_many(docs)
+    return coll
+
+
+def walk(collection, limit, **filters):
+    pages, cursor = [], None
+    while True:
+        docs, cursor = dq.search(collection, limit=limit, cursor=cursor, **filters)
+        pages.append(docs)
+        if cursor is None:
+            return pages
+
+
+@pytest.mark.parametrize("limit", [1, 2, 4, 7, 150])
+@pytest.mark.parametrize("filters", [{}, {"character": "four"}, {"season": "2nd"}, {"keywords": "lava"}])
+def test_pages_cover_every_line_in_order(collection, limit, filters):
+    expected = sorted(collection.find(dq.build_filter(**filters)), key=sort_key)
+    pages = walk(collection, limit, **filters)
+    got = [doc["_id"] for page in pages for doc in page]
+    assert got == [str(doc["_id"]) for doc in expected]
+    assert all(0 < len(page) <= limit for page in pages if expected)
+
+
+def test_cursor_on_a_legacy_line_keeps_numbered_lines(collection):
+    legacy = sorted(collection.find({"episode_title": "Episode 1-2", "ordinal": None}), key=sort_key)[-1]
+    docs, _ = dq.search(collection, limit=150, cursor=dq.encode_cursor(legacy))
+    same_episode = [doc["ordinal"] for doc in docs if doc["episode_title"] == "Episode 1-2"]
+    assert same_episode == list(range(6))
+
+
+def test_invalid_cursor():
+    with pytest.raises(ValueError):
+        dq.decode_cursor("not a cursor")
@@ -0,0 +1,47 @@
+"""Streamed combined export."""
+
+import json
+
+import pytest
+from bson import ObjectId
+
+from export_dialogue import export_all
+
+# Characters str.splitlines() breaks on that json.dumps(ensure_ascii=False)
+# leaves unescaped inside strings
+SEPARATORS = "\u2028\u2029\x85\x1c\x1d\x1e\x0b\x0c"
+
+
+class FakeCollection:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def find(self, *args, **kwargs):
+        return iter(self.docs)
+
+
+def sample_docs():
+    return [
+        {"_id": ObjectId(), "episode_title": "Yeah, Who? I Wanna Know", "character": "four",
+         "dialogue": f"a{SEPARATORS}b c\x85d\nline", "ordinal": 0, "section": None},
+        {"_id": ObjectId(), "episode_title": "Yeah, Who? I Wanna Know", "character": "x",
+         "dialogue": "Plain line.", "ordinal": 1, "section": "Part 1"},
+    ]
+
+
+@pytest.mark.parametrize("docs", [sample_docs(), []])
+def test_json_matches_json_dump(tmp_path, docs):
+    out = tmp_path / "export.json"
+    assert export_all(FakeCollection(docs), out, "json") == len(docs)
+    text = out.read_text(encoding="utf-8")
+    assert text == json.dumps(docs, ensure_ascii=False, indent=2, default=str)
+    assert [doc["dialogue"] for doc in json.loads(text)] == [doc["dialogue"] for doc in docs]
+
+
+def test_ndjson_round_trips_separators(tmp_path):
+    docs = sample_docs()
+    out = tmp_path / "export.ndjson"
+    export_all(FakeCollection(docs), out, "ndjson")
+    with out.open("r", encoding="utf-8", newline="") as f:
+        loaded = [json.loads(line) for line in f.read().split("\n") if line]
+    assert [doc["dialogue"] for doc in loaded] == [doc["dialogue"] for doc in docs]
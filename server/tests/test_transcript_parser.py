@@ -0,0 +1,61 @@
+"""Parser output on the checked-in benchmark fixtures."""
+
+import gzip
+import json
+from collections import Counter
+from pathlib import Path
+
+import pytest
+
+from bench_parser import BASELINE_PATH, FIXTURE_DIR, FIXTURE_TITLES, lines_digest, parse_page
+
+# (character, dialogue) lines of the parser before the single-pass rewrite
+# (PARSER_VERSION 7: separate <p>/<table>/<li> sweeps, then a dedup on the
+# first 50 characters of each line), one list per fixture
+LEGACY_LINES = Path(__file__).resolve().parent / "data" / "legacy_parser_lines.json.gz"
+FIXTURES = sorted(FIXTURE_TITLES)
+
+
+def parse_fixture(name):
+    raw = gzip.decompress((FIXTURE_DIR / f"{name}.html.gz").read_bytes())
+    return parse_page(raw, FIXTURE_TITLES[name])
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    with gzip.open(LEGACY_LINES, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_output_matches_baseline(name):
+    baseline = json.loads(BASELINE_PATH.read_text(encoding="utf-8"))["pages"][name]
+    lines = parse_fixture(name)
+    assert len(lines) == baseline["lines"]
+    assert lines_digest(lines) == baseline["digest"]
+
+
+@pytest.mark.parametrize("name", FIXTURES)
+def test_keeps_every_legacy_line(name, legacy):
+    lines = Counter((line["character"], line["dialogue"]) for line in parse_fixture(name))
+    missing = Counter(map(tuple, legacy[name])) - lines
+    assert not missing
+
+
+def test_lines_sharing_an_opening_are_all_kept(legacy):
+    """
+    The legacy dedup kept whichever of two lines with the same 50-character
+    opening it saw first, so its pick depended on visit order; both are lines.
+    """
+    price_tag = [dialogue for character, dialogue in
+                 ((line["character"], line["dialogue"]) for line in parse_fixture("list_style"))
+                 if character == "price tag" and dialogue.startswith("I just want to say that I am really")]
+    legacy_price_tag = [dialogue for character, dialogue in legacy["list_style"]
+                        if character == "price tag" and dialogue.startswith("I just want to say that I am really")]
+    assert set(legacy_price_tag) < set(price_tag)
+
+
+def test_ordinals_and_ids():
+    lines = parse_fixture("list_style")
+    assert [line["ordinal"] for line in lines] == list(range(len(lines)))
+    assert len({line["line_id"] for line in lines}) == len(lines)
@@ -0,0 +1,114 @@
+"""Batched action=parse fetches against a local stand-in for api.php."""
+
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+import requests
+
+from transcript_parser import parse_html
+from wiki_api import MARKER_CLASS, fetch_revision_metadata, fetch_transcripts_html, transcript_page_title
+
+PAGES = {
+    transcript_page_title(f"Episode {n}"): [("Firey", f"Line one of episode {n}!"),
+                                             ("Leafy", f"Line two of episode {n}!")]
+    for n in range(1, 6)
+}
+MISSING = transcript_page_title("Episode 404")
+TRANSCLUDE_RE = re.compile(r"\{\{:([^}]+)\}\}")
+
+
+def render(wikitext):
+    """Stand-in for action=parse: keep the marker divs, expand each {{:Page}}."""
+    def expand(match):
+        lines = PAGES.get(match.group(1))
+        if lines is None:
+            return f'<p><a class="new">Template:{match.group(1)}</a></p>'
+        return "".join(f"<p><b>{character}:</b> {dialogue}</p>\n" for character, dialogue in lines)
+    return TRANSCLUDE_RE.sub(expand, wikitext)
+
+
+class StandInApi(BaseHTTPRequestHandler):
+    requests = []
+
+    def reply(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        params = {k: v[0] for k, v in parse_qs(urlsplit(self.path).query).items()}
+        self.requests.append(params)
+        pages = []
+        for title in params["titles"].split("|"):
+            if title in PAGES:
+                pages.append({"title": title, "revisions": [
+                    {"revid": len(title), "sha1": f"sha-{title}", "timestamp": "2024-01-01T00:00:00Z"}]})
+            else:
+                pages.append({"title": title, "missing": True})
+        self.reply({"query": {"pages": pages}})
+
+    def do_POST(self):
+        length = int(self.headers["Content-Length"])
+        params = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode("utf-8")).items()}
+        self.requests.append(params)
+        self.reply({"parse": {"title": "API", "text": render(params["text"])}})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    StandInApi.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandInApi)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/api.php"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_revision_metadata(api):
+    with requests.Session() as session:
+        meta = fetch_revision_metadata(session, [*PAGES, MISSING], api=api)
+    assert meta[MISSING] is None
+    assert all(meta[title]["sha1"] == f"sha-{title}" for title in PAGES)
+
+
+def test_batches_split_at_markers(api):
+    titles = [*PAGES, MISSING]
+    with requests.Session() as session:
+        html_by_page, stats = fetch_transcripts_html(session, titles, api=api, batch_size=2)
+
+    parses = [r for r in StandInApi.requests if r.get("action") == "parse"]
+    assert len(parses) == 3  # Five existing pages, two per render; the missing one is never rendered
+    assert all(MARKER_CLASS in r["text"] for r in parses)
+    assert stats["requests"] == 1 + len(parses)
+    assert set(html_by_page) == set(PAGES)
+
+    for page_title, lines in PAGES.items():
+        html = html_by_page[page_title]
+        assert MARKER_CLASS not in html
+        _, parsed = parse_html(html.encode("utf-8"), page_title)
+        assert [(line["character"], line["dialogue"]) for line in parsed] == \
+            [(character.lower(), dialogue) for character, dialogue in lines]
+
+
+def test_known_revisions_skip_the_lookup(api):
+    revisions = {title: {"revid": 1} for title in PAGES}
+    revisions[MISSING] = None
+    with requests.Session() as session:
+        html_by_page, stats = fetch_transcripts_html(session, [*PAGES, MISSING], api=api,
+                                                     batch_size=8, revisions=revisions)
+    assert [r["action"] for r in StandInApi.requests] == ["parse"]
+    assert stats["requests"] == 1
+    assert set(html_by_page) == set(PAGES)
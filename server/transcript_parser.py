@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Transcript parser: fandom transcript HTML -> (character, dialogue) lines.
+
+Pure parsing with no network, database or log-file setup, so it imports in
+milliseconds and is safe to import in tools and in every worker process of
+scrape_pipeline.py. populateBFDIDatabase.py re-exports everything here.
+
+Usage (parse-only, prints one line per dialogue line or JSON):
+  python transcript_parser.py "../html/Take the Plunge Part 1 Transcript.html"
+  python transcript_parser.py page.html --title "Take the Plunge: Part 1" --json
+"""
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from pathlib import Path
+
+from bs4 import NavigableString, Tag
+
+from html_parsing import make_soup
+from line_classifier import normalize_character, is_known_character, is_garbage, is_stage_direction
+
+# Bump whenever parsing changes in a way that alters stored lines, so
+# incremental runs re-parse every episode once.
+PARSER_VERSION = 9
+
+
+def get_title_card_image(soup):
+    try:
+        img = soup.find('img', {'class': 'pi-image-thumbnail'})
+        if img and img.get('src'):
+            return img['src'].split("/revision")[0]
+    except:
+        pass
+    return None
+
+
+# Plain-text dialogue line: "CharacterName: dialogue text"
+SPEAKER_LINE_RE = re.compile(r'^([A-Za-z][A-Za-z\s\-\'\.]{1,25}):\s*(.+)$')
+
+# Subtrees that never contain dialogue
+PRUNED_TAGS = {'nav', 'aside', 'footer'}
+PRUNED_TABLE_CLASSES = {'navbox', 'infobox', 'toccolours', 'mw-collapsible'}
+CANDIDATE_TAGS = {'p', 'table', 'li'}
+SECTION_TAGS = {'h2', 'h3', 'h4'}
+LINE_ID_CHARS = 24
+
+
+def extract_dialogue_from_table(table):
+    """
+    Handle transcripts that are laid out as small two-column tables:
+    first cell has an image (character), second cell has the line.
+    """
+    # Try to find a character from any image alt/data attributes.
+    character = None
+    for img in table.find_all('img'):
+        alt = (img.get('alt') or img.get('data-image-name') or "").strip()
+        if not alt:
+            continue
+        norm = normalize_character(alt)
+        if is_known_character(norm):
+            character = norm
+            break
+
+    if not character:
+        return None
+
+    # Pick the text cell (non-image).
+    text_candidates = []
+    for td in table.find_all('td'):
+        if td.find('img'):
+            continue
+        text = td.get_text(separator=' ', strip=True)
+        if text:
+            text_candidates.append(text)
+
+    if not text_candidates:
+        return None
+
+    dialogue = max(text_candidates, key=len).strip()
+    if not dialogue or is_stage_direction(dialogue) or is_garbage(dialogue):
+        return None
+
+    return {
+        'character': character,
+        'dialogue': dialogue
+    }
+
+
+def extract_dialogue_from_paragraph(p_tag, episode_title):
+    """
+    Extract dialogue from a paragraph tag.
+    BFDI wiki often formats as: <b>Character</b>: Dialogue text
+    Or: <b>Character:</b> Dialogue text
+    """
+    results = []
+    
+    # Get the full text
+    full_text = p_tag.get_text(separator=' ', strip=True)
+    
+    if not full_text or is_garbage(full_text) or is_stage_direction(full_text):
+        return results
+    
+    # Strategy 1: Look for bold tags containing character names
+    bold_tags = p_tag.find_all('b')
+    
+    for bold in bold_tags:
+        bold_text = bold.get_text(strip=True)
+        
+        # Clean up the bold text (remove trailing colon)
+        char_name = bold_text.rstrip(':').strip()
+        
+        if is_known_character(char_name):
+            # Get the dialogue after this bold tag
+            dialogue_parts = []
+            
+            for sibling in bold.next_siblings:
+                if isinstance(sibling, NavigableString):
+                    text = str(sibling).strip()
+                    if text.startswith(':'):
+                        text = text[1:].strip()
+                    if text:
+                        dialogue_parts.append(text)
+                elif sibling.name == 'b':
+                    # Next character's line, stop here
+                    break
+                elif sibling.name in ['i', 'em']:
+                    # Italics might be stage direction, skip
+                    continue
+                else:
+                    text = sibling.get_text(strip=True)
+                    if text and not is_stage_direction(text):
+                        dialogue_parts.append(text)
+            
+            dialogue = ' '.join(dialogue_parts).strip()
+            dialogue = re.sub(r'^[:\s]+', '', dialogue)  # Remove leading colons/spaces
+            
+            if dialogue and len(dialogue) > 2 and not is_garbage(dialogue):
+                results.append({
+                    'character': normalize_character(char_name),
+                    'dialogue': dialogue
+                })
+    
+    # Strategy 2: If no bold tags found, try "Character: Dialogue" pattern
+    if not results:
+        # Pattern: "CharacterName: dialogue text"
+        match = SPEAKER_LINE_RE.match(full_text)
+        if match:
+            char_name = match.group(1).strip()
+            dialogue = match.group(2).strip()
+            
+            if is_known_character(char_name) and dialogue and not is_garbage(dialogue):
+                results.append({
+                    'character': normalize_character(char_name),
+                    'dialogue': dialogue
+                })
+    
+    return results
+
+
+def extract_dialogue_from_list_item(li):
+    """Some transcripts use <li>Character: Dialogue</li>."""
+    li_text = li.get_text(strip=True)
+    match = SPEAKER_LINE_RE.match(li_text)
+    if not match:
+        return None
+    char_name = match.group(1).strip()
+    dialogue = match.group(2).strip()
+    if is_known_character(char_name) and dialogue and not is_garbage(dialogue):
+        return {
+            'character': normalize_character(char_name),
+            'dialogue': dialogue
+        }
+    return None
+
+
+def is_pruned(tag):
+    """TOC, citation footnotes, navboxes/infoboxes, navigation and category links."""
+    name = tag.name
+    if name in PRUNED_TAGS:
+        return True
+    classes = tag.get('class') or ()
+    if name == 'div':
+        return tag.get('id') == 'toc' or 'toc' in classes or 'categories' in classes
+    if name in ('sup', 'span'):
+        return 'reference' in classes
+    if name == 'table':
+        # Keep small dialogue tables and wikitables
+        return any(c in PRUNED_TABLE_CLASSES for c in classes)
+    return False
+
+
+def heading_text(tag):
+    """Section title of an <h2>-<h4>, without the "[edit]" link."""
+    headline = tag.find(class_='mw-headline') or tag
+    for edit in headline.find_all(class_='mw-editsection'):
+        edit.extract()
+    return headline.get_text(' ', strip=True) or None
+
+
+def collect_dialogue_nodes(root):
+    """
+    Walk the tree once, in document order. Pruned subtrees are not entered
+    and are returned separately; <p>, <table> and <li> tags are candidates,
+    returned as (node, index of the nearest enclosing candidate or None,
+    title of the section heading above it or None).
+    """
+    candidates = []
+    pruned = []
+    section = None
+    stack = [(child, None) for child in reversed(root.contents) if isinstance(child, Tag)]
+    while stack:
+        node, enclosing = stack.pop()
+        if is_pruned(node):
+            pruned.append(node)
+            continue
+        if node.name in SECTION_TAGS:
+            section = heading_text(node)
+            continue
+        if node.name in CANDIDATE_TAGS:
+            candidates.append((node, enclosing, section))
+            enclosing = len(candidates) - 1
+        stack.extend((child, enclosing) for child in reversed(node.contents) if isinstance(child, Tag))
+    return candidates, pruned
+
+
+def line_id(episode_title, character, dialogue, occurrence):
+    """
+    Stable id of a line: the episode, speaker, text and how many identical
+    lines came before it. Unaffected by lines added or removed elsewhere.
+    """
+    key = json.dumps([episode_title, character, dialogue, occurrence], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:LINE_ID_CHARS]
+
+
+def parse_dialogue_advanced(soup, episode_title):
+    """
+    Advanced parsing that handles multiple transcript formats.
+    Paragraph, dialogue-table and list-item lines are emitted in document
+    order from a single traversal of the content div. Each line gets its
+    position in the episode ('ordinal'), its 'section' heading and a stable
+    'line_id'.
+    """
+    dialogue_lines = []
+    
+    # Find the content div
+    content_div = soup.find('div', {'class': 'mw-parser-output'})
+    if not content_div:
+        content_div = soup.find('div', {'id': 'mw-content-text'})
+    if not content_div:
+        # Fallback to article/body to avoid hard failure on render snapshots
+        content_div = soup.find('article') or soup.find('body') or soup
+
+    candidates, pruned = collect_dialogue_nodes(content_div)
+
+    # Drop pruned subtrees before extracting so e.g. citation footnotes
+    # don't end up in a paragraph's text
+    for node in pruned:
+        node.decompose()
+
+    # (character, dialogue) pairs each candidate and its enclosing candidates emitted
+    emitted = [None] * len(candidates)
+    for i, (node, enclosing, section) in enumerate(candidates):
+        if node.name == 'p':
+            lines = extract_dialogue_from_paragraph(node, episode_title)
+        elif node.name == 'table':
+            # Image + text layout; also covers the old bruteforce table pass
+            lines = [line] if (line := extract_dialogue_from_table(node)) else []
+        else:
+            lines = [line] if (line := extract_dialogue_from_list_item(node)) else []
+
+        # A candidate nested in another (<p> inside <li>, <li> inside a
+        # dialogue table) sees the same text again: drop the lines its
+        # enclosing candidates already produced. Repeats elsewhere are kept.
+        inherited = emitted[enclosing] if enclosing is not None else frozenset()
+        keys = {(line['character'], line['dialogue']) for line in lines}
+        emitted[i] = inherited | keys if keys else inherited
+        for line in lines:
+            if (line['character'], line['dialogue']) not in inherited:
+                line['section'] = section
+                dialogue_lines.append(line)
+
+    occurrences = {}
+    for ordinal, line in enumerate(dialogue_lines):
+        key = (line['character'], line['dialogue'])
+        occurrence = occurrences.get(key, 0)
+        occurrences[key] = occurrence + 1
+        line['ordinal'] = ordinal
+        line['line_id'] = line_id(episode_title, line['character'], line['dialogue'], occurrence)
+
+    return dialogue_lines, None
+
+
+def parse_html(raw, episode_title):
+    """Raw transcript HTML (bytes, str or file) -> (title card image, dialogue lines)."""
+    soup = make_soup(raw)
+    image_url = get_title_card_image(soup)
+    dialogue_lines, _ = parse_dialogue_advanced(soup, episode_title)
+    return image_url, dialogue_lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse one saved transcript page without touching the network")
+    parser.add_argument("html", type=Path, help="Saved transcript HTML file")
+    parser.add_argument("--title", help="Episode title (default: the file name)")
+    parser.add_argument("--json", action="store_true", help="Print the lines as a JSON array")
+    args = parser.parse_args()
+
+    title = args.title or args.html.stem.split(" Transcript")[0]
+    with args.html.open("rb") as f:
+        image_url, lines = parse_html(f, title)
+    if args.json:
+        json.dump(lines, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        for line in lines:
+            print(f"{line['character']}: {line['dialogue']}")
+        print(f"{len(lines)} lines (parser v{PARSER_VERSION}), title card: {image_url}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
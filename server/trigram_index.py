@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+Trigram substring index over a columnar corpus (see corpus_format.py).
+
+The search route answers `keywords` / `character` / `season` queries by
+lower-casing every line and calling includes() on it. This index gives the
+same answers without the scan:
+
+- every line's dialogue is lower-cased and accent-folded, and each distinct
+  trigram gets a sorted posting list of line ids
+- each character and season gets a posting bitmap
+
+A query intersects the postings of its own trigrams (a necessary condition
+for a substring match, because folding maps character by character), ANDs
+the filter bitmaps, then verifies each surviving candidate with the exact
+lower-cased substring test the route uses. Results are line ids in corpus
+order, which is the export order the route iterates in.
+
+The index is written as trigram.idx inside the corpus directory.
+
+Usage:
+  python trigram_index.py build exports/corpus
+  python trigram_index.py query exports/corpus --keywords "yoylecake" --season 1
+"""
+
+import argparse
+import json
+import mmap
+import re
+import struct
+import sys
+import unicodedata
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+from corpus_format import U32, Corpus
+
+INDEX_FILE = "trigram.idx"
+MAGIC = b"BFDITRI1"
+SEARCH_LIMIT = 150  # Same cut-off as EXPORT_LIMIT in routes/dialogue.js
+MAX_PROBED_TRIGRAMS = 4
+DENSE_FRACTION = 0.5
+
+_LEADING_INT_RE = re.compile(r'^\s*([+-]?\d+)')
+
+
+def fold(text):
+    """Accent-fold already lower-cased text: 'é' -> 'e'. Maps char by char."""
+    if text.isascii():
+        return text
+    return "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+
+
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def js_parse_int(value):
+    """parseInt(value) as the route applies it to ?season=; None stands for NaN."""
+    match = _LEADING_INT_RE.match(str(value))
+    return int(match.group(1)) if match else None
+
+
+# =============================================================================
+# BITMAPS (bytes, little-endian bit order: line n is bit n % 8 of byte n // 8)
+# =============================================================================
+
+def bitmap_from_ids(ids, size):
+    bits = bytearray((size + 7) // 8)
+    for n in ids:
+        bits[n >> 3] |= 1 << (n & 7)
+    return bytes(bits)
+
+
+def bitmap_and(a, b):
+    return (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def bitmap_or(a, b):
+    return (int.from_bytes(a, "little") | int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+
+def bitmap_ids(bits):
+    """Set bit positions in ascending order."""
+    for byte_index, byte in enumerate(bits):
+        while byte:
+            low = byte & -byte
+            yield (byte_index << 3) + low.bit_length() - 1
+            byte ^= low
+
+
+def bitmap_has(bits, n):
+    return bits[n >> 3] & (1 << (n & 7))
+
+
+# =============================================================================
+# BUILD
+# =============================================================================
+
+def build_index(corpus_dir):
+    """Build trigram.idx for the corpus in `corpus_dir`. Returns trigram count."""
+    corpus_dir = Path(corpus_dir)
+    postings = {}
+    season_ids = {}
+    with Corpus(corpus_dir) as corpus:
+        size = len(corpus)
+        for n in range(size):
+            for gram in trigrams(fold(corpus.dialogue(n).lower())):
+                ids = postings.get(gram)
+                if ids is None:
+                    ids = postings[gram] = array(U32)
+                ids.append(n)
+            season = str(corpus.episode(n).get("season"))
+            season_ids.setdefault(season, []).append(n)
+        character_ids = [[] for _ in corpus.characters]
+        for n, character_id in enumerate(corpus.character_ids):
+            character_ids[character_id].append(n)
+
+    blob = bytearray()
+    header = {"line_count": size, "trigrams": {}, "seasons": {}, "characters": []}
+
+    def put(data):
+        offset = len(blob)
+        blob.extend(data)
+        return [offset, len(data)]
+
+    for gram in sorted(postings):
+        offset, length = put(postings[gram].tobytes())
+        header["trigrams"][gram] = [offset, length // 4]
+    for season, ids in season_ids.items():
+        header["seasons"][season] = put(bitmap_from_ids(ids, size))
+    for ids in character_ids:
+        header["characters"].append(put(bitmap_from_ids(ids, size)))
+
+    head = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    # Pad so the data section (and every u32 posting list) is 4-byte aligned
+    pad = (-(len(MAGIC) + 4 + len(head))) % 4
+    path = corpus_dir / INDEX_FILE
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(head) + pad))
+        f.write(head + b" " * pad)
+        f.write(blob)
+    tmp.replace(path)
+    return len(postings)
+
+
+# =============================================================================
+# QUERY
+# =============================================================================
+
+class TrigramIndex:
+    """Memory-mapped trigram index plus the corpus it verifies against."""
+
+    def __init__(self, corpus_dir):
+        corpus_dir = Path(corpus_dir)
+        self.corpus = Corpus(corpus_dir)
+        self._file = (corpus_dir / INDEX_FILE).open("rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{corpus_dir / INDEX_FILE} is not a trigram index")
+        (head_len,) = struct.unpack_from("<I", self._map, len(MAGIC))
+        start = len(MAGIC) + 4
+        self.header = json.loads(self._map[start:start + head_len])
+        if self.header["line_count"] != len(self.corpus):
+            raise ValueError("Trigram index is out of date with its corpus; rebuild it")
+        self._data = memoryview(self._map)[start + head_len:]
+
+    def close(self):
+        self._data.release()
+        self._map.close()
+        self._file.close()
+        self.corpus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def postings(self, gram):
+        entry = self.header["trigrams"].get(gram)
+        if entry is None:
+            return None
+        offset, count = entry
+        return self._data[offset:offset + count * 4].cast(U32)
+
+    def _bitmap(self, entry):
+        offset, length = entry
+        return bytes(self._data[offset:offset + length])
+
+    def filter_bitmap(self, character=None, season=None):
+        """AND of the character/season bitmaps, or None when unfiltered."""
+        bits = None
+        if season not in (None, ""):
+            parsed = js_parse_int(season)
+            entry = self.header["seasons"].get(str(parsed)) if parsed is not None else None
+            bits = self._bitmap(entry) if entry else bytes((len(self.corpus) + 7) // 8)
+        if character:
+            wanted = character.lower()
+            char_bits = bytes((len(self.corpus) + 7) // 8)
+            for character_id, name in enumerate(self.corpus.characters):
+                if wanted in name.lower():
+                    char_bits = bitmap_or(char_bits, self._bitmap(self.header["characters"][character_id]))
+            bits = char_bits if bits is None else bitmap_and(bits, char_bits)
+        return bits
+
+    def candidates(self, keywords):
+        """
+        Lazily yield line ids, ascending, whose folded text has the rarest
+        trigrams of the query; returns None when no trigram narrows the search.
+        Verification catches anything the skipped common trigrams would have
+        ruled out, so probing only a few lists is safe.
+        """
+        grams = trigrams(fold(keywords.lower()))
+        if not grams:
+            return None  # Shorter than a trigram: verify every line
+        counts = self.header["trigrams"]
+        if any(gram not in counts for gram in grams):
+            return iter(())
+        # Lists covering most of the corpus cost more to merge than they save
+        dense = len(self.corpus) * DENSE_FRACTION
+        rarest = [gram for gram in sorted(grams, key=lambda gram: counts[gram][1])
+                  if counts[gram][1] <= dense][:MAX_PROBED_TRIGRAMS]
+        if not rarest:
+            return None
+        lists = [self.postings(gram) for gram in rarest]
+        return self._intersect(lists[0], lists[1:])
+
+    @staticmethod
+    def _intersect(driver, others):
+        positions = [0] * len(others)
+        sizes = [len(ids) for ids in others]
+        for n in driver:
+            for k, ids in enumerate(others):
+                # Both sides ascend, so each search starts where the last one ended
+                i = bisect_left(ids, n, positions[k])
+                positions[k] = i
+                if i >= sizes[k] or ids[i] != n:
+                    break
+            else:
+                yield n
+
+    def search(self, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+        """
+        Line ids matching the route's keywords/character/season semantics, in
+        corpus order, at most `limit` of them (None for all).
+        """
+        bits = self.filter_bitmap(character, season)
+        if keywords:
+            candidates = self.candidates(keywords)
+            if candidates is None:
+                candidates = bitmap_ids(bits) if bits is not None else range(len(self.corpus))
+            elif bits is not None:
+                candidates = (n for n in candidates if bitmap_has(bits, n))
+            needle = keywords.lower()
+            candidates = (n for n in candidates if needle in self.corpus.dialogue(n).lower())
+        else:
+            candidates = bitmap_ids(bits) if bits is not None else range(len(self.corpus))
+
+        results = []
+        for n in candidates:
+            results.append(n)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def search_docs(self, keywords=None, character=None, season=None, limit=SEARCH_LIMIT):
+        return [self.corpus.line(n) for n in self.search(keywords, character, season, limit)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the trigram index of a corpus")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Build trigram.idx for a corpus directory")
+    build.add_argument("corpus", type=Path)
+    query = sub.add_parser("query", help="Run one search")
+    query.add_argument("corpus", type=Path)
+    query.add_argument("--keywords")
+    query.add_argument("--character")
+    query.add_argument("--season")
+    query.add_argument("--limit", type=int, default=SEARCH_LIMIT)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_index(args.corpus)
+        print(f"Indexed {count} trigrams into {args.corpus / INDEX_FILE}")
+        return
+
+    with TrigramIndex(args.corpus) as index:
+        for doc in index.search_docs(args.keywords, args.character, args.season, args.limit):
+            print(f"[S{doc['season']}] {doc['episode_title']} - {doc['character']}: {doc['dialogue']}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
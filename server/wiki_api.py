@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+Small MediaWiki API client for the BFDI fandom wiki.
+
+fetch_revision_metadata() asks for the latest revision id / sha1 of many
+pages at once (up to 50 titles per request), which is far cheaper than
+downloading each transcript just to see whether it changed.
+
+fetch_transcripts_html() renders many transcripts per request: it asks
+action=parse to render a wikitext document that transcludes several pages,
+each preceded by an empty marker div, and splits the returned HTML at the
+markers. The result is only the content HTML the parser needs, without the
+site chrome a full page view carries.
+"""
+
+import re
+from urllib.parse import urlencode
+
+WIKI_API = "https://battlefordreamisland.fandom.com/api.php"
+MAX_TITLES_PER_QUERY = 50  # MediaWiki limit for anonymous clients
+PAGES_PER_PARSE = 8        # Keeps each render well under the post-expand include size limit
+
+MARKER_CLASS = "bfdi-batch-marker"
+MARKER_RE = re.compile(r'<div[^>]*class="%s"[^>]*data-index="(\d+)"[^>]*>\s*</div>' % MARKER_CLASS)
+
+
+def transcript_page_title(title):
+    return f"{title}/Transcript"
+
+
+def chunked(items, size):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def api_url(params, api=WIKI_API):
+    """Full GET URL; parameters are encoded into the URL so caches key on them."""
+    query = {'format': 'json', 'formatversion': '2'}
+    query.update(params)
+    return f"{api}?{urlencode(query)}"
+
+
+def resolve_titles(query, titles):
+    """Map requested titles to the page titles the API answered with."""
+    alias = {}
+    for entry in query.get('normalized', []) + query.get('redirects', []):
+        alias[entry['from']] = entry['to']
+    resolved = {}
+    for title in titles:
+        target = title
+        seen = set()
+        while target in alias and target not in seen:
+            seen.add(target)
+            target = alias[target]
+        resolved[title] = target
+    return resolved
+
+
+def fetch_revision_metadata(session, page_titles, api=WIKI_API, batch_size=MAX_TITLES_PER_QUERY):
+    """
+    Return {page_title: {'revid', 'sha1', 'timestamp'}} for every requested
+    title; missing pages map to None. Raises on HTTP or API errors.
+    """
+    result = {}
+    for batch in chunked(list(page_titles), batch_size):
+        url = api_url({
+            'action': 'query',
+            'prop': 'revisions',
+            'rvprop': 'ids|timestamp|sha1',
+            'redirects': '1',
+            'titles': '|'.join(batch),
+        }, api)
+        response = session.get(url, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(f"API error: {data['error'].get('info', data['error'])}")
+
+        query = data.get('query', {})
+        pages = {page['title']: page for page in query.get('pages', [])}
+        for requested, resolved in resolve_titles(query, batch).items():
+            page = pages.get(resolved)
+            if not page or page.get('missing') or not page.get('revisions'):
+                result[requested] = None
+                continue
+            rev = page['revisions'][0]
+            result[requested] = {
+                'revid': rev.get('revid'),
+                'sha1': rev.get('sha1'),
+                'timestamp': rev.get('timestamp'),
+            }
+    return result
+
+
+def batch_wikitext(page_titles):
+    parts = []
+    for i, page_title in enumerate(page_titles):
+        parts.append(f'<div class="{MARKER_CLASS}" data-index="{i}"></div>\n\n{{{{:{page_title}}}}}\n')
+    return "\n".join(parts)
+
+
+def split_batch_html(html, count):
+    """Split rendered batch HTML at the marker divs into `count` chunks."""
+    chunks = [None] * count
+    matches = list(MARKER_RE.finditer(html))
+    for pos, match in enumerate(matches):
+        index = int(match.group(1))
+        end = matches[pos + 1].start() if pos + 1 < len(matches) else len(html)
+        if index < count:
+            chunks[index] = html[match.end():end]
+    return chunks
+
+
+def fetch_transcripts_html(session, page_titles, api=WIKI_API, batch_size=PAGES_PER_PARSE, revisions=None):
+    """
+    Render many pages through the API. Returns ({page_title: html}, stats)
+    where stats counts API requests and response bytes. Missing pages are
+    left out; each html chunk is wrapped in a mw-parser-output div so it can
+    go straight into the transcript parser.
+
+    `revisions` is an optional result of fetch_revision_metadata for the same
+    titles; without it one is fetched first to drop missing pages.
+    """
+    page_titles = list(page_titles)
+    stats = {'requests': 0, 'bytes': 0}
+    if revisions is None:
+        revisions = fetch_revision_metadata(session, page_titles, api)
+        stats['requests'] += -(-len(page_titles) // MAX_TITLES_PER_QUERY)
+    existing = [t for t in page_titles if revisions.get(t)]
+
+    html_by_title = {}
+    for batch in chunked(existing, batch_size):
+        response = session.post(api, data={
+            'action': 'parse',
+            'format': 'json',
+            'formatversion': '2',
+            'contentmodel': 'wikitext',
+            'prop': 'text',
+            'disablelimitreport': '1',
+            'disableeditsection': '1',
+            'text': batch_wikitext(batch),
+        }, timeout=60)
+        stats['requests'] += 1
+        stats['bytes'] += len(response.content)
+        response.raise_for_status()
+        data = response.json()
+        if 'error' in data:
+            raise RuntimeError(f"API error: {data['error'].get('info', data['error'])}")
+
+        text = data.get('parse', {}).get('text', '')
+        if isinstance(text, dict):  # formatversion=1 style {"*": html}
+            text = text.get('*', '')
+        for page_title, chunk in zip(batch, split_batch_html(text, len(batch))):
+            if chunk and chunk.strip():
+                html_by_title[page_title] = f'<div class="mw-parser-output">{chunk}</div>'
+    return html_by_title, stats